@@ -1,6 +1,6 @@
 {
     'name': 'GitLab-Nostr Bridge',
-    'version': '1.4.1',
+    'version': '1.6.0',
     'category': 'Productivity/Integrations',
     'summary': 'Integrate GitLab repositories with Nostr events',
     'sequence': 1,
@@ -27,11 +27,18 @@ Key Features:
 * Configurable GitLab and Nostr settings
 * Automated relay testing and management
 * Enhanced error handling and logging
+* Optional publishing outbox: events are queued as pending and published in
+  batches by the ``root.nostr.publish`` job channel. Its capacity is set on
+  the job runner, e.g. ``ODOO_QUEUE_JOB_CHANNELS=root:4,root.nostr.publish:2``
+* Relay subscriptions resume from per-relay ``since`` cursors. A standalone
+  daemon follows the relays continuously:
+  ``python -m odoo.addons.gitlab_nostr_bridge.subscriber -c odoo.conf``
     """,
     'depends': [
         'base',
         'mail',
         'web',
+        'queue_job',
     ],
     'data': [
         'security/ir.model.access.csv',
@@ -43,6 +50,7 @@ Key Features:
         'views/res_config_settings_views.xml',
         'data/gitlab_nostr_bridge_data.xml',
         'data/ir_cron_data.xml',
+        'data/queue_job_data.xml',
         'wizards/create_commit_wizard_views.xml',
         'wizards/create_branch_wizard_views.xml',
     ],
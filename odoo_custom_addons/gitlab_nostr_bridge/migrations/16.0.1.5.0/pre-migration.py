@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    if not version:
+        return
+    # nostr_event.event_id becomes unique: keep the oldest copy of each event
+    cr.execute("""
+        DELETE FROM nostr_event e
+         USING nostr_event d
+         WHERE e.event_id = d.event_id
+           AND e.id > d.id
+    """)
+    _logger.info(f"Removed {cr.rowcount} duplicated Nostr events")
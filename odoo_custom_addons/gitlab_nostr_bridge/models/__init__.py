@@ -5,3 +5,10 @@ from . import gitlab_branch
 from . import gitlab_commit
 from . import nostr_event
 from . import custom_error_handler
+from . import relay_pool
+from . import event_cache
+from . import event_ingest
+from . import relay_subscription
+from . import relay_cursor
+from . import relay_scoring
+from . import async_runtime
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+# Per-process asyncio runtime.
+#
+# The ORM is synchronous while websockets are not: every sync entry point
+# used to build (and sometimes leak) an event loop with
+# asyncio.new_event_loop() for each call. The runtime owns a single loop
+# running on a daemon thread; synchronous code submits coroutines to it
+# with run_sync() and blocks until they are done. Connections and tasks
+# created on the loop (e.g. the relay pool) outlive the call.
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+
+_logger = logging.getLogger(__name__)
+
+
+class AsyncRuntime:
+    """A daemon thread running one event loop, started on first use."""
+
+    def __init__(self, name='nostr-async-runtime'):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        with self._lock:
+            # a forked worker inherits the object but not the thread
+            if self._loop is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._start()
+            return self._loop
+
+    def _start(self):
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(started.set)
+            loop.run_forever()
+
+        self._loop = loop
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=run, name=self.name, daemon=True)
+        self._thread.start()
+        started.wait()
+        _logger.info(f"Started {self.name} event loop")
+
+    def in_runtime_thread(self):
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        """Schedule ``coro`` on the loop, return a ``concurrent.futures.Future``."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run_sync(self, coro, timeout=None):
+        """Run ``coro`` on the loop and return its result.
+
+        Blocks the calling thread for at most ``timeout`` seconds (forever
+        when ``None``), after which the coroutine is cancelled and
+        ``TimeoutError`` is raised. Must not be called from a coroutine
+        running on the loop itself, that would deadlock.
+
+        As the caller is blocked meanwhile, the coroutine may use its
+        environment and cursor; it shares the loop with the other threads
+        of the process though, so blocking work inside it should be short.
+        """
+        if self.in_runtime_thread():
+            coro.close()
+            raise RuntimeError("run_sync() called from the async runtime thread, await the coroutine instead")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Coroutine did not finish within {timeout}s")
+
+
+_async_runtime = AsyncRuntime()
+
+
+def get_async_runtime():
+    return _async_runtime
+
+
+def run_sync(coro, timeout=None):
+    """Run ``coro`` on the shared runtime, see :meth:`AsyncRuntime.run_sync`."""
+    return _async_runtime.run_sync(coro, timeout)
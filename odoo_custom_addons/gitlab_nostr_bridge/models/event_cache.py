@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+# In-memory fast path for incoming Nostr events.
+#
+# Subscribed to several relays we receive the same event once per relay.
+# SEEN_EVENTS remembers recently stored event ids so duplicates are dropped
+# without querying PostgreSQL, and VERIFIED_SIGNATURES remembers the outcome
+# of the schnorr verification so an event is only checked once.
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+
+from secp256k1 import PublicKey as Secp256k1PublicKey
+
+_logger = logging.getLogger(__name__)
+
+SEEN_EVENTS_SIZE = 100000
+VERIFIED_SIGNATURES_SIZE = 20000
+
+
+class LRUCache:
+    """Thread-safe bounded mapping evicting the least recently used key."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return True
+            return False
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value=True):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# keys are (dbname, event_id): one process may serve several databases
+SEEN_EVENTS = LRUCache(SEEN_EVENTS_SIZE)
+# keys are (event_id, pubkey, sig), values the verification outcome
+VERIFIED_SIGNATURES = LRUCache(VERIFIED_SIGNATURES_SIZE)
+
+
+def normalize_event(event_data):
+    """Return ``event_data`` with NIP-01 keys (``pubkey``/``sig``).
+
+    Some of our code paths historically used ``public_key``/``signature``.
+    """
+    if 'pubkey' in event_data and 'sig' in event_data:
+        return event_data
+    event_data = dict(event_data)
+    event_data.setdefault('pubkey', event_data.get('public_key'))
+    event_data.setdefault('sig', event_data.get('signature'))
+    return event_data
+
+
+def compute_event_id(event_data):
+    serialized = json.dumps(
+        [0, event_data['pubkey'], event_data['created_at'], event_data['kind'],
+         event_data['tags'], event_data['content']],
+        separators=(',', ':'),
+        ensure_ascii=False,
+    )
+    return sha256(serialized.encode()).hexdigest()
+
+
+def verify_event(event_data):
+    """Check the id and schnorr signature of a NIP-01 event dict.
+
+    The id is always recomputed (a sha256 is cheap and it binds the cached
+    signature outcome to the event content); the schnorr verification is
+    only done once per (id, pubkey, sig).
+    """
+    event_data = normalize_event(event_data)
+    event_id, pubkey, sig = event_data.get('id'), event_data.get('pubkey'), event_data.get('sig')
+    if not event_id or not pubkey or not sig:
+        return False
+    try:
+        if compute_event_id(event_data) != event_id:
+            return False
+    except (KeyError, TypeError, ValueError):
+        return False
+    key = (event_id, pubkey, sig)
+    valid = VERIFIED_SIGNATURES.get(key)
+    if valid is None:
+        try:
+            public_key = Secp256k1PublicKey(bytes.fromhex('02' + pubkey), True)
+            valid = public_key.schnorr_verify(bytes.fromhex(event_id), bytes.fromhex(sig), None, raw=True)
+        except Exception as e:
+            _logger.debug(f"Signature verification error for event {event_id[:10]}: {str(e)}")
+            valid = False
+        VERIFIED_SIGNATURES.set(key, valid)
+    return valid
+
+
+def is_seen(dbname, event_id):
+    return (dbname, event_id) in SEEN_EVENTS
+
+
+def mark_seen(dbname, event_id):
+    SEEN_EVENTS.set((dbname, event_id))
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+# Batched ingestion of events received from relays.
+#
+# Listeners used to run a SELECT then an INSERT per received event. The
+# buffer collects verified events and writes them with one
+# INSERT ... ON CONFLICT (event_id) DO NOTHING per batch, relying on the
+# unique constraint of nostr_event.event_id for idempotency.
+
+import json
+import logging
+import time
+
+from psycopg2.extras import execute_values
+
+from .event_cache import mark_seen, normalize_event
+
+_logger = logging.getLogger(__name__)
+
+FLUSH_SIZE = 500
+FLUSH_INTERVAL = 5.0
+
+INSERT_EVENTS_QUERY = """
+    INSERT INTO nostr_event (
+        event_id, kind, content, tags, public_key, created_at, signature,
+        published, publish_state, publish_attempts,
+        create_uid, create_date, write_uid, write_date
+    )
+    VALUES %s
+    ON CONFLICT (event_id) DO NOTHING
+    RETURNING event_id
+"""
+
+
+def insert_events(cr, events, uid):
+    """Insert NIP-01 event dicts, skipping the ones already stored.
+
+    ``cr`` is an Odoo or a psycopg2 cursor. Returns the ids of the events
+    actually inserted.
+    """
+    if not events:
+        return []
+    rows = [(
+        event['id'],
+        event['kind'],
+        event['content'],
+        json.dumps(event['tags']),
+        event['pubkey'],
+        event['created_at'],
+        event['sig'],
+        uid,
+        uid,
+    ) for event in events]
+    inserted = execute_values(
+        getattr(cr, '_obj', cr),
+        INSERT_EVENTS_QUERY,
+        rows,
+        template="(%s, %s, %s, %s, %s, %s, %s, true, 'published', 0,"
+                 " %s, (now() at time zone 'UTC'), %s, (now() at time zone 'UTC'))",
+        page_size=len(rows),
+        fetch=True,
+    )
+    return [row[0] for row in inserted]
+
+
+class EventIngestBuffer:
+    """Accumulates incoming events until a batch is worth writing.
+
+    Events are deduplicated by id inside the buffer; ``should_flush`` turns
+    true once ``flush_size`` events are waiting or the oldest one waited
+    ``flush_interval`` seconds.
+    """
+
+    def __init__(self, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.events = {}
+        self.first_added = None
+
+    def __len__(self):
+        return len(self.events)
+
+    def add(self, event_data):
+        event_data = normalize_event(event_data)
+        if not self.events:
+            self.first_added = time.monotonic()
+        self.events.setdefault(event_data['id'], event_data)
+        return self.should_flush()
+
+    def should_flush(self):
+        if not self.events:
+            return False
+        return (
+            len(self.events) >= self.flush_size
+            or time.monotonic() - self.first_added >= self.flush_interval
+        )
+
+    def flush(self, cr, uid):
+        """Write the buffered events, return the number of new rows."""
+        if not self.events:
+            return 0
+        events, self.events = list(self.events.values()), {}
+        inserted = insert_events(cr, events, uid)
+        dbname = cr.dbname if hasattr(cr, 'dbname') else cr.connection.info.dbname
+        for event in events:
+            mark_seen(dbname, event['id'])
+        _logger.info(f"Ingested {len(inserted)} new Nostr events out of {len(events)} received")
+        return len(inserted)
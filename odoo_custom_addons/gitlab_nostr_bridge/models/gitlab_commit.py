@@ -7,10 +7,10 @@ from datetime import datetime, timezone
 from nostr.event import Event
 from nostr.key import PrivateKey
 import time
-import asyncio
 import json
 import logging
 import hashlib
+from .relay_pool import get_relay_pool
 
 _logger = logging.getLogger(__name__)
 
@@ -52,7 +52,7 @@ class GitlabCommit(models.Model):
         return hashlib.sha1(hash_input.encode()).hexdigest()
 
     @api.model
-    def create_or_update_from_gitlab(self, repository_id, gitlab_commit):
+    def create_or_update_from_gitlab(self, repository_id, gitlab_commit, publish=True):
         _logger.info(f"Processing GitLab commit: {gitlab_commit.id} for repository {repository_id}")
         try:
             existing_commit = self.search([('name', '=', gitlab_commit.id), ('repository_id', '=', repository_id)])
@@ -79,7 +79,8 @@ class GitlabCommit(models.Model):
                 _logger.info(f"Creating new commit: {gitlab_commit.id}")
                 commit = self.create(commit_data)
             
-            self._create_and_publish_nostr_event(commit)
+            if publish:
+                self._create_and_publish_nostr_event(commit)
             return commit
         
         except Exception as e:
@@ -87,6 +88,9 @@ class GitlabCommit(models.Model):
             raise UserError(_("Failed to process GitLab commit: %s") % str(e))
 
     def _create_and_publish_nostr_event(self, commit):
+        self._create_and_publish_nostr_events(commit)
+
+    def _create_and_publish_nostr_events(self, commits):
         user = self.env.user
         if not user.nostr_private_key:
             _logger.error(f"Nostr private key is not set for the user {user.name} (ID: {user.id})")
@@ -96,14 +100,17 @@ class GitlabCommit(models.Model):
             private_key = PrivateKey.from_nsec(user.nostr_private_key)
             pub_key = private_key.public_key.hex()
 
-            event = Event(
-                public_key=pub_key,
-                created_at=int(time.time()),
-                kind=1,
-                tags=[['r', commit.repository_id.url], ['c', commit.name]],
-                content=f"New commit in repository {commit.repository_id.name}: {commit.message}. Hash: {commit.name}. Time of commit: " + str(int(time.time())) + "."
-            )
-            private_key.sign_event(event)
+            events = []
+            for commit in commits:
+                event = Event(
+                    public_key=pub_key,
+                    created_at=int(time.time()),
+                    kind=1,
+                    tags=[['r', commit.repository_id.url], ['c', commit.name]],
+                    content=f"New commit in repository {commit.repository_id.name}: {commit.message}. Hash: {commit.name}. Time of commit: " + str(int(time.time())) + "."
+                )
+                private_key.sign_event(event)
+                events.append(event)
 
             relay_urls = self.env['ir.config_parameter'].sudo().get_param('nostr_bridge.relay_urls', '').split(',')
             relay_urls = [url.strip() for url in relay_urls if url.strip()]
@@ -112,38 +119,24 @@ class GitlabCommit(models.Model):
                 _logger.error("No Nostr relay URLs configured.")
                 return
 
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            results = loop.run_until_complete(self._publish_to_relays(relay_urls, event))
+            # all commit events are pipelined down each relay's pooled connection
+            frames = [(event.id, event.to_message()) for event in events]
+            results = get_relay_pool().publish_batch_sync(relay_urls, frames, timeout=5.0 + 0.01 * len(frames))
 
-            successes = [result for result in results if result['success']]
-            if successes:
-                _logger.info(f"Successfully published Nostr event for commit {commit.name} to {len(successes)} out of {len(relay_urls)} relays.")
-            else:
-                _logger.error(f"Failed to publish Nostr event for commit {commit.name} to any relay.")
+            for index, commit in enumerate(commits):
+                commit_results = [results[url][index] for url in relay_urls]
+                successes = [result for result in commit_results if result.get('accepted')]
+                if successes:
+                    _logger.info(f"Successfully published Nostr event for commit {commit.name} to {len(successes)} out of {len(relay_urls)} relays.")
+                else:
+                    _logger.error(f"Failed to publish Nostr event for commit {commit.name} to any relay.")
 
-            for result in results:
-                if not result['success']:
-                    _logger.warning(f"Failed to publish to relay {result['url']}: {result.get('error', 'Unknown error')}")
+                for result in commit_results:
+                    if not result.get('accepted'):
+                        _logger.warning(f"Failed to publish to relay {result['url']}: {result.get('error', result.get('response', 'Unknown error'))}")
 
         except Exception as e:
-            _logger.error(f"Error creating and publishing Nostr event for commit {commit.name}: {str(e)}", exc_info=True)
-
-    async def _publish_to_relays(self, relay_urls, event):
-        import websockets
-
-        async def publish_to_relay(url, event):
-            try:
-                async with websockets.connect(url.strip(), ping_interval=None) as websocket:
-                    message = event.to_message()
-                    await websocket.send(message)
-                    response = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-                    return {'success': True, 'url': url, 'response': response}
-            except Exception as e:
-                return {'success': False, 'url': url, 'error': str(e)}
-
-        tasks = [publish_to_relay(url, event) for url in relay_urls]
-        return await asyncio.gather(*tasks)
+            _logger.error(f"Error creating and publishing Nostr events for commits {', '.join(commits.mapped('name'))}: {str(e)}", exc_info=True)
 
     def _convert_to_naive_datetime(self, date_string):
         dt = parser.parse(date_string)
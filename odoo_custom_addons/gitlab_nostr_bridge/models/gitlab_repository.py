@@ -46,7 +46,7 @@ class GitlabRepository(models.Model):
                 content, public_key, private_key, relay_urls, kind=1, tags=tags
             )
             
-            success_count = sum(1 for result in results if result['success'])
+            success_count = sum(1 for result in results if result.get('accepted'))
             
             if success_count > 0:
                 message = f"Successfully published test Nostr event to {success_count} out of {len(relay_urls)} relays."
@@ -58,8 +58,8 @@ class GitlabRepository(models.Model):
             # Detailed error reporting
             error_messages = []
             for result in results:
-                if not result['success']:
-                    error_messages.append(f"Relay {result['url']}: {result.get('error', 'Unknown error')}")
+                if not result.get('accepted'):
+                    error_messages.append(f"Relay {result['url']}: {result.get('error', result.get('response', 'Unknown error'))}")
             
             if error_messages:
                 message += "\n\nErrors:\n" + "\n".join(error_messages)
@@ -141,9 +141,12 @@ class GitlabRepository(models.Model):
             
             # Sync commits
             _logger.info(f"Starting commit sync for repository: {self.name}")
+            commits = self.env['gitlab.commit']
             for commit in project.commits.list():
-                self.env['gitlab.commit'].create_or_update_from_gitlab(self.id, commit)
+                commits |= self.env['gitlab.commit'].create_or_update_from_gitlab(self.id, commit, publish=False)
             _logger.info(f"Finished commit sync for repository: {self.name}")
+            if commits:
+                self.env['gitlab.commit']._create_and_publish_nostr_events(commits)
 
             return {
                 'type': 'ir.actions.client',
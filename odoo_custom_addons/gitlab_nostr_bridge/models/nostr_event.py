@@ -10,6 +10,8 @@ import websockets
 from odoo import models, fields, api, _
 from websockets.exceptions import WebSocketException
 from odoo.exceptions import UserError
+from odoo.addons.queue_job.exception import RetryableJobError
+from odoo.addons.queue_job.job import identity_exact
 from nostr.event import Event, EventKind
 from nostr.key import PrivateKey, PublicKey
 from nostr.relay_manager import RelayManager
@@ -21,9 +23,21 @@ from hashlib import sha256
 from secp256k1 import PublicKey as Secp256k1PublicKey, PrivateKey as Secp256k1PrivateKey
 from dataclasses import dataclass, field
 from typing import List
+from psycopg2.extras import execute_values
+from .async_runtime import run_sync
+from .relay_pool import get_relay_pool
+from .relay_scoring import DEFAULT_MAX_RELAYS, DEFAULT_QUORUM, get_relay_scoreboard
+from .event_cache import verify_event
+from .relay_subscription import CursorIngest, build_filter, load_cursors, read_relay, save_cursors
 
 _logger = logging.getLogger(__name__)
 
+# cursor name shared with the subscriber daemon
+INCOMING_SUBSCRIPTION = 'gitlab_nostr_bridge'
+# seconds synchronous callers wait for relays; publishing retries and may
+# fall back to other relays, hence well above a single ack timeout
+SYNC_TIMEOUT = 120
+
 # ---- Decorator Pattern ----
 
 def enhanced_publish_event(func):
@@ -82,17 +96,14 @@ class OriginalPublishStrategy(PublishStrategy):
         nostr_event = event._create_nostr_event()
         signed_event = event._sign_event(nostr_event)
 
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            tasks = [relay_manager.publish_to_relay(url, signed_event) for url in relay_urls]
-            results = loop.run_until_complete(asyncio.gather(*tasks))
-            success_count = sum(1 for result in results if result['success'] and 'true' in result['response'].lower())
-            success_rate = success_count / len(relay_urls)
-        finally:
-            loop.close()
+        async def publish_all():
+            return await asyncio.gather(*[relay_manager.publish_to_relay(url, signed_event) for url in relay_urls])
+
+        results = run_sync(publish_all(), SYNC_TIMEOUT)
+        success_count = sum(1 for result in results if result.get('accepted'))
+        success_rate = success_count / len(relay_urls)
 
-        logs = "\n".join([f"Relay {r['url']}: {'Success' if r['success'] else 'Failed'} - {r.get('response', r.get('error', 'No response'))}" for r in results])
+        logs = "\n".join([f"Relay {r['url']}: {'Success' if r.get('accepted') else 'Failed'} - {r.get('response', r.get('error', 'No response'))}" for r in results])
 
         if success_rate > 0:
             event.write({
@@ -120,12 +131,9 @@ class AlternativePublishStrategy(PublishStrategy):
         nostr_event = event._create_nostr_event()
         signed_event = event._sign_event(nostr_event)
 
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            success_rate = loop.run_until_complete(relay_manager.publish_to_relays(signed_event, [{'url': url} for url in relay_urls]))
-        finally:
-            loop.close()
+        success_rate = run_sync(
+            relay_manager.publish_to_relays(signed_event, [{'url': url} for url in relay_urls]), SYNC_TIMEOUT
+        )
 
         if success_rate > 0:
             event.write({
@@ -143,15 +151,7 @@ class AsyncPublishStrategy(PublishStrategy):
     Async publishing strategy with enhanced error handling and parallel publishing.
     """
     async def publish_to_relay(self, url, message):
-        try:
-            async with websockets.connect(url, close_timeout=30) as websocket:
-                await websocket.send(message)
-                response = await asyncio.wait_for(websocket.recv(), timeout=10.0)
-                return {'success': True, 'url': url, 'response': response}
-        except websockets.WebSocketException as e:
-            return {'success': False, 'url': url, 'error': f"WebSocket error: {str(e)}"}
-        except Exception as e:
-            return {'success': False, 'url': url, 'error': f"General error: {str(e)}"}
+        return await get_relay_pool().request(url, message, timeout=10.0)
 
     async def _publish_to_relays(self, relay_urls, event_message):
         tasks = [self.publish_to_relay(url, event_message) for url in relay_urls]
@@ -162,8 +162,8 @@ class AsyncPublishStrategy(PublishStrategy):
             if not result['success']:
                 _logger.error(f"Failed to publish to {result['url']}: {result['error']}")
 
-        # Determine if at least one relay succeeded
-        success = any(result['success'] for result in results)
+        # Determine if at least one relay accepted the event
+        success = any(result.get('accepted') for result in results)
         return success
 
     def publish(self, event):
@@ -180,10 +180,8 @@ class AsyncPublishStrategy(PublishStrategy):
             if not relay_urls:
                 return event._return_notification("Configuration Error", "No Nostr relay URLs configured.", "warning")
             
-            # Use asyncio to run the publishing process
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            success = loop.run_until_complete(self._publish_to_relays(relay_urls, event_message))
+            # Run the publishing process on the shared async runtime
+            success = run_sync(self._publish_to_relays(relay_urls, event_message), SYNC_TIMEOUT)
             
             if success:
                 event.write({
@@ -210,9 +208,16 @@ class RelayManager:
 
     def _get_relay_urls(self):
         urls = self.env['ir.config_parameter'].sudo().get_param('nostr_bridge.relay_urls', '').split(',')
+        urls = [url.strip() for url in urls if url.strip()]
         _logger.info(f"Retrieved {len(urls)} relay URLs from configuration")
         return urls
 
+    def _get_int_param(self, key, default):
+        try:
+            return int(self.env['ir.config_parameter'].sudo().get_param(key, default))
+        except (TypeError, ValueError):
+            return default
+
     async def test_relay(self, url):
         _logger.info(f"Testing relay: {url}")
         try:
@@ -222,9 +227,11 @@ class RelayManager:
                 response = await asyncio.wait_for(websocket.recv(), timeout=5.0)
                 end_time = time.time()
                 _logger.info(f"Successfully tested relay {url}. Response time: {end_time - start_time:.2f} seconds")
+                get_relay_scoreboard().record(url, True, end_time - start_time)
                 return {'url': url, 'success': True, 'response_time': end_time - start_time}
         except Exception as e:
             _logger.error(f"Failed to test relay {url}: {str(e)}")
+            get_relay_scoreboard().record(url, False)
             return {'url': url, 'success': False, 'error': str(e)}
 
     async def test_relays(self):
@@ -232,54 +239,65 @@ class RelayManager:
         tasks = [self.test_relay(url) for url in self.relay_urls]
         results = await asyncio.gather(*tasks)
         self.successful_relays = [result for result in results if result['success']]
-        self.successful_relays.sort(key=lambda x: x['response_time'])
+        ranked = get_relay_scoreboard().rank([relay['url'] for relay in self.successful_relays])
+        self.successful_relays.sort(key=lambda relay: ranked.index(relay['url']))
         _logger.info(f"Completed relay testing. {len(self.successful_relays)} successful relays out of {len(self.relay_urls)}")
         return self.successful_relays[:108]
 
-    def select_best_relays(self, n=9):
-        return self.successful_relays[:n]
+    def select_best_relays(self, n=None):
+        """Return the ``n`` relays with the lowest expected ack time."""
+        if n is None:
+            n = self._get_int_param('nostr_bridge.max_publish_relays', DEFAULT_MAX_RELAYS)
+        return get_relay_scoreboard().select(self.relay_urls, n)
 
     async def publish_to_relay(self, url, event):
         _logger.info(f"Attempting to publish to relay: {url}")
-        try:
-            async with websockets.connect(url, close_timeout=10) as websocket:
-                message = event.to_message()
-                await websocket.send(message)
-                response = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-                _logger.info(f"Successfully published to relay {url}. Response: {response}")
-                return {'url': url, 'success': True, 'response': response}
-        except Exception as e:
-            _logger.error(f"Failed to publish to relay {url}: {str(e)}")
-            return {'url': url, 'success': False, 'error': str(e)}
+        result = await get_relay_pool().publish_event(url, event, timeout=5.0)
+        if result['success']:
+            _logger.info(f"Successfully published to relay {url}. Response: {result['response']}")
+        return result
 
     async def publish_to_relays(self, event, relays):
         _logger.info(f"Attempting to publish to {len(relays)} relays")
         tasks = [self.publish_to_relay(relay['url'], event) for relay in relays]
         results = await asyncio.gather(*tasks)
-        success_count = sum(1 for result in results if result['success'])
+        success_count = sum(1 for result in results if result.get('accepted'))
         _logger.info(f"Published to {success_count} out of {len(relays)} relays")
         return success_count / len(relays)
 
+    async def publish_to_quorum(self, event, relays, quorum):
+        _logger.info(f"Attempting to publish to {len(relays)} relays, quorum {quorum}")
+        results = await get_relay_pool().publish_quorum(relays, event.id, event.to_message(), quorum, timeout=5.0)
+        accepted = sum(1 for result in results if result.get('accepted'))
+        pending = sum(1 for result in results if result.get('pending'))
+        _logger.info(f"Published to {accepted} out of {len(relays)} relays, {pending} still publishing")
+        return accepted
+
     async def manage_relay_list(self, event):
         _logger.info("Starting manage_relay_list process")
-        await self.test_relays()
+        scoreboard = get_relay_scoreboard()
+        if not scoreboard.snapshot(self.relay_urls):
+            # nothing measured yet by this process
+            await self.test_relays()
+        quorum = self._get_int_param('nostr_bridge.publish_quorum', DEFAULT_QUORUM)
+        ranked = scoreboard.rank(self.relay_urls)
         relays_to_use = self.select_best_relays()
+        quorum = min(quorum, len(relays_to_use)) or 1
         _logger.info(f"Selected {len(relays_to_use)} best relays for publishing")
-        success_rate = await self.publish_to_relays(event, relays_to_use)
-        _logger.info(f"Initial publish attempt success rate: {success_rate:.2f}")
-        
-        attempts = 1
-        while success_rate < 0.5 and attempts < 12:
-            _logger.warning(f"Low success rate ({success_rate:.2f}). Attempt {attempts}/12. Trying next set of relays.")
-            relays_to_use = self.select_best_relays(n=9*attempts)[-9:]
-            success_rate = await self.publish_to_relays(event, relays_to_use)
-            attempts += 1
-
-        if success_rate < 0.5:
-            _logger.error(f"Failed to achieve 50% success rate after {attempts} attempts")
+        accepted = await self.publish_to_quorum(event, relays_to_use, quorum)
+
+        if accepted < quorum:
+            # the ranking was off: try the next relays once
+            fallback = ranked[len(relays_to_use):len(relays_to_use) * 2]
+            if fallback:
+                _logger.warning(f"Only {accepted}/{quorum} relays accepted the event, trying {len(fallback)} more")
+                accepted += await self.publish_to_quorum(event, fallback, quorum - accepted)
+
+        if accepted < quorum:
+            _logger.error(f"Failed to reach a quorum of {quorum} relays, {accepted} accepted the event")
             return False
-        
-        successful_urls = [relay['url'] for relay in self.successful_relays[:108]]
+
+        successful_urls = scoreboard.rank(self.relay_urls)[:108]
         self.env['ir.config_parameter'].sudo().set_param('nostr_bridge.successful_relays', ','.join(successful_urls))
         _logger.info(f"Updated successful relays list with {len(successful_urls)} relays")
         return True
@@ -298,8 +316,19 @@ class NostrEvent(models.Model):
     created_at = fields.Integer(string='Created At', required=False)
     signature = fields.Char(string='Signature', required=False)
     published = fields.Boolean(string='Published', default=False)
+    publish_state = fields.Selection([
+        ('draft', 'Draft'),
+        ('pending_publish', 'Pending Publish'),
+        ('published', 'Published'),
+        ('publish_failed', 'Publish Failed'),
+    ], string='Publish State', default='draft', required=True, index=True)
+    publish_attempts = fields.Integer(string='Publish Attempts', default=0)
     logs = fields.Text(string='Logs')
 
+    _sql_constraints = [
+        ('unique_event_id', 'UNIQUE(event_id)', 'Event ID must be unique!')
+    ]
+
     @api.model
     def default_get(self, fields):
         res = super(NostrEvent, self).default_get(fields)
@@ -320,15 +349,18 @@ class NostrEvent(models.Model):
             return bytes(bech32.convertbits(data, 5, 8, False)).hex()
         return key  # Assume it's already in hex format if not bech32
 
-    @api.model
-    def create(self, vals):
-        if 'public_key' in vals:
-            vals['public_key'] = self._bech32_to_hex(vals['public_key'])
-        return super(NostrEvent, self).create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            if 'public_key' in vals:
+                vals['public_key'] = self._bech32_to_hex(vals['public_key'])
+        return super(NostrEvent, self).create(vals_list)
 
     def write(self, vals):
         if 'public_key' in vals:
             vals['public_key'] = self._bech32_to_hex(vals['public_key'])
+        if vals.get('published'):
+            vals.setdefault('publish_state', 'published')
         return super(NostrEvent, self).write(vals)
 
     def _ensure_private_key(self):
@@ -379,6 +411,8 @@ class NostrEvent(models.Model):
 
     @enhanced_publish_event
     def publish_event(self):
+        if self._use_publish_outbox():
+            return self._queue_publish()
         _logger.info(f"Starting publish_event for Nostr event: {self.event_id}")
         strategy = self._get_publish_strategy()
         _logger.info(f"Selected publish strategy: {strategy.__class__.__name__}")
@@ -402,18 +436,18 @@ class NostrEvent(models.Model):
     def _new_relay_management_publish(self):
         _logger.info(f"Starting _new_relay_management_publish for event: {self.event_id}")
         relay_manager = RelayManager(self.env)
-        event = self._create_nostr_event()
+        event = self._sign_event(self._create_nostr_event())
         _logger.info(f"Created Nostr event: {event.id}")
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
         try:
             _logger.info("Attempting to publish event using manage_relay_list")
-            success = loop.run_until_complete(relay_manager.manage_relay_list(event))
+            success = run_sync(relay_manager.manage_relay_list(event), SYNC_TIMEOUT)
             _logger.info(f"manage_relay_list result: {'Success' if success else 'Failure'}")
             
             if success:
                 self.write({
+                    'event_id': event.id,
+                    'signature': event.signature,
                     'published': True,
                     'logs': "Event published successfully using new relay management system."
                 })
@@ -425,9 +459,6 @@ class NostrEvent(models.Model):
         except Exception as e:
             _logger.exception(f"Exception in _new_relay_management_publish: {str(e)}")
             return self._return_notification("Error", f"An unexpected error occurred: {str(e)}", "danger", sticky=True)
-        finally:
-            loop.close()
-            _logger.info("Closed asyncio loop")
 
     def _bech32_to_hex(self, bech32_key):
         try:
@@ -556,21 +587,190 @@ class NostrEvent(models.Model):
         
         return nostr_event
 
+    def create_and_publish_many(self, events):
+        nostr_events = self.create([{
+            'event_id': event.id,
+            'kind': event.kind,
+            'content': event.content,
+            'tags': json.dumps(event.tags),
+            'public_key': event.public_key,
+            'created_at': event.created_at,
+            'signature': event.signature,
+        } for event in events])
+        self.publish_many(nostr_events)
+        return nostr_events
+
+    @api.model
+    def publish_many(self, events, timeout=10.0):
+        """
+        Sign a recordset of events and publish them in one batch.
+
+        Every relay gets all EVENT frames pipelined over its pooled connection,
+        the OK acks are collected concurrently and the results are written back
+        in a single UPDATE instead of one write per event.
+        """
+        if not events:
+            return self._return_notification("Nothing to Publish", "No Nostr events to publish.", "warning")
+        relay_urls = [url.strip() for url in RelayManager(self.env).relay_urls if url.strip()]
+        if not relay_urls:
+            return self._return_notification("Configuration Error", "No Nostr relay URLs configured.", "warning")
+
+        signed_events = [record._sign_event(record._create_nostr_event()) for record in events]
+        frames = [(event.id, event.to_message()) for event in signed_events]
+        _logger.info(f"Publishing {len(frames)} Nostr events to {len(relay_urls)} relays")
+        results = get_relay_pool().publish_batch_sync(relay_urls, frames, timeout=timeout)
+
+        rows = []
+        published_count = 0
+        for index, (record, signed_event) in enumerate(zip(events, signed_events)):
+            event_results = [results[url][index] for url in relay_urls]
+            logs = "\n".join([f"Relay {r['url']}: {'Success' if r.get('accepted') else 'Failed'} - {r.get('response', r.get('error', 'No response'))}" for r in event_results])
+            if any(r.get('accepted') for r in event_results):
+                published_count += 1
+                rows.append((record.id, signed_event.id, signed_event.signature, True, 'published', logs))
+            else:
+                rows.append((record.id, record.event_id or None, record.signature or None, record.published, record.publish_state, logs))
+        self._write_publish_results(events, rows)
+
+        _logger.info(f"Published {published_count} out of {len(events)} Nostr events")
+        if published_count == len(events):
+            return self._return_notification("Success", f"{published_count} Nostr events published successfully.", "success")
+        if published_count:
+            return self._return_notification("Partially Published", f"{published_count} out of {len(events)} Nostr events published.", "warning", sticky=True)
+        return self._return_notification("Publishing Failed", "Failed to publish Nostr events to any relay.", "danger", sticky=True)
+
+    def _write_publish_results(self, events, rows):
+        # values differ per record, so a regular write() would issue one
+        # UPDATE per event: write them all with a single UPDATE ... FROM VALUES
+        events.flush_recordset(['event_id', 'signature', 'published', 'publish_state', 'logs'])
+        execute_values(
+            self.env.cr._obj,
+            """
+            UPDATE nostr_event AS e
+               SET event_id = v.event_id,
+                   signature = v.signature,
+                   published = v.published,
+                   publish_state = v.publish_state,
+                   logs = v.logs,
+                   write_uid = %s,
+                   write_date = (now() at time zone 'UTC')
+              FROM (VALUES %%s) AS v(id, event_id, signature, published, publish_state, logs)
+             WHERE e.id = v.id
+            """ % self.env.uid,
+            rows,
+        )
+        events.invalidate_recordset(['event_id', 'signature', 'published', 'publish_state', 'logs', 'write_uid', 'write_date'])
+
+    # ---- Outbox ----
+
+    def _use_publish_outbox(self):
+        return self.env['ir.config_parameter'].sudo().get_param('nostr_bridge.use_publish_outbox', 'False') == 'True'
+
+    def _queue_publish(self):
+        """
+        Mark the events as pending and let the ``root.nostr.publish`` queue
+        channel publish them, keeping relay latency out of the request.
+        """
+        self.write({'publish_state': 'pending_publish', 'publish_attempts': 0})
+        self._enqueue_publish_outbox()
+        return self._return_notification("Queued", f"{len(self)} Nostr event(s) queued for publishing.", "info")
+
+    @api.model
+    def _enqueue_publish_outbox(self, eta=None):
+        # identity_exact: a single pending drain job is enough however many
+        # events are queued while it waits
+        self.sudo().with_delay(
+            eta=eta,
+            identity_key=identity_exact,
+            description="Publish pending Nostr events",
+        )._drain_publish_outbox()
+
+    @api.model
+    def _drain_publish_outbox(self):
+        """Publish one batch of pending events, then schedule the next one."""
+        params = self.env['ir.config_parameter'].sudo()
+        batch_size = int(params.get_param('nostr_bridge.outbox_batch_size', 100))
+        max_attempts = int(params.get_param('nostr_bridge.outbox_max_attempts', 5))
+        if not params.get_param('nostr_bridge.relay_urls', '').strip():
+            raise RetryableJobError("No Nostr relay URLs configured")
+
+        # fresh events first so that retries do not starve them
+        events = self.search([('publish_state', '=', 'pending_publish')], order='publish_attempts, id', limit=batch_size)
+        if not events:
+            return "No pending Nostr events"
+        # events are signed with the key of the user who created them
+        for user in events.mapped('create_uid'):
+            user_events = events.filtered(lambda e: e.create_uid == user).with_user(user)
+            user_events.publish_many(user_events)
+
+        failed = events.filtered(lambda e: e.publish_state == 'pending_publish')
+        for attempts in set(failed.mapped('publish_attempts')):
+            retried = failed.filtered(lambda e: e.publish_attempts == attempts)
+            retried.write({
+                'publish_attempts': attempts + 1,
+                'publish_state': 'pending_publish' if attempts + 1 < max_attempts else 'publish_failed',
+            })
+
+        if self.search_count([('publish_state', '=', 'pending_publish'), ('id', 'not in', failed.ids)]):
+            self._enqueue_publish_outbox()
+        elif failed.filtered(lambda e: e.publish_state == 'pending_publish'):
+            # only retries left: back off before hammering the relays again
+            self._enqueue_publish_outbox(eta=60 * min(failed.mapped('publish_attempts')))
+        return f"Published {len(events) - len(failed)} out of {len(events)} Nostr events"
+
     def action_publish(self):
         self.ensure_one()
         return self.publish_event()
 
+    def action_publish_many(self):
+        if self._use_publish_outbox():
+            return self._queue_publish()
+        return self.publish_many(self)
+
     @api.model
     def process_incoming_events(self):
+        """Fetch the events stored on the relays since our cursors.
+
+        Reads every relay until EOSE and returns: following the relays
+        continuously is the job of the subscriber daemon
+        (``python -m odoo.addons.gitlab_nostr_bridge.subscriber``).
+        """
         relay_urls = self.env['ir.config_parameter'].sudo().get_param('nostr_bridge.relay_urls', '').split(',')
         relay_urls = [url.strip() for url in relay_urls if url.strip()]
+        if not relay_urls:
+            _logger.warning("No relay URLs configured, not fetching incoming Nostr events")
+            return 0
 
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(self._listen_to_relays(relay_urls))
-        finally:
-            loop.close()
+        # no timeout: the catch-up ends with the stored events of every relay
+        return run_sync(self._catch_up_relays(relay_urls, INCOMING_SUBSCRIPTION))
+
+    async def _catch_up_relays(self, relay_urls, subscription, kinds=None):
+        """Read the backlog of ``relay_urls`` from the ``subscription`` cursors."""
+        cursors = load_cursors(self.env.cr, subscription)
+        # one ingest for all relays: coroutines share the thread and cursor
+        ingest = CursorIngest(self.env.cr.dbname)
+
+        def on_event(url, event_data):
+            if ingest.add(url, event_data):
+                self._flush_ingest(ingest, subscription)
+
+        async def catch_up(url):
+            try:
+                await read_relay(url, build_filter(cursors.get(url), kinds), on_event,
+                                 on_eose=ingest.end_of_stored_events, until_eose=True)
+            except Exception as e:
+                ingest.disconnected(url)
+                _logger.error(f"Error fetching events from relay {url}: {str(e)}")
+
+        await asyncio.gather(*[catch_up(url) for url in relay_urls])
+        return self._flush_ingest(ingest, subscription)
+
+    def _flush_ingest(self, ingest, subscription):
+        inserted, cursors = ingest.flush(self.env.cr, self.env.uid)
+        save_cursors(self.env.cr, subscription, cursors, self.env.uid)
+        # make every batch and its cursors visible right away
+        self.env.cr.commit()
+        return inserted
 
     @api.model
     async def publish_nostr_event(self, content, public_key, private_key, relay_urls, kind=1, tags=None, created_at=None):
@@ -592,38 +792,27 @@ class NostrEvent(models.Model):
             _logger.info(f"Event created with ID {event.id} and signature {event.signature}")
 
             async def publish_to_relay(url, signed_event, retries=3):
+                # the pool reconnects on its own, retries only cover relays
+                # that did not answer in time
                 for attempt in range(retries):
-                    try:
-                        async with websockets.connect(url.strip(), ping_interval=20, ping_timeout=10, close_timeout=10) as websocket:
-                            message_data = ["EVENT", json.loads(signed_event.to_message())]
-                            message = json.dumps(message_data)
-                            _logger.info(f"Sending message to {url}: {message[:100]}...")  # Log first 100 chars
-                            await websocket.send(message)
-                            response = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-                            _logger.info(f"Received response from {url}: {response}")
-                            return {'url': url, 'success': True, 'response': response}
-                    except websockets.exceptions.InvalidStatusCode as e:
-                        _logger.error(f"Invalid status code from relay {url}: {e}")
-                        return {'url': url, 'success': False, 'error': f"Invalid status code: {e}"}
-                    except asyncio.TimeoutError:
-                        _logger.warning(f"Timeout while connecting to relay {url}. Attempt {attempt + 1} of {retries}")
-                    except Exception as e:
-                        _logger.error(f"Error connecting to relay {url}: {str(e)}")
-                        if attempt == retries - 1:
-                            return {'url': url, 'success': False, 'error': str(e)}
+                    result = await get_relay_pool().publish_event(url, signed_event, timeout=5.0)
+                    if result['success']:
+                        _logger.info(f"Received response from {url}: {result['response']}")
+                        return result
+                    _logger.warning(f"Failed to publish to relay {url}. Attempt {attempt + 1} of {retries}: {result['error']}")
                     await asyncio.sleep(1)  # Wait before retrying
                 return {'url': url, 'success': False, 'error': "Max retries reached"}
 
             tasks = [publish_to_relay(url, event) for url in relay_urls]
             results = await asyncio.gather(*tasks)
 
-            success_count = sum(1 for result in results if result['success'])
+            success_count = sum(1 for result in results if result.get('accepted'))
             _logger.info(f"Published event to {success_count} out of {len(relay_urls)} relays")
 
             # Detailed error reporting
             for result in results:
-                if not result['success']:
-                    _logger.error(f"Failed to publish to relay {result['url']}: {result.get('error', 'Unknown error')}")
+                if not result.get('accepted'):
+                    _logger.error(f"Failed to publish to relay {result['url']}: {result.get('error', result.get('response', 'Unknown error'))}")
 
             return results
         except Exception as e:
@@ -631,54 +820,14 @@ class NostrEvent(models.Model):
             raise UserError(f"Failed to publish Nostr event: {str(e)}")
 
     def publish_event_sync(self, content, public_key, private_key, relay_urls, kind=1, tags=None, created_at=None):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
         try:
-            results = loop.run_until_complete(self.publish_nostr_event(content, public_key, private_key, relay_urls, kind, tags, created_at))
-            return results
+            return run_sync(
+                self.publish_nostr_event(content, public_key, private_key, relay_urls, kind, tags, created_at),
+                SYNC_TIMEOUT,
+            )
         except Exception as e:
             _logger.error(f"Error in publish_event_sync: {str(e)}", exc_info=True)
             raise UserError(f"Failed to publish Nostr event: {str(e)}")
-        finally:
-            loop.close()
-
-    async def listen_to_relay(self, url):
-        while True:
-            try:
-                async with websockets.connect(url, ping_interval=20, ping_timeout=10) as websocket:
-                    subscription_id = "my_subscription"
-                    await websocket.send(json.dumps(["REQ", subscription_id, {}]))
-                    _logger.info(f"Connected to relay: {url}")
-                    while True:
-                        try:
-                            response = await asyncio.wait_for(websocket.recv(), timeout=30)
-                            _logger.debug(f"Received response from {url}: {response[:100]}...")  # Log first 100 chars
-                            event = json.loads(response)
-                            if event[0] == "EVENT":
-                                if event[1] == subscription_id:
-                                    if event[2] is not None:
-                                        await self._process_event(event[2])
-                                    else:
-                                        _logger.warning(f"Received event with None data from {url}")
-                                else:
-                                    _logger.warning(f"Received event with unexpected subscription ID from {url}: {event[1]}")
-                            elif event[0] == "EOSE":
-                                _logger.info(f"End of stored events received from {url}")
-                            elif event[0] == "NOTICE":
-                                _logger.info(f"Notice from {url}: {event[1]}")
-                            else:
-                                _logger.warning(f"Received unexpected message type from {url}: {event[0]}")
-                        except asyncio.TimeoutError:
-                            await websocket.ping()
-                            _logger.debug(f"Sent ping to {url}")
-                        except json.JSONDecodeError:
-                            _logger.error(f"Failed to decode JSON from {url}: {response}")
-            except websockets.exceptions.ConnectionClosed:
-                _logger.warning(f"Connection closed for relay {url}. Attempting to reconnect...")
-                await asyncio.sleep(5)
-            except Exception as e:
-                _logger.error(f"Error listening to relay {url}: {str(e)}", exc_info=True)
-                await asyncio.sleep(10)
 
     async def verify_event_publication(self, event_id, relay_urls):
         async def check_relay(url):
@@ -695,28 +844,6 @@ class NostrEvent(models.Model):
         results = await asyncio.gather(*tasks)
         return results
 
-    async def _process_event(self, event_data):
-        try:
-            _logger.debug(f"Processing event: {event_data['id'][:10]}...")  # Log first 10 chars of event ID
-            existing_event = self.env['nostr.event'].sudo().search([('event_id', '=', event_data['id'])])
-            if not existing_event:
-                self.env['nostr.event'].sudo().create({
-                    'event_id': event_data['id'],
-                    'kind': event_data['kind'],
-                    'content': event_data['content'],
-                    'tags': json.dumps(event_data['tags']),
-                    'public_key': event_data['public_key'],
-                    'created_at': event_data['created_at'],
-                    'signature': event_data['signature'],
-                    'published': True,
-                })
-                _logger.info(f"Processed new Nostr event: {event_data['id'][:10]}...")
-            else:
-                _logger.debug(f"Skipped existing Nostr event: {event_data['id'][:10]}...")
-        except Exception as e:
-            _logger.error(f"Error processing Nostr event: {str(e)}", exc_info=True)
-            _logger.error(f"Event data: {event_data}")
-
     def action_generate_id_and_signature(self):
         self.ensure_one()
         _logger.info(f"Manually generating ID and signature for event: {self.id}")
@@ -735,8 +862,15 @@ class NostrEvent(models.Model):
     def validate_event(self):
         self.ensure_one()
         try:
-            event = Event.from_dict(json.loads(self.to_json()))
-            is_valid = event.verify()
+            is_valid = verify_event({
+                'id': self.event_id,
+                'pubkey': self.public_key,
+                'created_at': self.created_at,
+                'kind': self.kind,
+                'tags': json.loads(self.tags or '[]'),
+                'content': self.content,
+                'sig': self.signature,
+            })
             if is_valid:
                 _logger.info(f"Event {self.event_id} is valid")
                 return True
@@ -775,6 +909,20 @@ class ResConfigSettings(models.TransientModel):
         string="Use New Relay Management System",
         config_parameter='use_new_relay_management'
     )
+    use_publish_outbox = fields.Boolean(
+        string="Publish Through Job Queue",
+        config_parameter='nostr_bridge.use_publish_outbox'
+    )
+    nostr_max_publish_relays = fields.Integer(
+        string="Relays",
+        config_parameter='nostr_bridge.max_publish_relays',
+        default=DEFAULT_MAX_RELAYS
+    )
+    nostr_publish_quorum = fields.Integer(
+        string="Quorum",
+        config_parameter='nostr_bridge.publish_quorum',
+        default=DEFAULT_QUORUM
+    )
 
 # ---- Utility Functions ----
 
@@ -795,13 +943,8 @@ class NostrRelayTester(models.Model):
     @api.model
     def _test_and_update_relays(self):
         relay_manager = RelayManager(self.env)
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            successful_relays = loop.run_until_complete(relay_manager.test_relays())
-            successful_urls = [relay['url'] for relay in successful_relays]
-            self.env['ir.config_parameter'].sudo().set_param('nostr_bridge.successful_relays', ','.join(successful_urls))
-            _logger.info(f"Updated successful relays: {len(successful_urls)} relays")
-        finally:
-            loop.close()
+        successful_relays = run_sync(relay_manager.test_relays(), SYNC_TIMEOUT)
+        successful_urls = [relay['url'] for relay in successful_relays]
+        self.env['ir.config_parameter'].sudo().set_param('nostr_bridge.successful_relays', ','.join(successful_urls))
+        _logger.info(f"Updated successful relays: {len(successful_urls)} relays")
            
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields
+
+
+class NostrRelayCursor(models.Model):
+    _name = 'nostr.relay.cursor'
+    _description = 'Nostr Relay Subscription Cursor'
+    _order = 'subscription, relay_url'
+
+    relay_url = fields.Char(string='Relay URL', required=True)
+    subscription = fields.Char(string='Subscription', required=True,
+                               help="Name of the subscription the cursor belongs to")
+    since = fields.Integer(string='Since',
+                           help="Highest created_at stored from this relay; subscriptions resume from it")
+
+    _sql_constraints = [
+        ('unique_relay_subscription', 'UNIQUE(relay_url, subscription)',
+         'There is already a cursor for this relay and subscription!')
+    ]
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+
+# Process-wide pool of persistent relay websockets.
+#
+# Every publish path used to open a new websocket per event and per relay,
+# paying a TCP + TLS + websocket handshake each time. The pool keeps one
+# long-lived connection per relay URL on the shared async runtime loop,
+# sends EVENT frames over it and matches the relay's OK replies by event id,
+# so publishing a burst of events costs one round trip per event. Every ack
+# (or failure) is fed to the relay scoreboard.
+
+import asyncio
+import json
+import logging
+import threading
+import time
+
+import websockets
+
+from .async_runtime import get_async_runtime
+from .relay_scoring import get_relay_scoreboard
+
+_logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 10.0
+ACK_TIMEOUT = 10.0
+# websockets sends a ping every PING_INTERVAL seconds and drops the
+# connection if no pong arrives within PING_TIMEOUT: this is our health check
+PING_INTERVAL = 20
+PING_TIMEOUT = 10
+# connections unused for that long are closed by the janitor
+IDLE_TIMEOUT = 300
+JANITOR_INTERVAL = 60
+# seconds to wait before reconnecting after consecutive connection failures
+RECONNECT_BACKOFF = (1, 2, 5, 10, 30, 60)
+# attempts to publish when the connection is lost before the OK arrives:
+# the pooled socket may have died while idle or the relay dropped it
+PUBLISH_ATTEMPTS = 3
+
+
+def event_id_from_message(message):
+    """Return the event id of a serialized ``["EVENT", {...}]`` frame."""
+    frame = json.loads(message)
+    if not isinstance(frame, list) or len(frame) < 2 or frame[0] != 'EVENT':
+        raise ValueError(f"Not an EVENT frame: {message[:100]}")
+    return frame[1]['id']
+
+
+class RelayConnection:
+    """A long-lived websocket to a single relay.
+
+    Instances live on the pool loop and must only be used from it.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.websocket = None
+        self.reader_task = None
+        self.pending_acks = {}
+        self.connect_lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        self.failures = 0
+        self.retry_at = 0.0
+
+    @property
+    def connected(self):
+        return (
+            self.websocket is not None
+            and self.reader_task is not None
+            and not self.reader_task.done()
+        )
+
+    async def ensure_connected(self):
+        if self.connected:
+            return self.websocket
+        async with self.connect_lock:
+            if self.connected:
+                return self.websocket
+            now = time.monotonic()
+            if now < self.retry_at:
+                raise ConnectionError(
+                    f"Relay {self.url} unreachable, next attempt in {self.retry_at - now:.1f}s"
+                )
+            try:
+                websocket = await asyncio.wait_for(
+                    websockets.connect(
+                        self.url,
+                        ping_interval=PING_INTERVAL,
+                        ping_timeout=PING_TIMEOUT,
+                        close_timeout=5,
+                    ),
+                    timeout=CONNECT_TIMEOUT,
+                )
+            except Exception:
+                self.failures += 1
+                delay = RECONNECT_BACKOFF[min(self.failures, len(RECONNECT_BACKOFF)) - 1]
+                self.retry_at = time.monotonic() + delay
+                raise
+            self.failures = 0
+            self.retry_at = 0.0
+            self.websocket = websocket
+            self.reader_task = asyncio.get_running_loop().create_task(self._read_loop(websocket))
+            _logger.info(f"Opened pooled connection to relay {self.url}")
+            return websocket
+
+    async def _read_loop(self, websocket):
+        try:
+            async for raw in websocket:
+                self._dispatch(raw)
+        except websockets.exceptions.ConnectionClosed as e:
+            _logger.info(f"Pooled connection to relay {self.url} closed: {e}")
+        except Exception as e:
+            _logger.error(f"Error reading from relay {self.url}: {str(e)}", exc_info=True)
+        finally:
+            if self.websocket is websocket:
+                self.websocket = None
+            self._fail_pending(ConnectionError(f"Connection to relay {self.url} lost"))
+
+    def _dispatch(self, raw):
+        try:
+            message = json.loads(raw)
+        except (TypeError, ValueError):
+            _logger.warning(f"Invalid frame from relay {self.url}: {str(raw)[:100]}")
+            return
+        if not isinstance(message, list) or not message:
+            return
+        if message[0] == 'OK' and len(message) >= 2:
+            future = self.pending_acks.pop(message[1], None)
+            if future is not None and not future.done():
+                future.set_result(raw)
+        elif message[0] == 'NOTICE':
+            _logger.info(f"Notice from {self.url}: {message[1:]}")
+        else:
+            _logger.debug(f"Ignoring unsolicited frame from {self.url}: {str(raw)[:100]}")
+
+    def _fail_pending(self, exc):
+        pending, self.pending_acks = self.pending_acks, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    async def publish(self, event_id, message, timeout=ACK_TIMEOUT):
+        """Send an EVENT frame and wait for the matching OK frame."""
+        self.last_used = time.monotonic()
+        future = self.pending_acks.get(event_id)
+        if future is None:
+            websocket = await self.ensure_connected()
+            future = asyncio.get_running_loop().create_future()
+            self.pending_acks[event_id] = future
+            try:
+                await websocket.send(message)
+            except Exception:
+                self.pending_acks.pop(event_id, None)
+                raise
+        try:
+            # shielded: a concurrent publish of the same event waits on it too
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if self.pending_acks.get(event_id) is future:
+                del self.pending_acks[event_id]
+            raise
+
+    async def publish_many(self, frames, timeout=ACK_TIMEOUT):
+        """Pipeline ``(event_id, message)`` frames and collect their OKs.
+
+        All frames are written back to back without waiting for the relay;
+        returns one ``(outcome, latency)`` pair per frame, the outcome being
+        the raw OK frame or an exception.
+        """
+        self.last_used = time.monotonic()
+        websocket = await self.ensure_connected()
+        loop = asyncio.get_running_loop()
+        futures = []
+        sent_at = []
+        acked_at = {}
+        for index, (event_id, message) in enumerate(frames):
+            future = self.pending_acks.get(event_id)
+            sent_at.append(time.monotonic())
+            if future is None:
+                future = self.pending_acks[event_id] = loop.create_future()
+                try:
+                    await websocket.send(message)
+                except Exception as e:
+                    self.pending_acks.pop(event_id, None)
+                    future.set_exception(e)
+            future.add_done_callback(
+                lambda _future, index=index: acked_at.setdefault(index, time.monotonic())
+            )
+            futures.append(future)
+        await asyncio.wait(futures, timeout=timeout)
+        outcomes = []
+        for index, ((event_id, _message), future) in enumerate(zip(frames, futures)):
+            if not future.done():
+                if self.pending_acks.get(event_id) is future:
+                    del self.pending_acks[event_id]
+                outcomes.append((asyncio.TimeoutError(), None))
+            elif future.exception() is not None:
+                outcomes.append((future.exception(), None))
+            else:
+                outcomes.append((future.result(), acked_at.get(index, time.monotonic()) - sent_at[index]))
+        return outcomes
+
+    async def close(self):
+        websocket = self.websocket
+        self.websocket = None
+        if websocket is not None:
+            await websocket.close()
+
+
+class RelayPool:
+    """Per-process registry of :class:`RelayConnection` objects.
+
+    Every coroutine touching a connection runs on the loop of the shared
+    async runtime. The public coroutines can be awaited from any other
+    event loop and the ``*_sync`` variants from plain synchronous code.
+    """
+
+    def __init__(self, runtime=None):
+        self.runtime = runtime or get_async_runtime()
+        self._connections = {}
+        self._background = set()
+        self._loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        loop = self.runtime.loop
+        with self._lock:
+            # the runtime restarts its loop in a forked worker: the
+            # connections inherited from the parent are unusable there
+            if loop is not self._loop:
+                self._connections = {}
+                self._background = set()
+                self._loop = loop
+                asyncio.run_coroutine_threadsafe(self._janitor(), loop)
+                _logger.info("Attached Nostr relay pool to the async runtime")
+            return self._loop
+
+    def _run_sync(self, coro, timeout):
+        return self.runtime.run_sync(coro, timeout + CONNECT_TIMEOUT + 5)
+
+    async def _janitor(self):
+        while True:
+            await asyncio.sleep(JANITOR_INTERVAL)
+            now = time.monotonic()
+            for url, connection in list(self._connections.items()):
+                if connection.pending_acks or now - connection.last_used < IDLE_TIMEOUT:
+                    continue
+                del self._connections[url]
+                try:
+                    await connection.close()
+                    _logger.info(f"Closed idle pooled connection to relay {url}")
+                except Exception as e:
+                    _logger.debug(f"Error closing idle connection to {url}: {str(e)}")
+
+    def _get_connection(self, url):
+        connection = self._connections.get(url)
+        if connection is None:
+            connection = self._connections[url] = RelayConnection(url)
+        return connection
+
+    async def _run(self, coro):
+        loop = self.loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    @staticmethod
+    def _result(url, event_id, outcome, timeout):
+        if isinstance(outcome, asyncio.TimeoutError):
+            _logger.warning(f"Timed out waiting for OK from relay {url} for event {event_id}")
+            return {'url': url, 'success': False, 'error': f"No OK received within {timeout}s"}
+        if isinstance(outcome, BaseException):
+            _logger.error(f"Failed to publish event {event_id} to relay {url}: {str(outcome)}")
+            return {'url': url, 'success': False, 'error': str(outcome)}
+        frame = json.loads(outcome)
+        accepted = len(frame) > 2 and frame[2] is True
+        return {'url': url, 'success': True, 'accepted': accepted, 'response': outcome}
+
+    @staticmethod
+    def _record(result, latency):
+        # feeds the relay scoring engine; a relay answering OK false did
+        # not store the event and counts as a failure
+        get_relay_scoreboard().record(result['url'], result.get('accepted', False), latency)
+        return result
+
+    async def _publish(self, url, event_id, message, timeout):
+        connection = self._get_connection(url)
+        started = time.monotonic()
+        for attempt in range(1, PUBLISH_ATTEMPTS + 1):
+            try:
+                outcome = await connection.publish(event_id, message, timeout)
+            except (websockets.exceptions.ConnectionClosed, ConnectionError) as e:
+                # retry on a fresh connection unless the relay is in backoff
+                outcome = e
+                if attempt < PUBLISH_ATTEMPTS and connection.retry_at <= time.monotonic():
+                    _logger.info(f"Connection to relay {url} lost publishing event {event_id}, retrying")
+                    continue
+            except Exception as e:
+                outcome = e
+            break
+        return self._record(self._result(url, event_id, outcome, timeout), time.monotonic() - started)
+
+    async def _publish_batch(self, url, frames, timeout):
+        connection = self._get_connection(url)
+        outcomes = [None] * len(frames)
+        remaining = list(range(len(frames)))
+        attempt = 1
+        while True:
+            try:
+                sent = await connection.publish_many([frames[index] for index in remaining], timeout)
+            except Exception as e:
+                sent = [(e, None)] * len(remaining)
+            for index, outcome in zip(remaining, sent):
+                outcomes[index] = outcome
+            # resend the frames lost with the connection on a fresh one
+            # unless the relay is in backoff; a relay dropping the
+            # connection mid-batch still answered the frames before it, so
+            # only the attempts which got no answer at all are counted
+            lost = [
+                index for index in remaining
+                if isinstance(outcomes[index][0], (websockets.exceptions.ConnectionClosed, ConnectionError))
+            ]
+            attempt = 1 if len(lost) < len(remaining) else attempt + 1
+            remaining = lost
+            if not remaining or attempt > PUBLISH_ATTEMPTS or connection.retry_at > time.monotonic():
+                break
+            _logger.info(f"Connection to relay {url} lost publishing {len(remaining)} events, retrying")
+        return [
+            self._record(self._result(url, event_id, outcome, timeout), latency)
+            for (event_id, _message), (outcome, latency) in zip(frames, outcomes)
+        ]
+
+    async def _publish_quorum(self, urls, event_id, message, quorum, timeout):
+        tasks = {
+            asyncio.ensure_future(self._publish(url, event_id, message, timeout)): url
+            for url in urls
+        }
+        results = []
+        accepted = 0
+        pending = set(tasks)
+        while pending and accepted < quorum:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                results.append(result)
+                accepted += bool(result.get('accepted'))
+        for task in pending:
+            # the slower relays keep going on the pool loop, their outcome
+            # only feeds the scoreboard
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+            results.append({
+                'url': tasks[task], 'success': False, 'pending': True,
+                'error': "Still publishing in the background",
+            })
+        return results
+
+    async def publish(self, url, event_id, message, timeout=ACK_TIMEOUT):
+        """Publish a serialized EVENT frame to ``url``.
+
+        Returns a result dict with ``url``, ``success`` and either
+        ``response`` (the raw OK frame) and ``accepted``, or ``error``.
+        """
+        return await self._run(self._publish(url.strip(), event_id, message, timeout))
+
+    async def publish_event(self, url, event, timeout=ACK_TIMEOUT):
+        """Publish a signed ``nostr.event.Event`` to ``url``."""
+        return await self.publish(url, event.id, event.to_message(), timeout)
+
+    async def request(self, url, message, timeout=ACK_TIMEOUT):
+        """Publish a serialized EVENT frame, event id taken from the frame."""
+        return await self.publish(url, event_id_from_message(message), message, timeout)
+
+    async def publish_to_relays(self, urls, event_id, message, timeout=ACK_TIMEOUT):
+        async def fan_out():
+            return await asyncio.gather(*[
+                self._publish(url.strip(), event_id, message, timeout) for url in urls
+            ])
+        return await self._run(fan_out())
+
+    def publish_sync(self, urls, event_id, message, timeout=ACK_TIMEOUT):
+        """Blocking variant of :meth:`publish_to_relays`."""
+        return self._run_sync(self.publish_to_relays(urls, event_id, message, timeout), timeout)
+
+    async def publish_batch(self, urls, frames, timeout=ACK_TIMEOUT):
+        """Pipeline ``(event_id, message)`` frames down every relay at once.
+
+        Returns a dict mapping each url to one result dict per frame, in
+        the order of ``frames``.
+        """
+        urls = [url.strip() for url in urls]
+
+        async def fan_out():
+            results = await asyncio.gather(*[
+                self._publish_batch(url, frames, timeout) for url in urls
+            ])
+            return dict(zip(urls, results))
+        return await self._run(fan_out())
+
+    async def publish_quorum(self, urls, event_id, message, quorum, timeout=ACK_TIMEOUT):
+        """Publish to ``urls`` until ``quorum`` relays accepted the event.
+
+        Returns as soon as the quorum is reached (or every relay answered),
+        without waiting on the slowest relays: they are reported with
+        ``pending`` set and keep publishing in the background.
+        """
+        urls = [url.strip() for url in urls]
+        return await self._run(self._publish_quorum(urls, event_id, message, quorum, timeout))
+
+    def publish_quorum_sync(self, urls, event_id, message, quorum, timeout=ACK_TIMEOUT):
+        """Blocking variant of :meth:`publish_quorum`."""
+        return self._run_sync(self.publish_quorum(urls, event_id, message, quorum, timeout), timeout)
+
+    def publish_batch_sync(self, urls, frames, timeout=ACK_TIMEOUT):
+        """Blocking variant of :meth:`publish_batch`."""
+        return self._run_sync(self.publish_batch(urls, frames, timeout), timeout)
+
+
+_relay_pool = RelayPool()
+
+
+def get_relay_pool():
+    return _relay_pool
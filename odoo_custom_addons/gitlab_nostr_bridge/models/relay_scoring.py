@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+# Adaptive relay scoring.
+#
+# Relays used to be ranked once by a single response time sample and the
+# first 9 were used. The scoreboard keeps, per relay, a rolling window of
+# ack latencies and outcomes fed by every publish going through the relay
+# pool, and ranks relays by the time we can expect to wait for their ack:
+# a fast relay that often fails or times out ranks behind a slower reliable
+# one, and a relay on a failure streak sinks until it answers again.
+
+import math
+import threading
+import time
+from collections import deque
+
+ROLLING_WINDOW = 200
+# expected ack time of a relay we know nothing about: optimistic enough to
+# give it a chance, pessimistic enough not to beat known good relays
+UNKNOWN_ACK_TIME = 1.0
+# seconds added to the expected ack time per consecutive failure
+FAILURE_PENALTY = 2.0
+MAX_FAILURE_PENALTY = 60.0
+MIN_SUCCESS_RATE = 0.05
+DEFAULT_MAX_RELAYS = 9
+DEFAULT_QUORUM = 3
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of ``samples``, ``None`` when empty."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class RelayStats:
+    """Rolling publish statistics of one relay."""
+
+    def __init__(self, url):
+        self.url = url
+        self.latencies = deque(maxlen=ROLLING_WINDOW)
+        self.outcomes = deque(maxlen=ROLLING_WINDOW)
+        self.failure_streak = 0
+        self.last_success = None
+        self.last_failure = None
+
+    def record_success(self, latency):
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.failure_streak = 0
+        self.last_success = time.time()
+
+    def record_failure(self):
+        self.outcomes.append(False)
+        self.failure_streak += 1
+        self.last_failure = time.time()
+
+    @property
+    def p50(self):
+        return percentile(self.latencies, 50)
+
+    @property
+    def p90(self):
+        return percentile(self.latencies, 90)
+
+    @property
+    def success_rate(self):
+        if not self.outcomes:
+            return None
+        return sum(self.outcomes) / len(self.outcomes)
+
+    def expected_ack_time(self):
+        """Seconds we expect to wait for an ack from this relay.
+
+        The median latency is inflated by the failure rate (a relay acking
+        half of the time costs twice as much) and by the failure streak.
+        """
+        p50 = self.p50
+        if p50 is None:
+            p50 = UNKNOWN_ACK_TIME
+        success_rate = self.success_rate
+        if success_rate is None:
+            success_rate = 1.0
+        penalty = min(self.failure_streak * FAILURE_PENALTY, MAX_FAILURE_PENALTY)
+        return p50 / max(success_rate, MIN_SUCCESS_RATE) + penalty
+
+    def seed(self, p50=None, success_rate=None, failure_streak=0):
+        """Initialize empty stats from persisted values, e.g. after a restart."""
+        if self.outcomes:
+            return
+        if p50:
+            self.latencies.append(p50)
+        if success_rate is not None:
+            successes = int(round(success_rate * 10))
+            self.outcomes.extend([True] * successes + [False] * (10 - successes))
+        self.failure_streak = failure_streak or 0
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'latency_p50': self.p50,
+            'latency_p90': self.p90,
+            'ack_success_rate': self.success_rate,
+            'failure_streak': self.failure_streak,
+            'expected_ack_time': self.expected_ack_time(),
+        }
+
+
+class RelayScoreboard:
+    """Thread-safe registry of :class:`RelayStats`, one per relay URL."""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        url = url.strip()
+        with self._lock:
+            stats = self._stats.get(url)
+            if stats is None:
+                stats = self._stats[url] = RelayStats(url)
+            return stats
+
+    def record(self, url, success, latency=None):
+        stats = self.get(url)
+        with self._lock:
+            if success:
+                stats.record_success(latency)
+            else:
+                stats.record_failure()
+
+    def seed(self, url, **values):
+        stats = self.get(url)
+        with self._lock:
+            stats.seed(**values)
+
+    def rank(self, urls):
+        """Return ``urls`` sorted by expected ack time, best first."""
+        with self._lock:
+            return sorted(
+                urls,
+                key=lambda url: self._stats[url.strip()].expected_ack_time()
+                if url.strip() in self._stats else UNKNOWN_ACK_TIME,
+            )
+
+    def select(self, urls, n=DEFAULT_MAX_RELAYS):
+        return self.rank(urls)[:n]
+
+    def snapshot(self, urls=None):
+        """Return ``{url: stats dict}`` for ``urls`` (default all known relays)."""
+        with self._lock:
+            if urls is None:
+                urls = list(self._stats)
+            return {
+                url.strip(): self._stats[url.strip()].to_dict()
+                for url in urls if url.strip() in self._stats
+            }
+
+
+_relay_scoreboard = RelayScoreboard()
+
+
+def get_relay_scoreboard():
+    return _relay_scoreboard
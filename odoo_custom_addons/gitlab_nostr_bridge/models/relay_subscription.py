@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+# Cursor-based relay subscriptions.
+#
+# Listeners used to send ``["REQ", id, {}]`` on every (re)connection, so each
+# reconnect replayed the whole history of the relay. A subscription now
+# remembers, per relay, the highest ``created_at`` it stored (the cursor,
+# persisted in nostr_relay_cursor) and resumes with a ``since`` filter.
+#
+# This module has no ORM dependency: it is shared by the in-process catch-up
+# (cron / jobs) and by the standalone subscriber daemon (``subscriber``
+# package), which works on raw psycopg2 connections.
+
+import asyncio
+import json
+import logging
+import uuid
+
+import websockets
+
+from .event_cache import is_seen, normalize_event, verify_event
+from .event_ingest import EventIngestBuffer
+
+_logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 10.0
+RECV_TIMEOUT = 30.0
+# created_at is set by the authors, not by the relays: resume slightly
+# before the cursor so events stored late by a relay are not missed. The
+# replayed overlap is dropped by the seen-cache and ON CONFLICT.
+CURSOR_OVERLAP = 600
+
+SELECT_CURSORS_QUERY = """
+    SELECT relay_url, since FROM nostr_relay_cursor WHERE subscription = %s
+"""
+
+UPSERT_CURSOR_QUERY = """
+    INSERT INTO nostr_relay_cursor (
+        relay_url, subscription, since,
+        create_uid, create_date, write_uid, write_date
+    )
+    VALUES (%s, %s, %s, %s, (now() at time zone 'UTC'), %s, (now() at time zone 'UTC'))
+    ON CONFLICT (relay_url, subscription) DO UPDATE
+       SET since = GREATEST(nostr_relay_cursor.since, EXCLUDED.since),
+           write_uid = EXCLUDED.write_uid,
+           write_date = EXCLUDED.write_date
+"""
+
+
+def load_cursors(cr, subscription):
+    """Return ``{relay_url: since}`` for ``subscription``."""
+    cr.execute(SELECT_CURSORS_QUERY, (subscription,))
+    return dict(cr.fetchall())
+
+
+def save_cursors(cr, subscription, cursors, uid):
+    """Persist ``{relay_url: since}``; a cursor never moves backwards."""
+    for relay_url, since in cursors.items():
+        cr.execute(UPSERT_CURSOR_QUERY, (relay_url, subscription, since, uid, uid))
+
+
+def build_filter(since=None, kinds=None):
+    """NIP-01 filter resuming from the ``since`` cursor."""
+    nostr_filter = {}
+    if kinds:
+        nostr_filter['kinds'] = list(kinds)
+    if since:
+        nostr_filter['since'] = max(int(since) - CURSOR_OVERLAP, 0)
+    return nostr_filter
+
+
+async def read_relay(url, nostr_filter, on_event, on_eose=None, until_eose=False,
+                     recv_timeout=RECV_TIMEOUT):
+    """Subscribe to ``url`` with ``nostr_filter`` and feed ``on_event``.
+
+    ``on_event(url, event_data)`` is called for each EVENT frame and
+    ``on_eose(url)`` once the relay sent all its stored events. With
+    ``until_eose`` the subscription is closed at that point, otherwise it
+    runs until the connection drops (connection errors are raised,
+    reconnecting is up to the caller); ``recv_timeout`` then only bounds
+    the wait for the backlog.
+    """
+    subscription_id = uuid.uuid4().hex[:16]
+    websocket = await asyncio.wait_for(
+        websockets.connect(url, ping_interval=20, ping_timeout=10, close_timeout=5),
+        timeout=CONNECT_TIMEOUT,
+    )
+    try:
+        await websocket.send(json.dumps(["REQ", subscription_id, nostr_filter]))
+        _logger.info(f"Subscribed to relay {url} with filter {nostr_filter}")
+        while True:
+            try:
+                raw = await asyncio.wait_for(websocket.recv(), timeout=recv_timeout)
+            except asyncio.TimeoutError:
+                if until_eose:
+                    _logger.warning(f"Relay {url} did not send EOSE within {recv_timeout}s")
+                    return
+                continue
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                _logger.error(f"Failed to decode JSON from {url}: {raw[:100]}")
+                continue
+            if not isinstance(message, list) or not message:
+                continue
+            if message[0] == 'EVENT' and len(message) >= 3:
+                if message[1] != subscription_id:
+                    _logger.warning(f"Received event with unexpected subscription ID from {url}: {message[1]}")
+                elif isinstance(message[2], dict):
+                    on_event(url, message[2])
+            elif message[0] == 'EOSE':
+                _logger.info(f"End of stored events received from {url}")
+                if on_eose is not None:
+                    on_eose(url)
+                if until_eose:
+                    await websocket.send(json.dumps(["CLOSE", subscription_id]))
+                    return
+            elif message[0] == 'NOTICE':
+                _logger.info(f"Notice from {url}: {message[1:]}")
+            elif message[0] == 'CLOSED':
+                _logger.warning(f"Relay {url} closed the subscription: {message[2:]}")
+                return
+    finally:
+        await websocket.close()
+
+
+class CursorIngest:
+    """Verify, buffer and store events received on a subscription.
+
+    Tracks the highest ``created_at`` received from each relay. Relays send
+    their stored events newest first, so the backlog of a relay only counts
+    towards its cursor once the relay sent EOSE; events received live after
+    that count right away. Cursors are handed out by :meth:`flush`, once
+    every event received before is stored (or discarded): a crash or a
+    dropped connection can cause a replay, never a gap.
+    """
+
+    def __init__(self, dbname, buffer=None):
+        self.dbname = dbname
+        self.buffer = buffer if buffer is not None else EventIngestBuffer()
+        self.backlog = {}
+        self.received = {}
+        self.live = set()
+        self.rejected = 0
+
+    def add(self, url, event_data):
+        """Handle one received event, return True when a flush is due."""
+        try:
+            event_data = normalize_event(event_data)
+            created_at = int(event_data.get('created_at') or 0)
+            cursors = self.received if url in self.live else self.backlog
+            if created_at > cursors.get(url, 0):
+                cursors[url] = created_at
+            # the same event arrives once per subscribed relay
+            if is_seen(self.dbname, event_data['id']):
+                return self.buffer.should_flush()
+            if not verify_event(event_data):
+                self.rejected += 1
+                _logger.warning(f"Discarding Nostr event with invalid id or signature from {url}")
+                return self.buffer.should_flush()
+            return self.buffer.add(event_data)
+        except (KeyError, TypeError, ValueError) as e:
+            self.rejected += 1
+            _logger.warning(f"Discarding malformed Nostr event from {url}: {str(e)}")
+            return self.buffer.should_flush()
+
+    def end_of_stored_events(self, url):
+        self.live.add(url)
+        created_at = self.backlog.pop(url, 0)
+        if created_at > self.received.get(url, 0):
+            self.received[url] = created_at
+
+    def disconnected(self, url):
+        # an interrupted backlog must be requested again from the old cursor
+        self.live.discard(url)
+        self.backlog.pop(url, None)
+
+    def flush(self, cr, uid):
+        """Store the buffered events, return ``(inserted, cursors)``."""
+        inserted = self.buffer.flush(cr, uid)
+        cursors, self.received = self.received, {}
+        return inserted, cursors
@@ -15,6 +15,7 @@ import asyncio
 import websockets
 import json
 from nostr.message_type import ClientMessageType
+from .async_runtime import run_sync
 
 _logger = logging.getLogger(__name__)
 
@@ -125,9 +126,7 @@ class ResConfigSettings(models.TransientModel):
             _logger.info(f"Created test event with ID: {event.id}")
 
             # Test publishing to relays
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            results = loop.run_until_complete(self._test_nostr_relays(relay_urls, event))
+            results = run_sync(self._test_nostr_relays(relay_urls, event), 60)
 
             _logger.info(f"Raw results data: {str(results)}");
 
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from odoo.tools import config
+
+
+def get_config(key, default=None):
+    """Read a setting of the subscriber daemon.
+
+    The Odoo command line cannot be extended, so the daemon is configured
+    through ``ODOO_NOSTR_SUBSCRIBER_<KEY>`` environment variables or a
+    ``[nostr_subscriber]`` section of the Odoo configuration file. The file
+    is read lazily: it is only parsed once the daemon started.
+    """
+    return (
+        os.environ.get(f'ODOO_NOSTR_SUBSCRIBER_{key.upper()}')
+        or config.misc.get('nostr_subscriber', {}).get(key)
+        or default
+    )
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+
+import odoo
+
+from .runner import NostrSubscriberRunner
+
+
+def main():
+    odoo.tools.config.parse_config()
+    runner = NostrSubscriberRunner.from_environ_or_config()
+    runner.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""
+What is the subscriber?
+-----------------------
+A standalone process holding one long-lived subscription per configured
+relay and database, storing every event it receives in ``nostr_event``.
+It replaces the listeners that used to loop forever inside a request or a
+never-ending job.
+
+How does it work?
+-----------------
+
+* For each database where ``gitlab_nostr_bridge`` is installed it reads the
+  ``nostr_bridge.relay_urls`` parameter and the per-relay cursors stored in
+  ``nostr_relay_cursor``.
+* It subscribes to each relay with a ``since`` filter built from the cursor,
+  so a restart or a reconnection only asks for what was not stored yet.
+* Received events are verified, deduplicated and written in batches; the
+  cursors are advanced in the same transaction as the events they cover.
+* The relay list is reloaded periodically; connections that drop are
+  re-established with a backoff.
+
+How to use it?
+--------------
+
+* Run it next to the Odoo server, with the same configuration file:
+
+.. code-block:: none
+
+  python -m odoo.addons.gitlab_nostr_bridge.subscriber -c odoo.conf
+
+* Optionally adjust it through environment variables:
+
+  - ``ODOO_NOSTR_SUBSCRIBER_KINDS=1,30617``, default all kinds.
+  - ``ODOO_NOSTR_SUBSCRIBER_FLUSH_SIZE=500``, events per batch.
+  - ``ODOO_NOSTR_SUBSCRIBER_FLUSH_INTERVAL=5``, max seconds before a batch
+    is written.
+  - ``ODOO_NOSTR_SUBSCRIBER_DB_HOST``, ``..._DB_PORT``, ``..._DB_USER``,
+    ``..._DB_PASSWORD``, default the Odoo database settings.
+
+* Or in the Odoo configuration file:
+
+.. code-block:: ini
+
+  [nostr_subscriber]
+  kinds = 1,30617
+  flush_size = 500
+  flush_interval = 5
+
+* The ``Process Incoming Nostr Events`` scheduled action keeps working
+  without the daemon: it fetches what the relays stored since the same
+  cursors and returns, so it can stay enabled as a safety net.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import closing
+
+import psycopg2
+
+import odoo
+from odoo.tools import config
+
+from . import get_config
+from ..models.event_ingest import FLUSH_INTERVAL, FLUSH_SIZE, EventIngestBuffer
+from ..models.nostr_event import INCOMING_SUBSCRIPTION
+from ..models.relay_subscription import (
+    CursorIngest,
+    build_filter,
+    load_cursors,
+    read_relay,
+    save_cursors,
+)
+
+_logger = logging.getLogger(__name__)
+
+ERROR_RECOVERY_DELAY = 5
+# reload the relay list of every database that often
+REFRESH_INTERVAL = 300
+# seconds to wait before resubscribing after consecutive failures
+RECONNECT_BACKOFF = (1, 2, 5, 10, 30, 60)
+
+
+def _connection_info_for(db_name):
+    db_or_uri, connection_info = odoo.sql_db.connection_info_for(db_name)
+    for p in ('host', 'port', 'user', 'password'):
+        cfg = get_config(f'db_{p}')
+        if cfg:
+            connection_info[p] = cfg
+    return connection_info
+
+
+class Database:
+    def __init__(self, db_name):
+        self.db_name = db_name
+        self.conn = psycopg2.connect(**_connection_info_for(db_name))
+        self.has_nostr_bridge = self._has_nostr_bridge()
+        self.conn.commit()
+
+    def close(self):
+        # pylint: disable=except-pass
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        self.conn = None
+
+    def _has_nostr_bridge(self):
+        with closing(self.conn.cursor()) as cr:
+            cr.execute("SELECT 1 FROM pg_tables WHERE tablename=%s", ('ir_module_module',))
+            if not cr.fetchone():
+                _logger.debug(f"{self.db_name} doesn't seem to be an odoo db")
+                return False
+            cr.execute(
+                "SELECT 1 FROM ir_module_module WHERE name=%s AND state=%s",
+                ('gitlab_nostr_bridge', 'installed'),
+            )
+            if not cr.fetchone():
+                _logger.debug(f"gitlab_nostr_bridge is not installed for db {self.db_name}")
+                return False
+            cr.execute("SELECT 1 FROM pg_tables WHERE tablename=%s", ('nostr_relay_cursor',))
+            if not cr.fetchone():
+                _logger.error(f"nostr_relay_cursor table is missing in db {self.db_name}, update the module")
+                return False
+            return True
+
+    def relay_urls(self):
+        with closing(self.conn.cursor()) as cr:
+            cr.execute(
+                "SELECT value FROM ir_config_parameter WHERE key=%s",
+                ('nostr_bridge.relay_urls',),
+            )
+            row = cr.fetchone()
+        self.conn.commit()
+        relay_urls = (row[0] if row else '') or ''
+        return [url.strip() for url in relay_urls.split(',') if url.strip()]
+
+    def load_cursors(self, subscription):
+        with closing(self.conn.cursor()) as cr:
+            cursors = load_cursors(cr, subscription)
+        self.conn.commit()
+        return cursors
+
+
+class DatabaseSubscription:
+    """The relay subscriptions of one database."""
+
+    def __init__(self, runner, db):
+        self.runner = runner
+        self.db = db
+        self.cursors = db.load_cursors(runner.subscription)
+        self.ingest = CursorIngest(
+            db.db_name, EventIngestBuffer(runner.flush_size, runner.flush_interval)
+        )
+        self.tasks = {}
+        self.error = None
+
+    def refresh(self):
+        relay_urls = set(self.db.relay_urls())
+        for url in set(self.tasks) - relay_urls:
+            _logger.info(f"Unsubscribing from relay {url} for db {self.db.db_name}")
+            self.tasks.pop(url).cancel()
+            self.ingest.disconnected(url)
+        for url in relay_urls - set(self.tasks):
+            self.tasks[url] = asyncio.get_running_loop().create_task(self.follow(url))
+
+    async def follow(self, url):
+        failures = 0
+        while not self.runner._stop and self.error is None:
+            nostr_filter = build_filter(self.cursors.get(url), self.runner.kinds)
+            try:
+                await read_relay(url, nostr_filter, self.on_event,
+                                 on_eose=self.on_eose)
+                failures = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.error is not None:
+                    return
+                failures += 1
+                _logger.warning(f"Subscription to relay {url} for db {self.db.db_name} failed: {str(e)}")
+            finally:
+                self.ingest.disconnected(url)
+            delay = RECONNECT_BACKOFF[min(failures, len(RECONNECT_BACKOFF) - 1)]
+            await asyncio.sleep(delay)
+
+    def on_event(self, url, event_data):
+        if self.ingest.add(url, event_data):
+            self.flush()
+
+    def on_eose(self, url):
+        self.ingest.end_of_stored_events(url)
+
+    def flush(self):
+        if self.error is not None:
+            return 0
+        try:
+            with closing(self.db.conn.cursor()) as cr:
+                inserted, cursors = self.ingest.flush(cr, odoo.SUPERUSER_ID)
+                save_cursors(cr, self.runner.subscription, cursors, odoo.SUPERUSER_ID)
+            self.db.conn.commit()
+        except Exception as e:
+            # the batch is lost: start over from the persisted cursors
+            self.error = e
+            self.db.conn.rollback()
+            self.runner.wakeup()
+            raise
+        for url, since in cursors.items():
+            self.cursors[url] = max(since, self.cursors.get(url, 0))
+        return inserted
+
+    def flush_if_due(self):
+        if self.ingest.buffer.should_flush() or self.ingest.received:
+            self.flush()
+
+    async def close(self):
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        self.tasks = {}
+        if self.error is None:
+            try:
+                self.flush()
+            except Exception:
+                _logger.warning(f"Error flushing events of db {self.db.db_name}", exc_info=True)
+        self.db.close()
+
+
+class NostrSubscriberRunner:
+    def __init__(self, kinds=None, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 subscription=INCOMING_SUBSCRIPTION):
+        self.kinds = kinds
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.subscription = subscription
+        self.subscriptions = {}
+        self._stop = False
+        self._loop = None
+        self._wakeup = None
+
+    @classmethod
+    def from_environ_or_config(cls):
+        kinds = get_config('kinds')
+        if kinds:
+            kinds = [int(kind) for kind in str(kinds).split(',') if kind.strip()]
+        return cls(
+            kinds=kinds or None,
+            flush_size=int(get_config('flush_size', FLUSH_SIZE)),
+            flush_interval=float(get_config('flush_interval', FLUSH_INTERVAL)),
+        )
+
+    def get_db_names(self):
+        if config['db_name']:
+            db_names = config['db_name'].split(',')
+        else:
+            db_names = odoo.service.db.list_dbs(True)
+        return db_names
+
+    def initialize_databases(self):
+        for db_name in self.get_db_names():
+            db = Database(db_name)
+            if not db.has_nostr_bridge:
+                db.close()
+                continue
+            self.subscriptions[db_name] = DatabaseSubscription(self, db)
+            _logger.info(f"nostr subscriber ready for db {db_name}")
+
+    async def close_databases(self):
+        for db_name, subscription in self.subscriptions.items():
+            try:
+                await subscription.close()
+            except Exception:
+                _logger.warning(f"error closing database {db_name}", exc_info=True)
+        self.subscriptions = {}
+
+    def wakeup(self):
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def stop(self):
+        _logger.info("graceful stop requested")
+        self._stop = True
+        self.wakeup()
+
+    async def _run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        try:
+            _logger.info("initializing database connections")
+            self.initialize_databases()
+            _logger.info("database connections ready")
+            refreshed_at = 0
+            while not self._stop:
+                if time.monotonic() - refreshed_at >= REFRESH_INTERVAL:
+                    for subscription in self.subscriptions.values():
+                        subscription.refresh()
+                    refreshed_at = time.monotonic()
+                # batches that did not fill up are written on a timer
+                for subscription in self.subscriptions.values():
+                    if subscription.error is not None:
+                        raise subscription.error
+                    subscription.flush_if_due()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+        finally:
+            await self.close_databases()
+            self._loop = None
+
+    def run(self):
+        _logger.info("starting")
+        while not self._stop:
+            # outer loop does exception recovery
+            try:
+                asyncio.run(self._run())
+            except KeyboardInterrupt:
+                self.stop()
+            except Exception:
+                _logger.exception(f"exception: sleeping {ERROR_RECOVERY_DELAY}s and retrying")
+                time.sleep(ERROR_RECOVERY_DELAY)
+        _logger.info("stopped")
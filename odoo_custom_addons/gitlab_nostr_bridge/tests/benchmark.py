@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+# Measurement helpers for the publish/subscribe benchmarks.
+
+import logging
+import time
+from contextlib import contextmanager
+
+from secp256k1 import PrivateKey as Secp256k1PrivateKey
+
+from ..models.event_cache import compute_event_id
+from ..models.relay_scoring import percentile
+
+_logger = logging.getLogger(__name__)
+
+
+class BenchmarkResult:
+    def __init__(self, name, rate=None):
+        self.name = name
+        self.rate = rate
+        self.events = 0
+        self.elapsed = 0.0
+        self.latencies = []
+        self.statements = 0
+
+    @property
+    def events_per_second(self):
+        return self.events / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def p50(self):
+        return percentile(self.latencies, 50)
+
+    @property
+    def p99(self):
+        return percentile(self.latencies, 99)
+
+    @property
+    def statements_per_event(self):
+        return self.statements / self.events if self.events else 0.0
+
+    def as_row(self):
+        return (
+            self.name,
+            self.rate or '-',
+            self.events,
+            f"{self.events_per_second:.1f}",
+            f"{(self.p50 or 0) * 1000:.1f}",
+            f"{(self.p99 or 0) * 1000:.1f}",
+            f"{self.statements_per_event:.1f}",
+        )
+
+
+class StatementCounter:
+    """Proxy of a psycopg2 cursor counting the statements executed on it.
+
+    ``cr.sql_log_count`` only counts the statements sent through the Odoo
+    cursor, not the pages of ``execute_values`` sent to ``cr._obj``.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.count = 0
+
+    def execute(self, query, params=None):
+        self.count += 1
+        return self._cursor.execute(query, params)
+
+    def executemany(self, query, params_list):
+        params_list = list(params_list)
+        self.count += len(params_list)
+        return self._cursor.executemany(query, params_list)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+@contextmanager
+def count_statements(cr):
+    """Count every statement executed on ``cr`` at the psycopg2 level."""
+    counter = StatementCounter(cr._obj)
+    cr._obj = counter
+    try:
+        yield counter
+    finally:
+        cr._obj = counter._cursor
+
+
+def run_paced(name, cr, items, func, rate=None):
+    """Call ``func(item)`` for each item, at most ``rate`` calls per second.
+
+    Each call is timed; for batch APIs ``func`` receives the whole list
+    and every event is accounted the latency of the batch.
+    """
+    result = BenchmarkResult(name, rate)
+    interval = 1.0 / rate if rate else 0.0
+    with count_statements(cr) as statements:
+        started = time.perf_counter()
+        for index, item in enumerate(items):
+            if interval:
+                wait = started + index * interval - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            call_started = time.perf_counter()
+            func(item)
+            result.latencies.append(time.perf_counter() - call_started)
+        result.elapsed = time.perf_counter() - started
+    result.events = len(items)
+    result.statements = statements.count
+    return result
+
+
+def run_batch(name, cr, items, func):
+    result = BenchmarkResult(name, 'batch')
+    with count_statements(cr) as statements:
+        started = time.perf_counter()
+        func(items)
+        result.elapsed = time.perf_counter() - started
+    result.events = len(items)
+    result.latencies = [result.elapsed] * len(items)
+    result.statements = statements.count
+    return result
+
+
+def format_report(results):
+    header = ('strategy', 'rate/s', 'events', 'events/s', 'p50 ms', 'p99 ms', 'stmts/event')
+    rows = [header] + [result.as_row() for result in results]
+    widths = [max(len(str(row[i])) for row in rows) for i in range(len(header))]
+    return '\n'.join(
+        '  '.join(str(value).ljust(width) for value, width in zip(row, widths))
+        for row in rows
+    )
+
+
+def make_signed_events(count, kind=1, created_at=None):
+    """Return ``count`` valid NIP-01 event dicts signed with a throwaway key."""
+    private_key = Secp256k1PrivateKey()
+    pubkey = private_key.pubkey.serialize()[1:].hex()
+    created_at = created_at or int(time.time())
+    events = []
+    for index in range(count):
+        event = {
+            'pubkey': pubkey,
+            'created_at': created_at + index,
+            'kind': kind,
+            'tags': [],
+            'content': f"benchmark event {index}",
+        }
+        event['id'] = compute_event_id(event)
+        event['sig'] = private_key.schnorr_sign(bytes.fromhex(event['id']), None, raw=True).hex()
+        events.append(event)
+    return events
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+# In-process stand-in for a Nostr relay, used by the benchmarks.
+#
+# The simulator speaks enough NIP-01 for our publishers and listeners:
+# EVENT frames are verified, stored and acknowledged with OK (events with a
+# bad id or signature get OK false, like on a real relay), REQ frames get the
+# matching stored events followed by EOSE and then the events published
+# afterwards, CLOSE ends a subscription. Latency, jitter, failure rate and
+# ack behaviour are configurable so publish strategies can be compared on
+# a reproducible network.
+
+import asyncio
+import json
+import logging
+import random
+import threading
+
+import websockets
+
+from ..models.event_cache import compute_event_id, verify_event
+
+_logger = logging.getLogger(__name__)
+
+ACK_ACCEPT = 'accept'
+ACK_REJECT = 'reject'
+ACK_SILENT = 'silent'
+
+
+def match_filter(event, nostr_filter):
+    """Whether ``event`` matches a NIP-01 filter."""
+    if 'ids' in nostr_filter and event['id'] not in nostr_filter['ids']:
+        return False
+    if 'authors' in nostr_filter and event['pubkey'] not in nostr_filter['authors']:
+        return False
+    if 'kinds' in nostr_filter and event['kind'] not in nostr_filter['kinds']:
+        return False
+    if 'since' in nostr_filter and event['created_at'] < nostr_filter['since']:
+        return False
+    if 'until' in nostr_filter and event['created_at'] > nostr_filter['until']:
+        return False
+    return True
+
+
+class RelaySimulator:
+    """A local relay listening on ``url``.
+
+    :param latency: seconds waited before answering an EVENT or a REQ
+    :param jitter: random extra latency, up to that many seconds
+    :param failure_rate: probability to drop the connection instead of
+                         answering an EVENT
+    :param ack: ``accept`` (OK true), ``reject`` (OK false) or ``silent``
+                (the event is stored but never acknowledged)
+    :param seed: seed of the random generator, for reproducible runs
+
+    The relay runs on its own thread and event loop; use it as a context
+    manager or call :meth:`start` and :meth:`stop`.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, ack=ACK_ACCEPT, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.ack = ack
+        self.random = random.Random(seed)
+        self.events = {}
+        self.subscriptions = {}
+        self.received = 0
+        self.acknowledged = 0
+        self.dropped = 0
+        self.invalid = 0
+        self.requests = []
+        self.port = None
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'ws://127.0.0.1:{self.port}'
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        async def serve():
+            self._server = await websockets.serve(self._handle, '127.0.0.1', 0)
+            self.port = next(iter(self._server.sockets)).getsockname()[1]
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(serve())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='nostr-relay-simulator', daemon=True)
+        self._thread.start()
+        started.wait(10)
+        _logger.info(f"Relay simulator listening on {self.url}")
+
+    def stop(self):
+        if self._loop is None:
+            return
+
+        async def shutdown():
+            self._server.close()
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(10)
+        self._loop.close()
+        self._loop = None
+
+    def preload(self, events):
+        """Store ``events`` as if they had been published before."""
+        for event in events:
+            self.events[event['id']] = event
+
+    def reset_stats(self):
+        self.received = self.acknowledged = self.dropped = self.invalid = 0
+        self.requests = []
+
+    async def _delay(self):
+        delay = self.latency + (self.random.random() * self.jitter if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def _handle(self, websocket, *args):
+        subscriptions = {}
+        tasks = set()
+        try:
+            async for raw in websocket:
+                # frames are answered concurrently, like a real relay
+                task = asyncio.get_running_loop().create_task(
+                    self._handle_frame(websocket, subscriptions, raw)
+                )
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            for subscription_id in subscriptions:
+                self.subscriptions.pop((id(websocket), subscription_id), None)
+            for task in tasks:
+                task.cancel()
+
+    async def _handle_frame(self, websocket, subscriptions, raw):
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            await websocket.send(json.dumps(['NOTICE', 'invalid: not JSON']))
+            return
+        if message[0] == 'EVENT':
+            await self._handle_event(websocket, message[1])
+        elif message[0] == 'REQ':
+            await self._handle_req(websocket, subscriptions, message[1], message[2:])
+        elif message[0] == 'CLOSE':
+            subscriptions.pop(message[1], None)
+            self.subscriptions.pop((id(websocket), message[1]), None)
+
+    async def _handle_event(self, websocket, event):
+        self.received += 1
+        await self._delay()
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            self.dropped += 1
+            await websocket.close()
+            return
+        reason = self._invalid_reason(event)
+        if reason:
+            self.invalid += 1
+            await websocket.send(json.dumps(['OK', event.get('id'), False, f'invalid: {reason}']))
+            return
+        if self.ack == ACK_REJECT:
+            await websocket.send(json.dumps(['OK', event['id'], False, 'blocked: simulated rejection']))
+            return
+        is_new = event['id'] not in self.events
+        self.events[event['id']] = event
+        if self.ack == ACK_ACCEPT:
+            self.acknowledged += 1
+            await websocket.send(json.dumps(['OK', event['id'], True, '' if is_new else 'duplicate:']))
+        if is_new:
+            for (_connection, subscription_id), (subscriber, filters) in list(self.subscriptions.items()):
+                if any(match_filter(event, nostr_filter) for nostr_filter in filters):
+                    try:
+                        await subscriber.send(json.dumps(['EVENT', subscription_id, event]))
+                    except websockets.exceptions.ConnectionClosed:
+                        pass
+
+    @staticmethod
+    def _invalid_reason(event):
+        try:
+            if compute_event_id(event) != event.get('id'):
+                return 'event id does not match'
+        except (KeyError, TypeError, ValueError):
+            return 'malformed event'
+        if not verify_event(event):
+            return 'bad signature'
+        return None
+
+    async def _handle_req(self, websocket, subscriptions, subscription_id, filters):
+        self.requests.append(filters)
+        await self._delay()
+        stored = [
+            event for event in self.events.values()
+            if any(match_filter(event, nostr_filter) for nostr_filter in filters)
+        ]
+        # like most relays: newest first
+        stored.sort(key=lambda event: event['created_at'], reverse=True)
+        for event in stored:
+            await websocket.send(json.dumps(['EVENT', subscription_id, event]))
+        await websocket.send(json.dumps(['EOSE', subscription_id]))
+        subscriptions[subscription_id] = filters
+        self.subscriptions[(id(websocket), subscription_id)] = (websocket, filters)
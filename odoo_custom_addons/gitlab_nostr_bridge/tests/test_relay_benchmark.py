@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+# Publish/subscribe benchmarks against local relay simulators.
+#
+# Not part of the standard test run, select them explicitly:
+#   odoo-bin -d db --test-tags nostr_benchmark --stop-after-init
+# NOSTR_BENCHMARK_EVENTS and NOSTR_BENCHMARK_RATES (comma separated events
+# per second) change the size of the runs.
+
+import logging
+import os
+import time
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+from nostr.key import PrivateKey
+
+from ..models.nostr_event import (
+    AlternativePublishStrategy,
+    AsyncPublishStrategy,
+    OriginalPublishStrategy,
+)
+from .benchmark import format_report, make_signed_events, run_batch, run_paced
+from .relay_simulator import RelaySimulator
+
+_logger = logging.getLogger(__name__)
+
+BENCHMARK_EVENTS = int(os.environ.get('NOSTR_BENCHMARK_EVENTS', 30))
+BENCHMARK_RATES = [
+    int(rate) for rate in os.environ.get('NOSTR_BENCHMARK_RATES', '10,50,200').split(',')
+]
+INGEST_SIZES = (100, 1000)
+
+
+@tagged('-standard', 'nostr_benchmark', 'post_install', '-at_install')
+class TestRelayBenchmark(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.relays = [
+            RelaySimulator(latency=0.005, seed=1),
+            RelaySimulator(latency=0.05, jitter=0.05, seed=2),
+            RelaySimulator(latency=0.01, failure_rate=0.05, seed=3),
+        ]
+        for relay in cls.relays:
+            relay.start()
+            cls.addClassCleanup(relay.stop)
+        cls.env['ir.config_parameter'].sudo().set_param(
+            'nostr_bridge.relay_urls', ','.join(relay.url for relay in cls.relays)
+        )
+        # every relay must accept the events, the retries of the pool carry
+        # the last relay which drops connections
+        cls.env['ir.config_parameter'].sudo().set_param('nostr_bridge.publish_quorum', len(cls.relays))
+        private_key = PrivateKey()
+        cls.env.user.nostr_private_key = private_key.bech32()
+        cls.public_key = private_key.public_key.hex()
+
+    def setUp(self):
+        super().setUp()
+        # listeners commit every batch, keep everything in the test transaction
+        self.patch(self.env.cr, 'commit', lambda: None)
+
+    def _create_events(self, count, label):
+        now = int(time.time())
+        return self.env['nostr.event'].create([{
+            'content': f"{label} benchmark event {index}",
+            'kind': 1,
+            'tags': '[]',
+            'public_key': self.public_key,
+            'created_at': now + index,
+        } for index in range(count)])
+
+    def _publish_and_flush(self, publish):
+        def run(event):
+            publish(event)
+            self.env.flush_all()
+        return run
+
+    def test_publish_strategies(self):
+        strategies = {
+            'original': OriginalPublishStrategy().publish,
+            'alternative': AlternativePublishStrategy().publish,
+            'async': AsyncPublishStrategy().publish,
+            'relay_management': lambda event: event._new_relay_management_publish(),
+        }
+        results = []
+        for name, publish in strategies.items():
+            for rate in BENCHMARK_RATES:
+                events = self._create_events(BENCHMARK_EVENTS, f"{name}-{rate}")
+                self.env.flush_all()
+                results.append(run_paced(name, self.env.cr, list(events), self._publish_and_flush(publish), rate))
+                self.assertTrue(all(events.mapped('published')), f"{name} did not publish every event")
+        events = self._create_events(BENCHMARK_EVENTS, 'publish_many')
+        self.env.flush_all()
+        results.append(run_batch(
+            'publish_many', self.env.cr, events,
+            self._publish_and_flush(self.env['nostr.event'].publish_many),
+        ))
+        self.assertTrue(all(events.mapped('published')))
+        # the relays check the ids and signatures like real relays
+        self.assertEqual([relay.invalid for relay in self.relays], [0] * len(self.relays))
+        _logger.info("Nostr publish benchmark:\n%s", format_report(results))
+
+    def test_listener_ingestion(self):
+        results = []
+        for size in INGEST_SIZES:
+            events = make_signed_events(size)
+            for relay in self.relays:
+                relay.preload(events)
+            results.append(run_batch(
+                'process_incoming_events', self.env.cr, [None] * size,
+                lambda _items: self.env['nostr.event'].process_incoming_events(),
+            ))
+            stored = self.env['nostr.event'].search_count([
+                ('event_id', 'in', [event['id'] for event in events])
+            ])
+            self.assertEqual(stored, size)
+        # the cursors make the next run ask only for recent events
+        for relay in self.relays:
+            relay.reset_stats()
+        results.append(run_batch(
+            'process_incoming_events (resume)', self.env.cr, [None],
+            lambda _items: self.env['nostr.event'].process_incoming_events(),
+        ))
+        for relay in self.relays:
+            self.assertTrue(all('since' in nostr_filter for filters in relay.requests for nostr_filter in filters))
+        _logger.info("Nostr ingestion benchmark:\n%s", format_report(results))
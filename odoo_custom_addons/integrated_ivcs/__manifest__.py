@@ -5,7 +5,7 @@
     'summary': 'Integrated Version Control System with Git and Nostr',
     'author': 'Your Name',
     'website': 'https://www.example.com',
-    'depends': ['base', 'mail'],
+    'depends': ['base', 'mail', 'queue_job'],
     'data': [
         'security/ir.model.access.csv',
         'views/ivcs_item_views.xml',
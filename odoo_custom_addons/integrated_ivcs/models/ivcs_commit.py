@@ -21,7 +21,11 @@ class IVCSCommit(models.Model):
     def create(self, vals):
         commit = super(IVCSCommit, self).create(vals)
         try:
-            commit._create_nostr_commit_event()
+            # relays are slow: publish from the root.nostr.publish job channel
+            commit.with_delay(
+                channel='root.nostr.publish',
+                description=f"Publish Nostr event for commit {commit.hash}",
+            )._create_nostr_commit_event()
         except Exception as e:
             _logger.error(f"Failed to create Nostr commit event: {str(e)}")
         return commit
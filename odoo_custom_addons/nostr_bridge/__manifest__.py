@@ -5,7 +5,7 @@
     'version': '1.0',
     'category': 'Social',
     'summary': 'Bridge between Odoo messages, Git, and Nostr network',
-    'depends': ['base', 'mail', 'web'],
+    'depends': ['base', 'mail', 'web', 'queue_job'],
     'data': [
         'views/res_config_settings_views.xml',
         'views/res_users_views.xml',
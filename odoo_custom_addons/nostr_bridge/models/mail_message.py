@@ -10,10 +10,22 @@ class MailMessage(models.Model):
     def create(self, vals_list):
         _logger.info("Creating new mail messages")
         messages = super(MailMessage, self).create(vals_list)
-        for message in messages:
-            self._publish_to_nostr(message)
+        # publishing waits on the relays: do it in a job so posting a message
+        # does not block the request; job failure messages are not published.
+        # The jobs pending at the same time are published in one batch.
+        to_publish = messages.filtered(lambda m: m.model != 'queue.job')
+        if to_publish:
+            to_publish.sudo().with_delay(
+                channel='root.nostr.publish',
+                description="Publish messages to Nostr",
+                batch_key='nostr_publish',
+            )._publish_messages_to_nostr()
         return messages
 
+    def _publish_messages_to_nostr(self):
+        for message in self.exists():
+            self._publish_to_nostr(message)
+
     def _publish_to_nostr(self, message):
         try:
             nostr_adapter = self.env['nostr.adapter'].sudo()
@@ -1,6 +1,6 @@
 {
     'name': 'Nostr Publisher',
-    'version': '1.5',
+    'version': '1.6',
     'category': 'Social Network',
     'summary': 'Publish and manage events on the Nostr network',
     'sequence': 10,
@@ -20,6 +20,8 @@
     - Automatic connection to GitLab-Nostr Bridge as a connected module
     - Test and manage relay connections
     - Automatically update active relays
+    - Rank relays by expected ack time (rolling latency percentiles, ack success rate,
+      failure streak) and publish until a quorum of relays accepted the event
     """,
     'author': 'Your Name',
     'website': 'https://www.example.com',
@@ -2,8 +2,8 @@ from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 import json
 import logging
-import asyncio
 from nostr.bech32 import bech32_decode, convertbits
+from odoo.addons.gitlab_nostr_bridge.models.async_runtime import run_sync
 
 _logger = logging.getLogger(__name__)
 
@@ -51,7 +51,7 @@ class NostrEvent(models.Model):
 
         _logger.info(f"Processing events from {len(relay_urls)} relays")
 
-        asyncio.run(self._fetch_and_process_events(relay_urls))
+        run_sync(self._fetch_and_process_events(relay_urls))
 
         _logger.info("Finished processing incoming Nostr events")
 
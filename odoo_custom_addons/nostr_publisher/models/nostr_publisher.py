@@ -13,6 +13,14 @@ import logging
 import asyncio
 import websockets
 from odoo.addons.queue_job import Job
+from odoo.addons.gitlab_nostr_bridge.models.async_runtime import run_sync
+from odoo.addons.gitlab_nostr_bridge.models.relay_pool import get_relay_pool
+from odoo.addons.gitlab_nostr_bridge.models.relay_scoring import (
+    DEFAULT_MAX_RELAYS, DEFAULT_QUORUM, get_relay_scoreboard
+)
+from odoo.addons.gitlab_nostr_bridge.models.relay_subscription import (
+    CursorIngest, build_filter, load_cursors, read_relay, save_cursors
+)
 from .nostr_event import NostrEvent
 from nostr.bech32 import bech32_decode, convertbits
 
@@ -20,6 +28,15 @@ _logger = logging.getLogger(__name__)
 
 MAX_RETRIES = 3
 RETRY_DELAY = 2
+# relay health checks
+HEALTH_CHECK_CONCURRENCY = 20
+HEALTH_CHECK_ATTEMPTS = 3
+HEALTH_CHECK_RETRY_DELAY = 1
+HEALTH_CHECK_TIMEOUT = 5.0
+# seconds a synchronous caller waits on a single relay request
+REQUEST_TIMEOUT = 30
+# name of the relay cursors of _listen_for_events
+LISTEN_SUBSCRIPTION = 'nostr_publisher'
 
 class NostrPublisher(models.Model):
     _name = 'nostr.publisher'
@@ -57,11 +74,21 @@ class NostrPublisher(models.Model):
                 record.private_key = False
                 _logger.warning(f"Nostr keys not set for user {user.name}")
 
-    @api.depends('relay_ids', 'relay_ids.is_active')
+    @api.depends('relay_ids', 'relay_ids.is_active', 'relay_ids.expected_ack_time')
     def _compute_active_relays(self):
+        max_relays = self._get_int_param('nostr_publisher.max_active_relays', DEFAULT_MAX_RELAYS)
         for record in self:
             active_relays = record.relay_ids.filtered(lambda r: r.is_active)
-            record.active_relay_ids = active_relays[:9]  # Limit to top 9 active relays
+            # lowest expected ack time first, see relay_scoring
+            active_relays = active_relays.sorted(lambda r: (r.expected_ack_time, r.id))
+            record.active_relay_ids = active_relays[:max_relays]
+
+    @api.model
+    def _get_int_param(self, key, default):
+        try:
+            return int(self.env['ir.config_parameter'].sudo().get_param(key, default))
+        except (TypeError, ValueError):
+            return default
 
     @api.depends('relay_ids')
     def _compute_relay_count(self):
@@ -95,23 +122,16 @@ class NostrPublisher(models.Model):
             raise UserError(_("Failed to generate Nostr key pair. Please try again."))
 
     def test_relay_connections(self):
-        self.ensure_one()
-        for relay in self.relay_ids:
-            is_active, response_time = self._test_relay_connection(relay.url)
-            relay.write({
-                'is_active': is_active,
-                'last_connection': fields.Datetime.now() if is_active else relay.last_connection,
-                'connection_failures': 0 if is_active else relay.connection_failures + 1,
-                'response_time': response_time,
-            })
-        self._compute_active_relays()
+        # every relay of every publisher is probed in a single concurrent pass
+        relays = self.relay_ids
+        results = self._check_relays(relays.mapped('url'))
+        relays._write_health_checks(results)
         self.env.cr.commit()
 
     @api.model
     def cron_test_relay_connections(self):
         publishers = self.search([('state', '=', 'active')])
-        for publisher in publishers:
-            publisher.test_relay_connections()
+        publishers.test_relay_connections()
 
     @api.model
     def publish_event(self, content, kind=1, tags=None):
@@ -152,15 +172,14 @@ class NostrPublisher(models.Model):
             if not relay_urls:
                 raise UserError(_("No active relay URLs configured"))
     
-            # Publish to relays
-            success_count = 0
-            for url in relay_urls:
-                try:
-                    success = self._publish_to_single_relay(url, event)
-                    if success:
-                        success_count += 1
-                except Exception as e:
-                    _logger.error(f"Failed to publish to relay {url}: {str(e)}")
+            # Publish concurrently over the pooled connections, best relays
+            # first, and return once the quorum accepted the event
+            relay_urls = get_relay_scoreboard().rank(relay_urls)
+            quorum = min(self._get_int_param('nostr_bridge.publish_quorum', DEFAULT_QUORUM), len(relay_urls))
+            results = get_relay_pool().publish_quorum_sync(
+                relay_urls, event.id, event.to_message(), quorum, timeout=5.0
+            )
+            success_count = sum(1 for result in results if result.get('accepted'))
     
             if success_count > 0:
                 self.total_events_published += 1
@@ -176,38 +195,63 @@ class NostrPublisher(models.Model):
             raise UserError(_("An unexpected error occurred while publishing the event: %s") % str(e))
     
     def _get_relay_urls(self):
+        self.active_relay_ids._seed_scoreboard()
         return self.active_relay_ids.mapped('url')
     
-    def _publish_to_single_relay(self, url, event):
-        try:
-            _logger.info(f"Attempting to publish to relay: {url}")
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            success = loop.run_until_complete(self._async_publish_to_relay(url, event))
-            loop.close()
-            return success
-        except Exception as e:
-            _logger.error(f"Error publishing to relay {url}: {str(e)}")
-            return False
+    def publish_many(self, events):
+        """Sign and publish a list of ``{'content', 'kind', 'tags'}`` dicts.
+
+        An optional ``created_at`` sets the timestamp of an event, otherwise
+        the events get consecutive timestamps ending now so that identical
+        contents still give distinct events.
+        All EVENT frames are pipelined down every active relay at once and
+        the publisher statistics are updated once for the whole batch.
+        Returns the ids of the events accepted by at least one relay.
+        """
+        self.ensure_one()
+        if self.state != 'active':
+            raise UserError(_("Nostr Publisher is not active."))
+        if not self.private_key or not self.public_key:
+            raise UserError(_("Nostr keys are not set. Please check your configuration."))
+        relay_urls = self._get_relay_urls()
+        if not relay_urls:
+            raise UserError(_("No active relay URLs configured"))
+
+        start = int(time.time()) - len(events) + 1
+        signed_events = [
+            self._sign_event(self._create_nostr_event(
+                event['content'], event.get('kind', 1), event.get('tags'), event.get('created_at', start + index)
+            ))
+            for index, event in enumerate(events)
+        ]
+        frames = [(event.id, event.to_message()) for event in signed_events]
+        results = get_relay_pool().publish_batch_sync(relay_urls, frames, timeout=5.0 + 0.01 * len(frames))
+        published_ids = [
+            event.id for index, event in enumerate(signed_events)
+            if any(results[url][index].get('accepted') for url in relay_urls)
+        ]
+        _logger.info(f"Published {len(published_ids)} out of {len(signed_events)} events to {len(relay_urls)} relays")
+        if published_ids:
+            self.write({
+                'total_events_published': self.total_events_published + len(published_ids),
+                'success_count': self.success_count + len(published_ids),
+                'last_publish_date': fields.Datetime.now(),
+            })
+        return published_ids
     
     async def _async_publish_to_relay(self, url, event):
-        try:
-            async with websockets.connect(url.strip(), ping_interval=20, ping_timeout=10, close_timeout=10) as websocket:
-                message = event.to_message()
-                _logger.info(f"Sending message to {url}: {message[:100]}...")
-                await websocket.send(message)
-                response = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-                _logger.info(f"Received response from {url}: {response}")
-                return json.loads(response)[0] == "OK"
-        except Exception as e:
-            _logger.error(f"Error in _async_publish_to_relay for {url}: {str(e)}")
+        result = await get_relay_pool().publish_event(url, event, timeout=5.0)
+        if not result['success']:
+            _logger.error(f"Error in _async_publish_to_relay for {url}: {result['error']}")
             return False
+        _logger.info(f"Received response from {url}: {result['response']}")
+        return True
         
-    def _create_nostr_event(self, content, kind, tags):
+    def _create_nostr_event(self, content, kind, tags, created_at=None):
         return Event(
             content=content,
             public_key=self._convert_to_hex(self.public_key),
-            created_at=int(time.time()),
+            created_at=created_at or int(time.time()),
             kind=kind,
             tags=tags or []
         )
@@ -253,30 +297,20 @@ class NostrPublisher(models.Model):
         return success, results
 
     def _sync_websocket_request(self, url, message):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(self._async_websocket_request(url, message))
-        finally:
-            loop.close()
+        return run_sync(self._async_websocket_request(url, message), REQUEST_TIMEOUT)
 
     async def _async_websocket_request(self, url, message):
         try:
-            async with websockets.connect(url.strip(), ping_interval=20, ping_timeout=10, close_timeout=10) as websocket:
-                _logger.info(f"Sending message to {url}: {message[:100]}...")
-                await websocket.send(message)
-                response = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-                _logger.info(f"Received response from {url}: {response}")
-                return response
-        except websockets.exceptions.ConnectionClosed:
-            _logger.error(f"Connection closed for {url} before sending message")
-            return None
-        except asyncio.TimeoutError:
-            _logger.error(f"Timeout while connecting to {url}")
-            return None
+            _logger.info(f"Sending message to {url}: {message[:100]}...")
+            result = await get_relay_pool().request(url, message, timeout=5.0)
         except Exception as e:
             _logger.error(f"Error in _async_websocket_request for {url}: {str(e)}")
             return None
+        if not result['success']:
+            _logger.error(f"Error in _async_websocket_request for {url}: {result['error']}")
+            return None
+        _logger.info(f"Received response from {url}: {result['response']}")
+        return result['response']
     
     def _verify_event_published(self, event_id, relay_urls, max_attempts=3, delay_between_attempts=2):
         _logger.info(f"Verifying publication of event {event_id}")
@@ -301,12 +335,7 @@ class NostrPublisher(models.Model):
         return False
     
     def _sync_verify_request(self, url, event_id):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(self._async_verify_request(url, event_id))
-        finally:
-            loop.close()
+        return run_sync(self._async_verify_request(url, event_id), REQUEST_TIMEOUT)
 
     async def _async_verify_request(self, url, event_id):
         try:
@@ -328,53 +357,86 @@ class NostrPublisher(models.Model):
             return False
     
     def _test_relay_connection(self, url):
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                is_active, response_time = self._sync_test_relay_connection(url)
+        return self._check_relays([url]).get(url.strip(), (False, 0))
+
+    @api.model
+    def _check_relays(self, urls):
+        """Probe ``urls`` concurrently.
+
+        Returns ``{url: (is_active, response_time_ms)}``. At most
+        ``nostr_publisher.health_check_concurrency`` relays are probed at
+        once, all with the same signed probe event.
+        """
+        urls = list(dict.fromkeys(url.strip() for url in urls if url and url.strip()))
+        if not urls:
+            return {}
+        concurrency = self._get_int_param('nostr_publisher.health_check_concurrency', HEALTH_CHECK_CONCURRENCY)
+        message = self._create_probe_event().to_message()
+        _logger.info(f"Testing {len(urls)} relays, {concurrency} at a time")
+        # every probe is bounded by HEALTH_CHECK_TIMEOUT and its retries
+        results = run_sync(self._async_check_relays(urls, message, max(concurrency, 1)))
+        active = sum(1 for is_active, _response_time in results if is_active)
+        _logger.info(f"Relay test finished: {active} out of {len(urls)} relays answered")
+        return dict(zip(urls, results))
+
+    @api.model
+    def _create_probe_event(self):
+        # a throwaway key and one signed event shared by all the probes of a run
+        private_key = PrivateKey()
+        event = Event(
+            public_key=private_key.public_key.hex(),
+            created_at=int(time.time()),
+            kind=1,
+            tags=[],
+            content="Test connection from Odoo"
+        )
+        private_key.sign_event(event)
+        return event
+
+    async def _async_check_relays(self, urls, message, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def check(url):
+            for attempt in range(HEALTH_CHECK_ATTEMPTS):
+                # the slot is released while waiting to retry
+                async with semaphore:
+                    is_active, response_time = await self._async_test_relay_connection(url, message)
                 if is_active:
                     return is_active, response_time
-                _logger.warning(f"Failed to connect to relay {url}. Attempt {attempt + 1} of {max_retries}")
-            except Exception as e:
-                _logger.error(f"Error testing connection to {url}: {str(e)}")
-            time.sleep(1)  # Wait before retrying
-        return False, 0
+                _logger.warning(f"Failed to connect to relay {url}. Attempt {attempt + 1} of {HEALTH_CHECK_ATTEMPTS}")
+                if attempt + 1 < HEALTH_CHECK_ATTEMPTS:
+                    await asyncio.sleep(HEALTH_CHECK_RETRY_DELAY)
+            return False, 0
 
-    def _sync_test_relay_connection(self, url):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(self._async_test_relay_connection(url))
-        finally:
-            loop.close()
+        return await asyncio.gather(*[check(url) for url in urls])
 
-    async def _async_test_relay_connection(self, url):
+    async def _async_test_relay_connection(self, url, message):
+        websocket = None
         try:
-            _logger.info(f"Testing connection to relay: {url}")
+            _logger.debug(f"Testing connection to relay: {url}")
             start_time = time.time()
-            async with websockets.connect(url.strip(), ping_interval=None) as websocket:
-                # Create a test event
-                private_key = PrivateKey()
-                pub_key = private_key.public_key.hex()
-                event = Event(
-                    public_key=pub_key,
-                    created_at=int(time.time()),
-                    kind=1,
-                    tags=[],
-                    content="Test connection from Odoo"
-                )
-                private_key.sign_event(event)
-                
-                message = event.to_message()
-                await websocket.send(message)
-                response = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-                _logger.info(f"Received response from {url}: {response}")
-                end_time = time.time()
-                response_time = (end_time - start_time) * 1000  # Convert to milliseconds
-                return json.loads(response)[0] == "OK", response_time
+            websocket = await asyncio.wait_for(
+                websockets.connect(url, ping_interval=None, close_timeout=2),
+                timeout=HEALTH_CHECK_TIMEOUT,
+            )
+            await websocket.send(message)
+            response = await asyncio.wait_for(websocket.recv(), timeout=HEALTH_CHECK_TIMEOUT)
+            _logger.debug(f"Received response from {url}: {response}")
+            end_time = time.time()
+            response_time = (end_time - start_time) * 1000  # Convert to milliseconds
+            is_active = json.loads(response)[0] == "OK"
+            get_relay_scoreboard().record(url, is_active, end_time - start_time)
+            return is_active, response_time
         except Exception as e:
-            _logger.error(f"Error testing connection to {url}: {str(e)}")
+            _logger.info(f"Error testing connection to {url}: {str(e)}")
+            get_relay_scoreboard().record(url, False)
             return False, 0
+        finally:
+            if websocket is not None:
+                try:
+                    await websocket.close()
+                except Exception:
+                    pass
 
     @api.model
     def publish_event_for_module(self, module_name, event_type, content, tags=None):
@@ -405,49 +467,38 @@ class NostrPublisher(models.Model):
         return job
 
     def _listen_for_events(self):
-        _logger.info("Starting _listen_for_events")
-        async def listen_to_relay(url):
-            while True:
-                try:
-                    _logger.info(f"Attempting to connect to relay: {url}")
-                    async with websockets.connect(url.strip(), ping_interval=20, ping_timeout=10) as websocket:
-                        await websocket.send(json.dumps(["REQ", "listen_job", {"kinds": [1]}]))
-                        _logger.info(f"Connected to relay: {url}")
-                        while True:
-                            try:
-                                response = await asyncio.wait_for(websocket.recv(), timeout=30)
-                                _logger.debug(f"Received response from {url}: {response[:100]}...")
-                                event = json.loads(response)
-                                if event[0] == "EVENT":
-                                    await self._process_event(event[2])
-                                elif event[0] == "EOSE":
-                                    _logger.info(f"End of stored events received from {url}")
-                                elif event[0] == "NOTICE":
-                                    _logger.info(f"Notice from {url}: {event[1]}")
-                                else:
-                                    _logger.warning(f"Received unexpected message type from {url}: {event[0]}")
-                            except asyncio.TimeoutError:
-                                await websocket.ping()
-                                _logger.debug(f"Sent ping to {url}")
-                except websockets.exceptions.ConnectionClosed:
-                    _logger.warning(f"Connection closed for relay {url}. Attempting to reconnect...")
-                    await asyncio.sleep(5)
-                except Exception as e:
-                    _logger.error(f"Error listening to relay {url}: {str(e)}", exc_info=True)
-                    await asyncio.sleep(10)
+        """Store the kind 1 events the relays received since our cursors.
 
-        relay_urls = self.active_relay_ids.mapped('url')
+        The job returns once every relay sent EOSE; following the relays
+        continuously is done by the subscriber daemon of gitlab_nostr_bridge.
+        """
+        _logger.info("Starting _listen_for_events")
+        relay_urls = [url.strip() for url in self.active_relay_ids.mapped('url')]
         if not relay_urls:
             _logger.error("No active relay URLs configured")
             raise UserError(_("No active relay URLs configured"))
 
-        async def listen_to_all_relays():
-            _logger.info(f"Starting to listen to {len(relay_urls)} relays")
-            tasks = [listen_to_relay(url) for url in relay_urls]
-            await asyncio.gather(*tasks)
+        cursors = load_cursors(self.env.cr, LISTEN_SUBSCRIPTION)
+        ingest = CursorIngest(self.env.cr.dbname)
+
+        def on_event(url, event_data):
+            if ingest.add(url, event_data):
+                self._flush_ingest(ingest)
 
-        _logger.info("Running listen_to_all_relays")
-        asyncio.run(listen_to_all_relays())
+        async def catch_up(url):
+            try:
+                await read_relay(url, build_filter(cursors.get(url), [1]), on_event,
+                                 on_eose=ingest.end_of_stored_events, until_eose=True)
+            except Exception as e:
+                ingest.disconnected(url)
+                _logger.error(f"Error listening to relay {url}: {str(e)}", exc_info=True)
+
+        async def catch_up_all_relays():
+            _logger.info(f"Fetching events from {len(relay_urls)} relays")
+            await asyncio.gather(*[catch_up(url) for url in relay_urls])
+
+        run_sync(catch_up_all_relays())
+        return self._flush_ingest(ingest)
 
     @api.model
     def start_listening(self):
@@ -462,27 +513,12 @@ class NostrPublisher(models.Model):
         else:
             _logger.info(f"Found {len(jobs)} existing _listen_for_events jobs")
 
-    async def _process_event(self, event_data):
-        try:
-            _logger.debug(f"Processing event: {event_data['id'][:10]}...")
-            existing_event = self.env['nostr.event'].sudo().search([('event_id', '=', event_data['id'])])
-            if not existing_event:
-                self.env['nostr.event'].sudo().create({
-                    'event_id': event_data['id'],
-                    'kind': event_data['kind'],
-                    'content': event_data['content'],
-                    'tags': json.dumps(event_data['tags']),
-                    'public_key': event_data['pubkey'],
-                    'created_at': event_data['created_at'],
-                    'signature': event_data['sig'],
-                    'published': True,
-                })
-                _logger.info(f"Processed new Nostr event: {event_data['id'][:10]}...")
-            else:
-                _logger.debug(f"Skipped existing Nostr event: {event_data['id'][:10]}...")
-        except Exception as e:
-            _logger.error(f"Error processing Nostr event: {str(e)}", exc_info=True)
-            _logger.error(f"Event data: {event_data}")
+    def _flush_ingest(self, ingest):
+        inserted, cursors = ingest.flush(self.env.cr, self.env.uid)
+        save_cursors(self.env.cr, LISTEN_SUBSCRIPTION, cursors, self.env.uid)
+        # make every batch and its cursors visible right away
+        self.env.cr.commit()
+        return inserted
 
     @api.model
     def dispatch_event(self, event):
@@ -535,9 +571,8 @@ class NostrPublisher(models.Model):
     def cron_update_active_relays(self):
         _logger.info("Starting cron job to update active relays")
         publishers = self.search([('state', '=', 'active')])
-        for publisher in publishers:
-            _logger.info(f"Updating active relays for publisher: {publisher.name}")
-            publisher.update_active_relays()
+        _logger.info(f"Updating active relays for {len(publishers)} publishers")
+        publishers.test_relay_connections()
 
     def action_test_relays(self):
         self.ensure_one()
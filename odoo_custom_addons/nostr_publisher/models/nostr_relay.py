@@ -1,8 +1,35 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, _
+from odoo.addons.gitlab_nostr_bridge.models.relay_scoring import UNKNOWN_ACK_TIME, get_relay_scoreboard
+from psycopg2.extras import execute_values
 import logging
 
 _logger = logging.getLogger(__name__)
 
+HEALTH_CHECK_FIELDS = [
+    'is_active', 'last_connection', 'connection_failures', 'response_time',
+    'latency_p50', 'latency_p90', 'ack_success_rate', 'failure_streak', 'expected_ack_time',
+]
+
+UPDATE_HEALTH_CHECKS_QUERY = """
+    UPDATE nostr_relay r
+       SET is_active = v.is_active,
+           last_connection = CASE WHEN v.is_active THEN (now() at time zone 'UTC')
+                                  ELSE r.last_connection END,
+           connection_failures = CASE WHEN v.is_active THEN 0
+                                      ELSE COALESCE(r.connection_failures, 0) + 1 END,
+           response_time = v.response_time,
+           latency_p50 = COALESCE(v.latency_p50, r.latency_p50),
+           latency_p90 = COALESCE(v.latency_p90, r.latency_p90),
+           ack_success_rate = COALESCE(v.ack_success_rate, r.ack_success_rate),
+           failure_streak = COALESCE(v.failure_streak, r.failure_streak),
+           expected_ack_time = COALESCE(v.expected_ack_time, r.expected_ack_time),
+           write_uid = v.write_uid,
+           write_date = (now() at time zone 'UTC')
+      FROM (VALUES %s) AS v(id, is_active, response_time, latency_p50, latency_p90,
+                            ack_success_rate, failure_streak, expected_ack_time, write_uid)
+     WHERE r.id = v.id
+"""
+
 class NostrRelay(models.Model):
     _name = 'nostr.relay'
     _description = 'Nostr Relay'
@@ -13,6 +40,15 @@ class NostrRelay(models.Model):
     last_connection = fields.Datetime(string='Last Connection')
     connection_failures = fields.Integer(string='Connection Failures', default=0)
     response_time = fields.Float(string='Response Time (ms)', default=0)
+    # rolling statistics of the relay scoring engine, see _write_health_checks
+    latency_p50 = fields.Float(string='Ack Latency p50 (ms)', readonly=True)
+    latency_p90 = fields.Float(string='Ack Latency p90 (ms)', readonly=True)
+    ack_success_rate = fields.Float(string='Ack Success Rate (%)', readonly=True)
+    failure_streak = fields.Integer(string='Failure Streak', readonly=True)
+    expected_ack_time = fields.Float(string='Expected Ack Time (ms)', readonly=True,
+                                     default=UNKNOWN_ACK_TIME * 1000,
+                                     help="Median ack latency inflated by the failure rate and streak; "
+                                          "relays with the lowest value are used for publishing")
 
     def test_connection(self):
         self.ensure_one()
@@ -31,6 +67,55 @@ class NostrRelay(models.Model):
             })
         return is_active
 
+    def _seed_scoreboard(self):
+        """Give the scoreboard of this process the persisted statistics."""
+        scoreboard = get_relay_scoreboard()
+        for relay in self:
+            if relay.latency_p50 or relay.failure_streak:
+                scoreboard.seed(
+                    relay.url,
+                    p50=relay.latency_p50 / 1000,
+                    success_rate=relay.ack_success_rate / 100,
+                    failure_streak=relay.failure_streak,
+                )
+
+    def _write_health_checks(self, results):
+        """Store health check ``results`` of all relays in ``self`` at once.
+
+        ``results`` maps urls to ``(is_active, response_time)``; the scoring
+        statistics of this process are written along in the same UPDATE.
+        """
+        snapshot = get_relay_scoreboard().snapshot(self.mapped('url'))
+        rows = []
+        for relay in self:
+            url = relay.url.strip()
+            if url not in results:
+                continue
+            is_active, response_time = results[url]
+            stats = snapshot.get(url)
+            if not stats or stats['ack_success_rate'] is None:
+                scores = (None, None, None, None, None)
+            else:
+                scores = (
+                    (stats['latency_p50'] or 0) * 1000,
+                    (stats['latency_p90'] or 0) * 1000,
+                    stats['ack_success_rate'] * 100,
+                    stats['failure_streak'],
+                    stats['expected_ack_time'] * 1000,
+                )
+            rows.append((relay.id, bool(is_active), response_time) + scores + (self.env.uid,))
+        if not rows:
+            return
+        self.flush_recordset()
+        execute_values(
+            self.env.cr._obj, UPDATE_HEALTH_CHECKS_QUERY, rows,
+            template="(%s, %s, %s::float, %s::float, %s::float, %s::float, %s::integer, %s::float, %s)",
+        )
+        self.invalidate_recordset(HEALTH_CHECK_FIELDS)
+        # the SQL update bypasses the ORM: recompute the active relays
+        self.modified(HEALTH_CHECK_FIELDS)
+        self.env['nostr.publisher'].flush_model(['active_relay_ids'])
+
     @api.model
     def create(self, vals):
         relay = super(NostrRelay, self).create(vals)
@@ -1 +1,2 @@
 from . import test_nostr_publisher
+from . import test_relay_benchmark
@@ -52,6 +52,18 @@ class TestNostrPublisher(TransactionCase):
         self.assertEqual(self.publisher.success_count, 1)
         self.assertEqual(self.publisher.success_rate, 100)
 
+    @patch('odoo.addons.nostr_publisher.models.nostr_publisher.get_relay_pool')
+    def test_publish_many_identical_contents(self, mock_get_relay_pool):
+        mock_get_relay_pool.return_value.publish_batch_sync.side_effect = lambda urls, frames, timeout: {
+            url: [{'url': url, 'success': True, 'accepted': True} for _frame in frames] for url in urls
+        }
+
+        event_ids = self.publisher.publish_many([{'content': "Test content"}] * 3)
+
+        # every event gets its own timestamp, hence its own id
+        self.assertEqual(len(set(event_ids)), 3)
+        self.assertEqual(self.publisher.total_events_published, 3)
+
     def test_compute_id(self):
         event = {
             'content': "Test content",
@@ -0,0 +1,79 @@
+# Publish/subscribe benchmarks of the Nostr Publisher against local relays.
+#
+# Not part of the standard test run, select them explicitly:
+#   odoo-bin -d db --test-tags nostr_benchmark --stop-after-init
+
+import logging
+import time
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+from nostr.key import PrivateKey
+
+from odoo.addons.gitlab_nostr_bridge.tests.benchmark import (
+    format_report, make_signed_events, run_batch, run_paced
+)
+from odoo.addons.gitlab_nostr_bridge.tests.relay_simulator import RelaySimulator
+from odoo.addons.gitlab_nostr_bridge.tests.test_relay_benchmark import (
+    BENCHMARK_EVENTS, BENCHMARK_RATES, INGEST_SIZES
+)
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('-standard', 'nostr_benchmark', 'post_install', '-at_install')
+class TestNostrPublisherBenchmark(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.relays = [
+            RelaySimulator(latency=0.005, seed=1),
+            RelaySimulator(latency=0.05, jitter=0.05, seed=2),
+            RelaySimulator(latency=0.01, failure_rate=0.05, seed=3),
+        ]
+        for relay in cls.relays:
+            relay.start()
+            cls.addClassCleanup(relay.stop)
+        private_key = PrivateKey()
+        cls.env.user.nostr_private_key = private_key.bech32()
+        cls.publisher = cls.env['nostr.publisher'].create({
+            'name': 'Benchmark Publisher',
+            'state': 'active',
+        })
+        cls.env['nostr.relay'].create([{
+            'publisher_id': cls.publisher.id,
+            'url': relay.url,
+        } for relay in cls.relays])
+
+    def setUp(self):
+        super().setUp()
+        self.patch(self.env.cr, 'commit', lambda: None)
+
+    def test_publish_event(self):
+        results = []
+        for rate in BENCHMARK_RATES:
+            def publish(index):
+                self.publisher.publish_event(f"publisher benchmark {rate} {index} {time.time()}")
+                self.env.flush_all()
+            results.append(run_paced('NostrPublisher.publish_event', self.env.cr,
+                                     list(range(BENCHMARK_EVENTS)), publish, rate))
+        contents = [{'content': f"publisher batch {index}", 'kind': 1, 'tags': []}
+                    for index in range(BENCHMARK_EVENTS)]
+        results.append(run_batch('NostrPublisher.publish_many', self.env.cr, contents,
+                                 self.publisher.publish_many))
+        _logger.info("Nostr publisher benchmark:\n%s", format_report(results))
+
+    def test_listen_for_events(self):
+        results = []
+        for size in INGEST_SIZES:
+            events = make_signed_events(size)
+            for relay in self.relays:
+                relay.preload(events)
+            results.append(run_batch('NostrPublisher._listen_for_events', self.env.cr, [None] * size,
+                                     lambda _items: self.publisher._listen_for_events()))
+            stored = self.env['nostr.event'].search_count([
+                ('event_id', 'in', [event['id'] for event in events])
+            ])
+            self.assertEqual(stored, size)
+        _logger.info("Nostr publisher ingestion benchmark:\n%s", format_report(results))
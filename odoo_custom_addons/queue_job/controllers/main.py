@@ -30,6 +30,8 @@ class RunJobController(http.Controller):
         """Try to perform the job."""
         job.set_started()
         job.store()
+        if job.claim_batch():
+            _logger.debug("%s runs with %d batched jobs", job, len(job.batch))
         env.cr.commit()
         _logger.debug("%s started", job)
 
@@ -39,10 +41,52 @@ class RunJobController(http.Controller):
         env.flush_all()
         job.set_done()
         job.store()
+        for batched_job in job.batch:
+            if batched_job.uuid in job.batch_failures:
+                self._fail_batched_job(
+                    batched_job, *job.batch_failures[batched_job.uuid]
+                )
+            else:
+                batched_job.set_done()
+            batched_job.store()
         env.flush_all()
         env.cr.commit()
         _logger.debug("%s done", job)
 
+    def _fail_batched_job(self, job, exception, traceback_txt):
+        """Record the failure of a job executed alone after its batch failed
+
+        The try is already counted on the job, the failure is recorded the
+        same way as when the job runs on its own.
+        """
+        if isinstance(exception, NothingToDoJob):
+            job.set_done(
+                str(exception) or _("Job interrupted and set to Done: nothing to do.")
+            )
+            return
+        if (
+            isinstance(exception, OperationalError)
+            and exception.pgcode in PG_CONCURRENCY_ERRORS_TO_RETRY
+        ):
+            exception = RetryableJobError(
+                tools.ustr(exception.pgerror, errors="replace"), seconds=PG_RETRY
+            )
+        if isinstance(exception, RetryableJobError):
+            job.postpone(result=str(exception), seconds=exception.seconds)
+            job.set_pending(reset_retry=False)
+            _logger.debug("%s postponed", job)
+            return
+        _logger.error(traceback_txt)
+        job.set_failed(**self._get_failure_values(job, traceback_txt, exception))
+
+    def _release_batch(self, job):
+        # the jobs batched with a job that did not succeed run again later,
+        # without a new try: the failure is the one of the job itself
+        for batched_job in job.batch:
+            batched_job.env = job.env
+            batched_job.set_pending(reset_retry=False)
+            batched_job.store()
+
     def _enqueue_dependent_jobs(self, env, job):
         tries = 0
         while True:
@@ -76,6 +120,10 @@ class RunJobController(http.Controller):
     def runjob(self, db, job_uuid, **kw):
         http.request.session.db = db
         env = http.request.env(user=SUPERUSER_ID)
+        return self._runjob(env, job_uuid)
+
+    def _runjob(self, env, job_uuid):
+        """Run an enqueued job, also used by the forked workers of the runner"""
 
         def retry_postpone(job, message, seconds=None):
             job.env.clear()
@@ -84,6 +132,7 @@ class RunJobController(http.Controller):
                 job.postpone(result=message, seconds=seconds)
                 job.set_pending(reset_retry=False)
                 job.store()
+                self._release_batch(job)
 
         # ensure the job to run is in the correct state and lock the record
         env.cr.execute(
@@ -123,6 +172,7 @@ class RunJobController(http.Controller):
                 msg = _("Job interrupted and set to Done: nothing to do.")
             job.set_done(msg)
             job.store()
+            self._release_batch(job)
             env.cr.commit()
 
         except RetryableJobError as err:
@@ -146,6 +196,7 @@ class RunJobController(http.Controller):
                 vals = self._get_failure_values(job, traceback_txt, orig_exception)
                 job.set_failed(**vals)
                 job.store()
+                self._release_batch(job)
                 buff.close()
             raise
 
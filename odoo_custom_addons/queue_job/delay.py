@@ -251,6 +251,11 @@ class DelayableGraph(Graph):
         graph = self._connect_graphs()
 
         vertices = graph.vertices()
+        # the order of creation of the jobs is the order in which the runner
+        # starts them, for the same priority
+        sorted_vertices = list(graph.topological_sort())
+        if len(sorted_vertices) != len(vertices):
+            raise ValueError("The graph of jobs has a cycle")
 
         for vertex in vertices:
             vertex._build_job()
@@ -288,8 +293,7 @@ class DelayableGraph(Graph):
             vertex._generated_job = existing
             return
 
-        for vertex in vertices:
-            vertex._generated_job.store()
+        Job.store_many(vertex._generated_job for vertex in sorted_vertices)
 
     def _execute_graph_direct(self, graph):
         for delayable in graph.topological_sort():
@@ -439,6 +443,7 @@ class Delayable:
         "description",
         "channel",
         "identity_key",
+        "batch_key",
     )
     __slots__ = _properties + (
         "recordset",
@@ -458,6 +463,7 @@ class Delayable:
         description=None,
         channel=None,
         identity_key=None,
+        batch_key=None,
     ):
         self._graph = DelayableGraph()
         self._graph.add_vertex(self)
@@ -470,6 +476,7 @@ class Delayable:
         self.description = description
         self.channel = channel
         self.identity_key = identity_key
+        self.batch_key = batch_key
 
         self._job_method = None
         self._job_args = ()
@@ -539,6 +546,7 @@ class Delayable:
             description=self.description,
             channel=self.channel,
             identity_key=self.identity_key,
+            batch_key=self.batch_key,
         )
         return self._generated_job
 
@@ -589,6 +597,7 @@ class DelayableRecordset(object):
         description=None,
         channel=None,
         identity_key=None,
+        batch_key=None,
     ):
         self.delayable = Delayable(
             recordset,
@@ -598,6 +607,7 @@ class DelayableRecordset(object):
             description=description,
             channel=channel,
             identity_key=identity_key,
+            batch_key=batch_key,
         )
 
     @property
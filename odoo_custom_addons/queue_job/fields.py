@@ -1,15 +1,95 @@
 # copyright 2016 Camptocamp
 # license lgpl-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
 
+import enum
 import json
+import math
+import uuid
 from datetime import date, datetime
 
 import dateutil
 import lxml
 
 from odoo import fields, models
+from odoo.exceptions import CacheMiss
 from odoo.tools.func import lazy
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JobCodec(object):
+    """Encode and decode the values of the JobSerialized fields
+
+    Values are stored as json, the types json does not support are encoded
+    as objects with a ``_type`` key (see JobEncoder and JobDecoder). Codecs
+    must read and write this format, so that they can be swapped on existing
+    jobs. Another codec can be plugged by setting ``JobSerialized.codec``.
+    """
+
+    def dumps(self, value):
+        return json.dumps(value, cls=JobEncoder)
+
+    def loads(self, value, env):
+        return json.loads(value, cls=JobDecoder, env=env)
+
+
+class OrjsonJobCodec(JobCodec):
+    """Encode with orjson, about 3 times faster than json on large arguments
+
+    Decoding is left to json: orjson has no object hook, and decoding the
+    ``_type`` objects afterwards is slower than the hook of json.
+
+    The values json would not encode the same way are encoded by json, so
+    that the arguments accepted and their decoded values do not depend on
+    orjson being installed.
+    """
+
+    options = (
+        orjson.OPT_PASSTHROUGH_DATACLASS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_SUBCLASS
+        if orjson
+        else 0
+    )
+
+    def dumps(self, value):
+        if self._encoded_natively(value):
+            return super().dumps(value)
+        encoder = JobEncoder()
+        try:
+            return orjson.dumps(
+                value, default=encoder.default, option=self.options
+            ).decode()
+        except TypeError:
+            # integers over 64 bits, keys which are not strings, subclasses
+            # of the json types and types unknown to JobEncoder
+            return super().dumps(value)
+
+    @staticmethod
+    def _encoded_natively(value):
+        """Whether value holds what orjson encodes without passthrough option
+
+        orjson encodes the UUIDs and the enums json rejects, and encodes the
+        non-finite floats as null.
+        """
+        stack = [value]
+        while stack:
+            item = stack.pop()
+            item_type = type(item)
+            if item_type is dict:
+                stack.extend(item.values())
+            elif item_type is list or item_type is tuple:
+                stack.extend(item)
+            elif item_type is float:
+                if not math.isfinite(item):
+                    return True
+            elif isinstance(item, (uuid.UUID, enum.Enum)):
+                return True
+        return False
+
 
 class JobSerialized(fields.Field):
     """Provide the storage for job fields stored as json
@@ -24,6 +104,7 @@ class JobSerialized(fields.Field):
 
     type = "job_serialized"
     column_type = ("text", "text")
+    codec = OrjsonJobCodec() if orjson else JobCodec()
 
     _base_type = None
 
@@ -57,13 +138,25 @@ class JobSerialized(fields.Field):
     def convert_to_cache(self, value, record, validate=True):
         # cache format: json.dumps(value) or None
         if isinstance(value, self._base_type):
-            return json.dumps(value, cls=JobEncoder)
+            return self.codec.dumps(value)
         else:
             return value or None
 
     def convert_to_record(self, value, record):
-        default = self._base_type_default_json(record.env)
-        return json.loads(value or default, cls=JobDecoder, env=record.env)
+        return self.loads(value, record.env)
+
+    def loads(self, value, env):
+        """Decode the json of the field, as read by :meth:`read_json`"""
+        return self.codec.loads(value or self._base_type_default_json(env), env)
+
+    def read_json(self, record):
+        """Return the json stored in the field, without decoding it"""
+        record.ensure_one()
+        try:
+            return record.env.cache.get(record, self)
+        except CacheMiss:
+            record._fetch_field(self)
+            return record.env.cache.get(record, self)
 
 
 class JobEncoder(json.JSONEncoder):
@@ -115,9 +208,16 @@ class JobDecoder(json.JSONDecoder):
                 model = model.with_context(**obj.get("context"))
             return model.browse(obj["ids"])
         elif type_ == "datetime_isoformat":
-            return dateutil.parser.parse(obj["value"])
+            try:
+                # what the encoder writes, much faster than dateutil
+                return datetime.fromisoformat(obj["value"])
+            except ValueError:
+                return dateutil.parser.parse(obj["value"])
         elif type_ == "date_isoformat":
-            return dateutil.parser.parse(obj["value"]).date()
+            try:
+                return date.fromisoformat(obj["value"])
+            except ValueError:
+                return dateutil.parser.parse(obj["value"]).date()
         elif type_ == "etree_element":
             return lxml.etree.fromstring(obj["value"])
         return obj
@@ -1,11 +1,14 @@
 # Copyright 2013-2020 Camptocamp
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
 
+import functools
 import hashlib
 import inspect
 import logging
 import os
+import socket
 import sys
+import traceback
 import uuid
 import weakref
 from datetime import datetime, timedelta
@@ -214,6 +217,21 @@ class Job(object):
         be added to a channel if the existing job with the same key is not yet
         started or executed.
 
+    .. attribute::batch_key
+
+        Key of the jobs which can be executed together. When the job runs,
+        the pending jobs of the same user, model, method and batch key are
+        executed in the same call, up to the batch size of the job function.
+
+    .. attribute::batch
+
+        The jobs executed in the same call, when the job runs.
+
+    .. attribute::batch_failures
+
+        The exceptions and tracebacks of the jobs of the batch which failed
+        when executed one by one, by uuid, after the call of the batch failed.
+
     """
 
     @classmethod
@@ -242,8 +260,6 @@ class Job(object):
     def _load_from_db_record(cls, job_db_record):
         stored = job_db_record
 
-        args = stored.args
-        kwargs = stored.kwargs
         method_name = stored.method_name
 
         recordset = stored.records
@@ -255,14 +271,13 @@ class Job(object):
 
         job_ = cls(
             method,
-            args=args,
-            kwargs=kwargs,
             priority=stored.priority,
             eta=eta,
             job_uuid=stored.uuid,
             description=stored.name,
             channel=stored.channel,
             identity_key=stored.identity_key,
+            batch_key=stored.batch_key,
         )
 
         if stored.date_created:
@@ -290,6 +305,11 @@ class Job(object):
             job_.company_id = stored.company_id.id
         job_.identity_key = stored.identity_key
         job_.worker_pid = stored.worker_pid
+        job_.worker_hostname = stored.worker_hostname or None
+        # the arguments are decoded when used: many jobs are loaded only to
+        # change their state
+        job_._args_json = stored._fields["args"].read_json(stored)
+        job_._kwargs_json = stored._fields["kwargs"].read_json(stored)
 
         job_.__depends_on_uuids.update(stored.dependencies.get("depends_on", []))
         job_.__reverse_depends_on_uuids.update(
@@ -395,6 +415,7 @@ class Job(object):
         description=None,
         channel=None,
         identity_key=None,
+        batch_key=None,
     ):
         """Create a Job
 
@@ -419,6 +440,7 @@ class Job(object):
         :param identity_key: A hash to uniquely identify a job, or a function
                              that returns this hash (the function takes the job
                              as argument)
+        :param batch_key: Key of the jobs which can be executed together
         """
         if args is None:
             args = ()
@@ -496,10 +518,17 @@ class Job(object):
         else:
             company_id = env.company.id
         self.company_id = company_id
+        self.batch_key = batch_key
+        self.batch = []
+        self.batch_failures = {}
+        if batch_key and job_uuid is None and eta is None:
+            # give the jobs to coalesce with the time to be delayed
+            eta = self.job_config.batch_window
         self._eta = None
         self.eta = eta
         self.channel = channel
         self.worker_pid = None
+        self.worker_hostname = None
 
     def add_depends(self, jobs):
         if self in jobs:
@@ -519,7 +548,10 @@ class Job(object):
         """
         self.retry += 1
         try:
-            self.result = self.func(*tuple(self.args), **self.kwargs)
+            if self.batch:
+                self.result = self._perform_batch()
+            else:
+                self.result = self.func(*tuple(self.args), **self.kwargs)
         except RetryableJobError as err:
             if err.ignore_retry:
                 self.retry -= 1
@@ -539,6 +571,111 @@ class Job(object):
 
         return self.result
 
+    def claim_batch(self):
+        """Start the pending jobs to execute in the same call as this one
+
+        The claimed jobs are locked until the transaction ends, and the
+        jobs locked by another batch are skipped. Without a batch method on
+        the job function, only the jobs with the same arguments are claimed.
+        """
+        batch_size = self.job_config.batch_size
+        if not self.batch_key or batch_size < 2 or self.graph_uuid:
+            return self.batch
+        same_args = ""
+        if not self.job_config.batch_method:
+            # compared as jsonb: the codecs do not serialize the same way
+            same_args = (
+                "AND job.args::jsonb = leader.args::jsonb "
+                "AND job.kwargs::jsonb = leader.kwargs::jsonb"
+            )
+        # pylint: disable=sql-injection
+        self.env.cr.execute(
+            """
+            SELECT job.uuid
+            FROM queue_job job
+            JOIN queue_job leader ON leader.uuid = %%s
+            WHERE job.state = %%s
+            AND job.batch_key = leader.batch_key
+            AND job.model_name = leader.model_name
+            AND job.method_name = leader.method_name
+            AND job.user_id = leader.user_id
+            AND job.company_id IS NOT DISTINCT FROM leader.company_id
+            AND job.graph_uuid IS NULL
+            AND job.id != leader.id
+            %s
+            ORDER BY job.id
+            LIMIT %%s
+            FOR UPDATE OF job SKIP LOCKED
+            """
+            % same_args,
+            (self.uuid, PENDING, batch_size - 1),
+        )
+        uuids = [row[0] for row in self.env.cr.fetchall()]
+        if uuids:
+            self.batch = sorted(
+                Job.load_many(self.env, uuids), key=lambda job_: job_.uuid
+            )
+        for job_ in self.batch:
+            job_.set_started()
+            job_.store()
+        return self.batch
+
+    def _perform_batch(self):
+        try:
+            with self.env.cr.savepoint():
+                self._perform_batch_call()
+        except Exception:
+            _logger.info(
+                "%s failed with %d batched jobs, executing them one by one",
+                self,
+                len(self.batch),
+                exc_info=True,
+            )
+            self._perform_batch_one_by_one()
+        return self.result
+
+    def _perform_batch_one_by_one(self):
+        """Execute the jobs of a failed batch separately
+
+        A failure of this job is raised before the batched jobs are executed,
+        they will run later. The failures of the batched jobs are kept in
+        :attr:`batch_failures` for the caller to record them on each job.
+        """
+        for job_ in self.batch:
+            job_.result = None
+        self.result = self.func(*tuple(self.args), **self.kwargs)
+        # the failure of this job must not be raised by the first savepoint
+        self.env.flush_all()
+        for job_ in self.batch:
+            try:
+                with self.env.cr.savepoint():
+                    job_.perform()
+            except Exception as err:
+                self.batch_failures[job_.uuid] = (err, traceback.format_exc())
+
+    def _perform_batch_call(self):
+        jobs = [self] + self.batch
+        recordset = functools.reduce(
+            lambda records, job_: records | job_.recordset, self.batch, self.recordset
+        )
+        recordset = recordset.with_context(job_uuid=self.uuid)
+        batch_method = self.job_config.batch_method
+        if not batch_method:
+            result = getattr(recordset, self.method_name)(*self.args, **self.kwargs)
+            for job_ in jobs:
+                job_.result = result
+            return
+        results = getattr(recordset, batch_method)(
+            [(job_.recordset, job_.args, job_.kwargs) for job_ in jobs]
+        )
+        if isinstance(results, (list, tuple)) and len(results) == len(jobs):
+            # one result per job, in the order of the calls
+            for job_, result in zip(jobs, results):
+                job_.result = result
+        else:
+            for job_ in jobs:
+                job_.result = results
+
     def enqueue_waiting(self):
         sql = """
             UPDATE queue_job
@@ -588,6 +725,45 @@ class Job(object):
                 self._store_values(create=True)
             )
 
+    @classmethod
+    def store_many(cls, jobs):
+        """Store jobs, creating the records of the new ones in one batch
+
+        Used to delay graphs of jobs: a single ``create()`` inserts them all,
+        and the notifications of the new jobs reach the runner together when
+        the transaction is committed.
+        """
+        jobs = list(jobs)
+        if not jobs:
+            return
+        job_model = jobs[0].env["queue.job"]
+        job_model = job_model.with_context(
+            _job_edit_sentinel=job_model.EDIT_SENTINEL
+        ).sudo()
+        existing_uuids = set(
+            job_model.search([("uuid", "in", [job_.uuid for job_ in jobs])]).mapped(
+                "uuid"
+            )
+        )
+        new_jobs = []
+        for job_ in jobs:
+            if job_.uuid in existing_uuids:
+                job_.store()
+            else:
+                new_jobs.append(job_)
+        if new_jobs:
+            # the creation of a job is not worth a message
+            job_model.with_context(tracking_disable=True).create(
+                [job_._store_values(create=True) for job_ in new_jobs]
+            )
+            # the trigger on queue_job inserted the graphs, their structure
+            # never changes afterwards
+            graph_uuids = {job_.graph_uuid for job_ in new_jobs if job_.graph_uuid}
+            if graph_uuids:
+                job_model.env["queue.job.graph"].search(
+                    [("graph_uuid", "in", list(graph_uuids))]
+                )._update_structure()
+
     def _store_values(self, create=False):
         vals = {
             "state": self.state,
@@ -607,6 +783,7 @@ class Job(object):
             "eta": False,
             "identity_key": False,
             "worker_pid": self.worker_pid,
+            "worker_hostname": self.worker_hostname or False,
             "graph_uuid": self.graph_uuid,
         }
 
@@ -651,6 +828,7 @@ class Job(object):
                     "records": self.recordset,
                     "args": self.args,
                     "kwargs": self.kwargs,
+                    "batch_key": self.batch_key,
                 }
             )
 
@@ -729,18 +907,44 @@ class Job(object):
 
     @property
     def depends_on(self):
-        if not self._depends_on:
+        if not self._depends_on and self.__depends_on_uuids:
             self._depends_on = Job.load_many(self.env, self.__depends_on_uuids)
         return self._depends_on
 
     @property
     def reverse_depends_on(self):
-        if not self._reverse_depends_on:
+        if not self._reverse_depends_on and self.__reverse_depends_on_uuids:
             self._reverse_depends_on = Job.load_many(
                 self.env, self.__reverse_depends_on_uuids
             )
         return set(self._reverse_depends_on)
 
+    @property
+    def args(self):
+        if self._args_json is not None:
+            field = self.job_model._fields["args"]
+            self._args = tuple(field.loads(self._args_json, self.env))
+            self._args_json = None
+        return self._args
+
+    @args.setter
+    def args(self, value):
+        self._args = value
+        self._args_json = None
+
+    @property
+    def kwargs(self):
+        if self._kwargs_json is not None:
+            field = self.job_model._fields["kwargs"]
+            self._kwargs = field.loads(self._kwargs_json, self.env)
+            self._kwargs_json = None
+        return self._kwargs
+
+    @kwargs.setter
+    def kwargs(self, value):
+        self._kwargs = value
+        self._kwargs_json = None
+
     @property
     def description(self):
         if self._description:
@@ -803,6 +1007,7 @@ class Job(object):
         self.date_started = None
         self.date_done = None
         self.worker_pid = None
+        self.worker_hostname = None
         self.date_cancelled = None
         if reset_retry:
             self.retry = 0
@@ -814,11 +1019,14 @@ class Job(object):
         self.date_enqueued = datetime.now()
         self.date_started = None
         self.worker_pid = None
+        self.worker_hostname = None
 
     def set_started(self):
         self.state = STARTED
         self.date_started = datetime.now()
+        # the jobrunner of the host detects the jobs of dead workers
         self.worker_pid = os.getpid()
+        self.worker_hostname = socket.gethostname()
 
     def set_done(self, result=None):
         self.state = DONE
@@ -36,7 +36,8 @@ class QueueJobRunnerThread(Thread):
     def __init__(self):
         Thread.__init__(self)
         self.daemon = True
-        self.runner = QueueJobRunner.from_environ_or_config()
+        # never fork the threaded server
+        self.runner = QueueJobRunner.from_environ_or_config(fork=False)
 
     def run(self):
         # sleep a bit to let the workers start at ease
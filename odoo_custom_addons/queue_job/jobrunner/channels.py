@@ -1,9 +1,12 @@
 # Copyright (c) 2015-2016 ACSONE SA/NV (<http://acsone.eu>)
 # Copyright 2015-2016 Camptocamp SA
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+import collections
 import logging
+import sys
+from datetime import datetime
 from functools import total_ordering
-from heapq import heappop, heappush
+from heapq import heapify, heappop, heappush
 from weakref import WeakValueDictionary
 
 from ..exception import ChannelNotFound
@@ -13,12 +16,32 @@ NOT_DONE = (WAIT_DEPENDENCIES, PENDING, ENQUEUED, STARTED, FAILED)
 
 _logger = logging.getLogger(__name__)
 
+# rebuild the heap of a priority queue when more than this ratio of its
+# entries are removed objects, and at least COMPACT_MIN_REMOVED
+COMPACT_RATIO = 0.5
+COMPACT_MIN_REMOVED = 1024
+
+
+def _timestamp(value):
+    """Seconds since the epoch of a naive UTC datetime.
+
+    >>> _timestamp(datetime(1970, 1, 2, 0, 0, 1, 500000))
+    86401.5
+    >>> _timestamp(42)
+    42
+    """
+    if isinstance(value, datetime):
+        return (value - datetime(1970, 1, 1)).total_seconds()
+    return value
+
 
 class PriorityQueue(object):
     """A priority queue that supports removing arbitrary objects.
 
     Adding an object already in the queue is a no op.
     Popping an empty queue returns None.
+    Objects are ordered by ``key(o)`` when a ``key`` function is given,
+    which must not change while they are in the queue.
 
     >>> q = PriorityQueue()
     >>> q.add(2)
@@ -44,12 +67,37 @@ class PriorityQueue(object):
     >>> q.add(2)
     >>> q.pop()
     2
+    >>> q = PriorityQueue(key=lambda o: -o)
+    >>> q.add(1)
+    >>> q.add(3)
+    >>> q[0]
+    3
+
+    Removed objects stay in the heap until they are popped, or until they
+    are too many and the heap is compacted.
+
+    >>> q = PriorityQueue()
+    >>> for i in range(3000):
+    ...     q.add(i)
+    >>> for i in range(1500):
+    ...     q.remove(i)
+    >>> len(q._heap)
+    3000
+    >>> q.remove(1500)
+    >>> len(q), len(q._heap), len(q._known), len(q._removed)
+    (1499, 1499, 1499, 0)
+    >>> q.pop()
+    1501
     """
 
-    def __init__(self):
+    def __init__(self, key=None):
         self._heap = []
         self._known = set()  # all objects in the heap (including removed)
         self._removed = set()  # all objects that have been removed
+        self._key = key
+
+    def _object(self, entry):
+        return entry[1] if self._key else entry
 
     def __len__(self):
         return len(self._known) - len(self._removed)
@@ -60,9 +108,9 @@ class PriorityQueue(object):
         while True:
             if not self._heap:
                 raise IndexError()
-            o = self._heap[0]
+            o = self._object(self._heap[0])
             if o in self._removed:
-                o2 = heappop(self._heap)
+                o2 = self._object(heappop(self._heap))
                 assert o2 == o
                 self._removed.remove(o)
                 self._known.remove(o)
@@ -80,7 +128,7 @@ class PriorityQueue(object):
         if o in self._known:
             return
         self._known.add(o)
-        heappush(self._heap, o)
+        heappush(self._heap, (self._key(o), o) if self._key else o)
 
     def remove(self, o):
         if o is None:
@@ -89,11 +137,25 @@ class PriorityQueue(object):
             return
         if o not in self._removed:
             self._removed.add(o)
+            if (
+                len(self._removed) >= COMPACT_MIN_REMOVED
+                and len(self._removed) > len(self._heap) * COMPACT_RATIO
+            ):
+                self._compact()
+
+    def _compact(self):
+        """Drop the removed objects from the heap."""
+        removed = self._removed
+        self._heap = [e for e in self._heap if self._object(e) not in removed]
+        heapify(self._heap)
+        # new sets, as sets do not shrink
+        self._known = {self._object(e) for e in self._heap}
+        self._removed = set()
 
     def pop(self):
         while True:
             try:
-                o = heappop(self._heap)
+                o = self._object(heappop(self._heap))
             except IndexError:
                 # queue is empty
                 return None
@@ -191,8 +253,28 @@ class ChannelJob(object):
     >>> j1.sorting_key_ignoring_eta() < j2.sorting_key_ignoring_eta()
     True
 
+    With aging, the priority of a job improves by one every ``aging``
+    seconds it waits: j1 was created 2 seconds before j3, this is enough
+    to overtake j3 when the priority improves every 0.1 second.
+
+    >>> j1.aged_sorting_key(aging=0.1) < j3.aged_sorting_key(aging=0.1)
+    True
+
     """
 
+    # the runner keeps one per job not done, in every database
+    __slots__ = (
+        "db_name",
+        "channel",
+        "uuid",
+        "seq",
+        "date_created",
+        "priority",
+        "eta",
+        "first_eta",
+        "__weakref__",
+    )
+
     def __init__(self, db_name, channel, uuid, seq, date_created, priority, eta):
         self.db_name = db_name
         self.channel = channel
@@ -201,6 +283,8 @@ class ChannelJob(object):
         self.date_created = date_created
         self.priority = priority
         self.eta = eta
+        # the eta is reset when the job is ready to run
+        self.first_eta = eta
 
     def __repr__(self):
         return "<ChannelJob %s>" % self.uuid
@@ -217,6 +301,13 @@ class ChannelJob(object):
     def sorting_key_ignoring_eta(self):
         return self.priority, self.date_created, self.seq
 
+    def aged_sorting_key(self, aging):
+        # priority - (now - ready_time) / aging, without the now shared by
+        # all the jobs, so that the key does not change over time;
+        # jobs wait from their eta, or their creation
+        ready_time = self.first_eta or _timestamp(self.date_created)
+        return self.priority + ready_time / aging, self.date_created, self.seq
+
     def __lt__(self, other):
         if self.eta and not other.eta:
             return True
@@ -306,12 +397,27 @@ class ChannelQueue(object):
     <ChannelJob 7>
     >>> sq.pop(30)
     <ChannelJob 8>
+
+    Test a queue with aging: j9 waited long enough for its priority
+    to be better than the one of j10.
+
+    >>> aq = ChannelQueue(aging=10)
+    >>> j9 = ChannelJob(None, None, 9,
+    ...                 seq=0, date_created=0, priority=10, eta=None)
+    >>> j10 = ChannelJob(None, None, 10,
+    ...                  seq=0, date_created=100, priority=5, eta=None)
+    >>> aq.add(j10)
+    >>> aq.add(j9)
+    >>> aq.pop(100)
+    <ChannelJob 9>
     """
 
-    def __init__(self, sequential=False):
-        self._queue = PriorityQueue()
+    def __init__(self, sequential=False, aging=0):
+        key = (lambda job: job.aged_sorting_key(aging)) if aging else None
+        self._queue = PriorityQueue(key=key)
         self._eta_queue = PriorityQueue()
         self.sequential = sequential
+        self.aging = aging
 
     def __len__(self):
         return len(self._eta_queue) + len(self._queue)
@@ -354,6 +460,113 @@ class ChannelQueue(object):
         return wakeup_time
 
 
+class _Flow(object):
+    def __init__(self, key, weight, queue):
+        self.key = key
+        self.weight = weight
+        self.queue = queue
+        self.deficit = 0
+
+
+class FairQueue(object):
+    """A channel queue sharing the channel between flows of jobs.
+
+    ``flow_of(job)`` returns the flow of a job and its weight. Each flow
+    has its own :class:`ChannelQueue` and the flows take turns, deficit
+    round robin style: at its turn, a flow runs ``weight`` jobs (a weight
+    below 1 is accumulated until the flow can run one job), so that a flood
+    of jobs in one flow does not delay the jobs of the other flows.
+
+    >>> q = FairQueue(lambda job: (job.channel, 2 if job.channel == 'B' else 1))
+    >>> for i in range(1, 4):
+    ...     q.add(ChannelJob(None, 'A', 'A%d' % i,
+    ...                      seq=i, date_created=i, priority=10, eta=None))
+    ...     q.add(ChannelJob(None, 'B', 'B%d' % i,
+    ...                      seq=i, date_created=i, priority=10, eta=None))
+    >>> len(q)
+    6
+    >>> [q.pop(now=0) for _i in range(4)]
+    [<ChannelJob A1>, <ChannelJob B1>, <ChannelJob B2>, <ChannelJob A2>]
+    >>> [q.pop(now=0) for _i in range(3)]
+    [<ChannelJob B3>, <ChannelJob A3>, None]
+
+    A flow which has only jobs with an eta in the future loses its turn.
+
+    >>> q.add(ChannelJob(None, 'A', 'A4', seq=4, date_created=4, priority=10,
+    ...                  eta=10))
+    >>> q.add(ChannelJob(None, 'B', 'B4', seq=4, date_created=4, priority=10,
+    ...                  eta=None))
+    >>> q.get_wakeup_time()
+    10
+    >>> q.pop(now=5), q.pop(now=5)
+    (<ChannelJob B4>, None)
+    >>> q.pop(now=10)
+    <ChannelJob A4>
+    """
+
+    # a fair channel cannot be sequential
+    sequential = False
+
+    def __init__(self, flow_of, aging=0):
+        self.flow_of = flow_of
+        self.aging = aging
+        self._flows = {}
+        # the flows having jobs, the current one first
+        self._active = collections.deque()
+
+    def __len__(self):
+        return sum(len(flow.queue) for flow in self._active)
+
+    def __contains__(self, job):
+        flow = self._flows.get(self.flow_of(job)[0])
+        return flow is not None and job in flow.queue
+
+    def add(self, job):
+        key, weight = self.flow_of(job)
+        flow = self._flows.get(key)
+        if flow is None:
+            flow = _Flow(key, weight, ChannelQueue(aging=self.aging))
+            self._flows[key] = flow
+            self._active.append(flow)
+        flow.queue.add(job)
+
+    def remove(self, job):
+        flow = self._flows.get(self.flow_of(job)[0])
+        if flow is not None:
+            flow.queue.remove(job)
+
+    def pop(self, now):
+        blocked = set()  # flows having no job to run now
+        while len(blocked) < len(self._active):
+            flow = self._active[0]
+            if not flow.queue:
+                self._active.popleft()
+                del self._flows[flow.key]
+                continue
+            if flow.deficit < 1:
+                # the turn of the flow begins
+                flow.deficit += flow.weight
+                if flow.deficit < 1:
+                    self._active.rotate(-1)
+                    continue
+            job = flow.queue.pop(now)
+            if job is None:
+                flow.deficit = 0
+                blocked.add(flow.key)
+                self._active.rotate(-1)
+                continue
+            flow.deficit -= 1
+            if flow.deficit < 1:
+                self._active.rotate(-1)
+            return job
+        return None
+
+    def get_wakeup_time(self, wakeup_time=0):
+        for flow in self._active:
+            wakeup_time = flow.queue.get_wakeup_time(wakeup_time)
+        return wakeup_time
+
+
 class Channel(object):
     """A channel for jobs, with a maximum capacity.
 
@@ -399,6 +612,12 @@ class Channel(object):
     with a capacity of 1. It is also possible to dedicate a channel with a
     limited capacity for application-autocreated subchannels
     without risking to overflow the system.
+
+    A ``fair`` channel does not run the jobs of its queue strictly in order:
+    its capacity is shared between its subchannels (and its own jobs),
+    according to their ``weight``, and between the databases, according to
+    their weight in the channel manager. With ``aging``, the priority of
+    the waiting jobs improves by one every ``aging`` seconds.
     """
 
     def __init__(self, name, parent, capacity=None, sequential=False, throttle=0):
@@ -407,6 +626,9 @@ class Channel(object):
         if self.parent:
             self.parent.children[name] = self
         self.children = {}
+        # weights of the databases, shared by all the channels
+        self.db_weights = self.parent.db_weights if self.parent else {}
+        self.weight = 1
         self._queue = ChannelQueue()
         self._running = SafeSet()
         self._failed = SafeSet()
@@ -431,13 +653,42 @@ class Channel(object):
         * capacity
         * sequential
         * throttle
+        * fair
+        * weight
+        * aging
         """
         assert self.fullname.endswith(config["name"])
         self.capacity = config.get("capacity", None)
+        fair = bool(config.get("fair", False))
+        aging = float(config.get("aging", 0))
+        # channels are configured before their jobs are loaded
+        if fair:
+            self._queue = FairQueue(self._flow_of, aging=aging)
+        else:
+            self._queue = ChannelQueue(aging=aging)
         self.sequential = bool(config.get("sequential", False))
         self.throttle = int(config.get("throttle", 0))
+        self.weight = float(config.get("weight", 1))
         if self.sequential and self.capacity != 1:
             raise ValueError("A sequential channel must have a capacity of 1")
+        if self.sequential and (fair or aging):
+            raise ValueError("A sequential channel cannot be fair or use aging")
+        if self.weight <= 0:
+            raise ValueError("The weight of a channel must be positive")
+
+    def _flow_of(self, job):
+        """The flow of a job in a fair channel, and its weight.
+
+        The jobs of a subchannel, or of the channel itself, and of a database
+        are a flow.
+        """
+        source = job.channel
+        while source is not self and source.parent is not self:
+            source = source.parent
+        weight = source.weight if source is not self else 1
+        return (source, job.db_name), weight * self.db_weights.get(
+            job.db_name, 1
+        )
 
     @property
     def fullname(self):
@@ -571,6 +822,21 @@ class Channel(object):
                 _logger.debug("pausing channel %s until %s", self, self._pause_until)
                 return
 
+    def get_stats(self, now):
+        """Counters of the channel, for the metrics of the runner.
+
+        ``pending`` jobs are the ones waiting in the queue of this very
+        channel, jobs move to the queue of the parent channel when they
+        are ready to run in the channel.
+        """
+        return {
+            "pending": len(self._queue),
+            "running": len(self._running),
+            "failed": len(self._failed),
+            "capacity": self.capacity or 0,
+            "paused": int(bool(self._pause_until) and now < self._pause_until),
+        }
+
     def get_wakeup_time(self, wakeup_time=0):
         if not self.has_capacity():
             # this channel is full, do not request timed wakeup, as
@@ -796,6 +1062,21 @@ class ChannelManager(object):
     >>> cm.notify(db, 'S', 'S3', 3, 0, 10, None, 'done')
     >>> pp(list(cm.get_jobs_to_run(now=105)))
     []
+
+    Test fair channels: the jobs of channel A in database db were created
+    first, but the jobs of database db2 in channel A and the jobs of
+    channel B, with a weight of 2, get their share of the capacity.
+
+    >>> cm = ChannelManager()
+    >>> cm.simple_configure('root:4:fair,A:4:fair,B:4:weight=2')
+    >>> cm.configure_db_weights('db2:2')
+    >>> for i in range(1, 7):
+    ...     cm.notify(db, 'A', 'A%d' % i, i, 0, 10, None, 'pending')
+    >>> cm.notify(db, 'B', 'B1', 7, 1, 10, None, 'pending')
+    >>> cm.notify(db, 'B', 'B2', 8, 1, 10, None, 'pending')
+    >>> cm.notify('db2', 'A', 'C1', 9, 1, 10, None, 'pending')
+    >>> pp(list(cm.get_jobs_to_run(now=100)))
+    [<ChannelJob A1>, <ChannelJob C1>, <ChannelJob B1>, <ChannelJob B2>]
     """
 
     def __init__(self):
@@ -900,6 +1181,40 @@ class ChannelManager(object):
             res.append(config)
         return res
 
+    def configure_db_weights(self, config_string):
+        """Configure the weights of the databases in the fair channels
+
+        The configuration string is a list of ``database:weight``, the
+        weight of the other databases is 1.
+
+        >>> cm = ChannelManager()
+        >>> cm.configure_db_weights('db1:3, db2:0.5')
+        >>> cm.get_channel_by_name('root.sub', autocreate=True).db_weights
+        {'db1': 3.0, 'db2': 0.5}
+        """
+        db_weights = {}
+        for item in split_strip(config_string.replace("\n", ","), ","):
+            if not item:
+                continue
+            db_name, _sep, weight = item.rpartition(":")
+            db_name = db_name.strip()
+            try:
+                weight = float(weight)
+            except ValueError as ex:
+                raise ValueError(
+                    "Invalid database weights %s: "
+                    "invalid weight %s" % (config_string, weight)
+                ) from ex
+            if not db_name or weight <= 0:
+                raise ValueError(
+                    "Invalid database weights %s: "
+                    "incorrect item %s" % (config_string, item)
+                )
+            db_weights[db_name] = weight
+        # the dictionary is shared by all the channels
+        self._root_channel.db_weights.clear()
+        self._root_channel.db_weights.update(db_weights)
+
     def simple_configure(self, config_string):
         """Configure the channel manager from a simple configuration string
 
@@ -1043,6 +1358,8 @@ class ChannelManager(object):
                 self.remove_job(uuid)
                 job = None
         if not job:
+            # one string for the jobs of a database, whatever its origin
+            db_name = sys.intern(db_name)
             job = ChannelJob(db_name, channel, uuid, seq, date_created, priority, eta)
             self._jobs_by_uuid[uuid] = job
         # state transitions
@@ -1072,8 +1389,19 @@ class ChannelManager(object):
                 job.channel.remove(job)
                 del self._jobs_by_uuid[job.uuid]
 
+    def get_db_jobs(self, db_name):
+        return [job for job in self._jobs_by_uuid.values() if job.db_name == db_name]
+
     def get_jobs_to_run(self, now):
         return self._root_channel.get_jobs_to_run(now)
 
+    def get_channels(self):
+        """Iterate over all the channels, parents before their children."""
+        channels = [self._root_channel]
+        while channels:
+            channel = channels.pop(0)
+            yield channel
+            channels.extend(channel.children.values())
+
     def get_wakeup_time(self):
         return self._root_channel.get_wakeup_time()
@@ -0,0 +1,315 @@
+# Copyright 2026 Camptocamp SA
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+"""
+Asynchronous dispatch of ``/queue_job/runjob`` requests.
+
+The runner used to start a thread and open a new HTTP connection for every
+job it dispatched, with a 1 second timeout after which the job was reset to
+pending, even when Odoo was merely slow to accept the request.
+
+The :class:`HttpDispatcher` owns one asyncio event loop, running on a daemon
+thread, and a pool of keep-alive HTTP/1.1 connections to Odoo. At most
+``concurrency`` requests are in flight at once, which the runner sets to the
+capacity of the root channel: Odoo answers ``/queue_job/runjob`` once the
+job is done, so every running job holds one connection.
+
+Failures are told apart:
+
+* the connection cannot be established within ``connect_timeout``, the
+  request cannot be sent, or Odoo answers with an HTTP error: the job never
+  started and is handed to ``reset_job`` so that it goes back to pending;
+* no answer arrives within ``response_timeout``: the request was delivered
+  and the job is most probably running, it is left alone (stuck jobs are
+  handled by the *Jobs Garbage Collector* cron).
+"""
+
+import asyncio
+import base64
+import collections
+import logging
+import ssl
+import threading
+import time
+from urllib.parse import urlencode
+
+_logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 5
+# 0 waits for Odoo to answer, however long the job takes
+RESPONSE_TIMEOUT = 0
+# keep-alive connections unused for that long are closed
+IDLE_TIMEOUT = 30
+STOP_TIMEOUT = 10
+
+
+class DispatchConnectError(Exception):
+    """The request could not be delivered to Odoo."""
+
+
+def parse_response_head(status_line, header_lines):
+    """Return the status code and whether the connection can be reused.
+
+    >>> parse_response_head(b"HTTP/1.1 200 OK\\r\\n", [b"Content-Length: 0\\r\\n"])
+    (200, True)
+    >>> parse_response_head(b"HTTP/1.1 500 Error\\r\\n", [b"Connection: close\\r\\n"])
+    (500, False)
+    >>> parse_response_head(b"HTTP/1.0 200 OK\\r\\n", [])
+    (200, False)
+    >>> parse_response_head(b"HTTP/1.0 200 OK\\r\\n", [b"Connection: Keep-Alive\\r\\n"])
+    (200, True)
+    """
+    version, status, _reason = (
+        status_line.decode("latin-1").rstrip("\r\n").split(" ", 2) + [""]
+    )[:3]
+    headers = _parse_headers(header_lines)
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.1":
+        keep_alive = connection != "close"
+    else:
+        keep_alive = connection == "keep-alive"
+    return int(status), keep_alive
+
+
+def _parse_headers(header_lines):
+    headers = {}
+    for line in header_lines:
+        name, _sep, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+class _Connection(object):
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+
+    def close(self):
+        self.writer.close()
+
+    async def request(self, request, response_timeout):
+        self.writer.write(request)
+        await self.writer.drain()
+        status_line = await asyncio.wait_for(
+            self.reader.readline(), response_timeout or None
+        )
+        if not status_line:
+            raise ConnectionResetError("connection closed by Odoo")
+        header_lines = []
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            header_lines.append(line)
+        status, keep_alive = parse_response_head(status_line, header_lines)
+        keep_alive = await self._read_body(_parse_headers(header_lines), keep_alive)
+        self.last_used = time.monotonic()
+        return status, keep_alive
+
+    async def _read_body(self, headers, keep_alive):
+        # the body of /queue_job/runjob is not interesting, but it has to be
+        # consumed before the connection can be reused
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if not size:
+                    while (await self.reader.readline()) not in (b"\r\n", b""):
+                        pass
+                    return keep_alive
+                await self.reader.readexactly(size + 2)
+        if "content-length" in headers:
+            await self.reader.readexactly(int(headers["content-length"]))
+            return keep_alive
+        await self.reader.read()
+        return False
+
+
+class HttpDispatcher(object):
+    def __init__(
+        self,
+        scheme="http",
+        host="localhost",
+        port=8069,
+        user=None,
+        password=None,
+        concurrency=1,
+        connect_timeout=CONNECT_TIMEOUT,
+        response_timeout=RESPONSE_TIMEOUT,
+        reset_job=None,
+    ):
+        self.scheme = scheme
+        self.host = host
+        self.port = int(port)
+        self.concurrency = max(int(concurrency), 1)
+        self.connect_timeout = connect_timeout
+        self.response_timeout = response_timeout
+        self.reset_job = reset_job
+        self._ssl_context = ssl.create_default_context() if scheme == "https" else None
+        self._authorization = None
+        if user:
+            credentials = "{}:{}".format(user, password or "").encode()
+            self._authorization = "Basic " + base64.b64encode(credentials).decode()
+        self._idle = collections.deque()
+        self._tasks = set()
+        self._semaphore = None
+        self._loop = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop.call_soon(started.set)
+            self._loop.create_task(self._close_idle_connections())
+            self._loop.run_forever()
+
+        self._idle.clear()
+        self._thread = threading.Thread(
+            target=run, name="queue_job.dispatcher", daemon=True
+        )
+        self._thread.start()
+        started.wait()
+        _logger.info(
+            "dispatching jobs to %s://%s:%s, %d at a time",
+            self.scheme,
+            self.host,
+            self.port,
+            self.concurrency,
+        )
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        async def shutdown():
+            while self._idle:
+                self._idle.pop().close()
+            # requests in flight are abandoned, the jobs keep running in Odoo
+            for task in asyncio.all_tasks():
+                if task is not asyncio.current_task():
+                    task.cancel()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(STOP_TIMEOUT)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(STOP_TIMEOUT)
+        self._thread = None
+        self._loop.close()
+
+    def dispatch(self, db_name, job_uuid):
+        """Ask Odoo to run a job, without waiting for the answer."""
+        self._loop.call_soon_threadsafe(self._schedule, db_name, job_uuid)
+
+    def _schedule(self, db_name, job_uuid):
+        task = self._loop.create_task(self._dispatch(db_name, job_uuid))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _build_request(self, db_name, job_uuid):
+        path = "/queue_job/runjob?" + urlencode({"db": db_name, "job_uuid": job_uuid})
+        lines = [
+            "GET {} HTTP/1.1".format(path),
+            "Host: {}:{}".format(self.host, self.port),
+            "Connection: keep-alive",
+        ]
+        if self._authorization:
+            lines.append("Authorization: " + self._authorization)
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    def _url(self, db_name, job_uuid):
+        return "{}://{}:{}/queue_job/runjob?db={}&job_uuid={}".format(
+            self.scheme, self.host, self.port, db_name, job_uuid
+        )
+
+    async def _connect(self):
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    self.host,
+                    self.port,
+                    ssl=self._ssl_context,
+                ),
+                self.connect_timeout,
+            )
+        except asyncio.TimeoutError as err:
+            raise DispatchConnectError(
+                "no connection within %ss" % self.connect_timeout
+            ) from err
+        except OSError as err:
+            raise DispatchConnectError(str(err)) from err
+        return _Connection(reader, writer)
+
+    async def _request(self, request):
+        # a pooled connection may have been closed by Odoo or a proxy while
+        # idle: retry once on a new connection, /queue_job/runjob ignores
+        # jobs that are not enqueued anymore
+        while self._idle:
+            connection = self._idle.pop()
+            try:
+                return connection, await self._send(connection, request)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                continue
+        connection = await self._connect()
+        try:
+            return connection, await self._send(connection, request)
+        except (ConnectionError, asyncio.IncompleteReadError) as err:
+            raise DispatchConnectError(str(err)) from err
+
+    async def _send(self, connection, request):
+        try:
+            return await connection.request(request, self.response_timeout)
+        except BaseException:
+            # whatever was left unread makes the connection unusable
+            connection.close()
+            raise
+
+    async def _dispatch(self, db_name, job_uuid):
+        url = self._url(db_name, job_uuid)
+        async with self._semaphore:
+            try:
+                connection, (status, keep_alive) = await self._request(
+                    self._build_request(db_name, job_uuid)
+                )
+            except asyncio.TimeoutError:
+                _logger.warning(
+                    "no answer to GET %s within %ss, job is left running",
+                    url,
+                    self.response_timeout,
+                )
+                return
+            except DispatchConnectError as err:
+                _logger.warning("could not GET %s: %s", url, err)
+                await self._reset_job(db_name, job_uuid)
+                return
+            except Exception:
+                _logger.exception("exception in GET %s", url)
+                await self._reset_job(db_name, job_uuid)
+                return
+            if keep_alive:
+                self._idle.append(connection)
+            else:
+                connection.close()
+            if status >= 400:
+                _logger.error("GET %s returned HTTP %s", url, status)
+                await self._reset_job(db_name, job_uuid)
+
+    async def _reset_job(self, db_name, job_uuid):
+        if self.reset_job is None:
+            return
+        try:
+            await self._loop.run_in_executor(None, self.reset_job, db_name, job_uuid)
+        except Exception:
+            _logger.exception("could not reset job %s to pending", job_uuid)
+
+    async def _close_idle_connections(self):
+        while True:
+            await asyncio.sleep(IDLE_TIMEOUT)
+            now = time.monotonic()
+            for connection in list(self._idle):
+                if now - connection.last_used >= IDLE_TIMEOUT:
+                    self._idle.remove(connection)
+                    connection.close()
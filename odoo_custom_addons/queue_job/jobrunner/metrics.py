@@ -0,0 +1,253 @@
+# Copyright 2026 Camptocamp SA
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+"""
+Metrics of the job runner, in the Prometheus text format.
+
+With ``ODOO_QUEUE_JOB_METRICS_PORT`` set, the runner serves its metrics on
+``http://127.0.0.1:<port>/metrics`` (``ODOO_QUEUE_JOB_METRICS_HOST`` to listen
+on another interface):
+
+* ``queue_job_channel_pending``, ``queue_job_channel_running``,
+  ``queue_job_channel_failed``, ``queue_job_channel_capacity`` and
+  ``queue_job_channel_paused``: the state of every channel;
+* ``queue_job_dispatched_total``, ``queue_job_done_total`` and
+  ``queue_job_failed_total``: counters of jobs, the dispatch rate is
+  ``rate(queue_job_dispatched_total[1m])``;
+* ``queue_job_start_latency_seconds``: histogram of the time between the
+  dispatch of a job and its start;
+* ``queue_job_exec_time_seconds``: quantiles of the execution time of the
+  last jobs.
+
+The times are measured by the runner, from the notifications of the jobs it
+dispatched. A job that starts and ends between two notifications is counted
+as done without a start latency.
+
+The runner loop updates the metrics, the HTTP server thread only renders
+them, so a scrape never walks the channels while the runner changes them.
+"""
+
+import bisect
+import collections
+import logging
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from .channels import CANCELLED, DONE, FAILED, PENDING, STARTED
+
+_logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+# the quantiles are computed on the last jobs of each channel
+EXEC_TIME_SAMPLES = 1000
+EXEC_TIME_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _quantile(sorted_values, quantile):
+    """Nearest rank quantile of sorted values
+
+    >>> _quantile([1, 2, 3, 4], 0.5)
+    2
+    >>> _quantile([1, 2, 3, 4], 0.99)
+    4
+    """
+    index = max(math.ceil(quantile * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RunnerMetrics(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = []
+        self._dispatched = collections.Counter()
+        self._done = collections.Counter()
+        self._failed = collections.Counter()
+        # per channel: count of each bucket, sum, count
+        self._latency = {}
+        self._exec_times = {}
+        self._exec_sum = collections.Counter()
+        self._exec_count = collections.Counter()
+        # uuid: (channel, monotonic time)
+        self._dispatched_at = {}
+        self._started_at = {}
+        self._server = None
+
+    def job_dispatched(self, channel, uuid):
+        with self._lock:
+            self._dispatched[channel] += 1
+            self._dispatched_at[uuid] = (channel, time.monotonic())
+
+    def job_notified(self, uuid, state):
+        if uuid not in self._dispatched_at and uuid not in self._started_at:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if state == STARTED:
+                if uuid in self._dispatched_at:
+                    channel, dispatched_at = self._dispatched_at.pop(uuid)
+                    self._observe_latency(channel, now - dispatched_at)
+                    self._started_at[uuid] = (channel, now)
+            elif state == DONE:
+                if uuid in self._started_at:
+                    channel, started_at = self._started_at.pop(uuid)
+                    self._observe_exec_time(channel, now - started_at)
+                else:
+                    channel, _dispatched_at = self._dispatched_at.pop(uuid)
+                self._done[channel] += 1
+            elif state == FAILED:
+                channel, _time = (
+                    self._started_at.pop(uuid, None) or self._dispatched_at.pop(uuid)
+                )
+                self._failed[channel] += 1
+            elif state in (PENDING, CANCELLED):
+                # postponed, requeued or cancelled
+                self.job_removed(uuid)
+
+    def job_removed(self, uuid):
+        self._dispatched_at.pop(uuid, None)
+        self._started_at.pop(uuid, None)
+
+    def _observe_latency(self, channel, seconds):
+        if channel not in self._latency:
+            self._latency[channel] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0, 0]
+        histogram = self._latency[channel]
+        histogram[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+    def _observe_exec_time(self, channel, seconds):
+        if channel not in self._exec_times:
+            self._exec_times[channel] = collections.deque(maxlen=EXEC_TIME_SAMPLES)
+        self._exec_times[channel].append(seconds)
+        self._exec_sum[channel] += seconds
+        self._exec_count[channel] += 1
+
+    def update_channels(self, channel_manager, now):
+        """Take a snapshot of the channels, for the next scrapes"""
+        channels = [
+            (channel.fullname, channel.get_stats(now))
+            for channel in channel_manager.get_channels()
+        ]
+        with self._lock:
+            self._channels = channels
+
+    def render(self):
+        lines = []
+
+        def family(name, type_, help_, samples):
+            lines.append("# HELP {} {}".format(name, help_))
+            lines.append("# TYPE {} {}".format(name, type_))
+            for suffix, labels, value in samples:
+                label_text = ",".join(
+                    '{}="{}"'.format(key, _escape(str(val))) for key, val in labels
+                )
+                lines.append("{}{}{{{}}} {}".format(name, suffix, label_text, value))
+
+        with self._lock:
+            for stat, help_ in (
+                ("pending", "Jobs waiting in the channel."),
+                ("running", "Jobs running in the channel."),
+                ("failed", "Failed jobs of the channel."),
+                ("capacity", "Capacity of the channel, 0 when unlimited."),
+                ("paused", "1 when the channel is paused by its throttle."),
+            ):
+                family(
+                    "queue_job_channel_" + stat,
+                    "gauge",
+                    help_,
+                    [
+                        ("", [("channel", name)], stats[stat])
+                        for name, stats in self._channels
+                    ],
+                )
+            for name, counter, help_ in (
+                ("dispatched", self._dispatched, "Jobs dispatched."),
+                ("done", self._done, "Dispatched jobs done."),
+                ("failed", self._failed, "Dispatched jobs failed."),
+            ):
+                family(
+                    "queue_job_%s_total" % name,
+                    "counter",
+                    help_,
+                    [
+                        ("", [("channel", channel)], count)
+                        for channel, count in sorted(counter.items())
+                    ],
+                )
+            samples = []
+            for channel, histogram in sorted(self._latency.items()):
+                cumulated = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram):
+                    cumulated += count
+                    samples.append(
+                        ("_bucket", [("channel", channel), ("le", bound)], cumulated)
+                    )
+                samples.append(("_sum", [("channel", channel)], histogram[-2]))
+                samples.append(("_count", [("channel", channel)], histogram[-1]))
+            family(
+                "queue_job_start_latency_seconds",
+                "histogram",
+                "Time between the dispatch and the start of the jobs.",
+                samples,
+            )
+            samples = []
+            for channel, exec_times in sorted(self._exec_times.items()):
+                sorted_times = sorted(exec_times)
+                for quantile in EXEC_TIME_QUANTILES:
+                    samples.append(
+                        (
+                            "",
+                            [("channel", channel), ("quantile", quantile)],
+                            _quantile(sorted_times, quantile),
+                        )
+                    )
+                samples.append(
+                    ("_sum", [("channel", channel)], self._exec_sum[channel])
+                )
+                samples.append(
+                    ("_count", [("channel", channel)], self._exec_count[channel])
+                )
+            family(
+                "queue_job_exec_time_seconds",
+                "summary",
+                "Execution time of the last %d jobs." % EXEC_TIME_SAMPLES,
+                samples,
+            )
+        return "\n".join(lines) + "\n"
+
+    def start(self, host, port):
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # pylint: disable=W0622
+                pass
+
+        self._server = HTTPServer((host, port), MetricsHandler)
+        thread = threading.Thread(
+            target=self._server.serve_forever, name="queue_job.metrics", daemon=True
+        )
+        thread.start()
+        _logger.info("serving queue job metrics on http://%s:%s/metrics", host, port)
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
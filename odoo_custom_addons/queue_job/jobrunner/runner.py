@@ -17,6 +17,9 @@ How does it work?
   is populated from the queue_job tables in all databases.
 * It does not run jobs itself, but asks Odoo to run them through an
   anonymous ``/queue_job/runjob`` HTTP request. [1]_
+* The requests are sent from an asyncio event loop over a pool of
+  keep-alive connections, at most as many at once as the capacity of the
+  root channel.
 
 How to use it?
 --------------
@@ -25,12 +28,43 @@ How to use it?
 
   - ``ODOO_QUEUE_JOB_CHANNELS=root:4`` (or any other channels
     configuration), default ``root:1``.
+  - ``ODOO_QUEUE_JOB_DB_WEIGHTS=db1:3,db2:1``, share of the databases in
+    the fair channels (configured like ``root:4:fair``), default 1 for each
+    database.
   - ``ODOO_QUEUE_JOB_SCHEME=https``, default ``http``.
   - ``ODOO_QUEUE_JOB_HOST=load-balancer``, default ``http_interface``
     or ``localhost`` if unset.
   - ``ODOO_QUEUE_JOB_PORT=443``, default ``http_port`` or 8069 if unset.
   - ``ODOO_QUEUE_JOB_HTTP_AUTH_USER=jobrunner``, default empty.
   - ``ODOO_QUEUE_JOB_HTTP_AUTH_PASSWORD=s3cr3t``, default empty.
+  - ``ODOO_QUEUE_JOB_DISPATCH_CONNECT_TIMEOUT=5``, seconds to connect to
+    Odoo before the job is reset to pending, default 5.
+  - ``ODOO_QUEUE_JOB_DISPATCH_TIMEOUT=0``, seconds to wait for Odoo to answer
+    ``/queue_job/runjob`` (it answers when the job is done), default 0
+    meaning no limit.
+  - ``ODOO_QUEUE_JOB_EXECUTION=forked``, run the jobs in worker processes
+    forked by the runner instead of asking Odoo through HTTP, default
+    ``http``. Needs the runner to run as a worker process (``--workers``
+    greater than 1).
+  - ``ODOO_QUEUE_JOB_WORKER_MAX_JOBS=1000``, jobs a forked worker runs
+    before being replaced, default ``limit_request``.
+  - ``ODOO_QUEUE_JOB_WORKER_MEMORY_LIMIT=1073741824``, memory in bytes above
+    which a forked worker is replaced, default ``limit_memory_soft``.
+  - ``ODOO_QUEUE_JOB_SHARDS=16``, split the jobs of every database in that
+    many shards, each one run by the runner holding its advisory lock, so
+    that several Odoo nodes can run a runner, default 0 (a single runner).
+  - ``ODOO_QUEUE_JOB_DB_DISCOVERY_INTERVAL=60``, seconds between two checks
+    for new databases, or databases on which queue_job was installed,
+    default 60, 0 to disable.
+  - ``ODOO_QUEUE_JOB_WATCHDOG_INTERVAL=10``, seconds between two checks
+    for stuck jobs: the jobs over the enqueued or started timeouts of their
+    channel, and the jobs started by a worker of this host that died, are
+    put back to pending, default 10, 0 to disable.
+  - ``ODOO_QUEUE_JOB_METRICS_PORT=9108``, serve the metrics of the runner
+    in the Prometheus text format on ``/metrics`` on that port, default 0
+    (disabled).
+  - ``ODOO_QUEUE_JOB_METRICS_HOST=0.0.0.0``, interface of the metrics
+    endpoint, default ``127.0.0.1``.
   - ``ODOO_QUEUE_JOB_JOBRUNNER_DB_HOST=master-db``, default ``db_host``
     or ``False`` if unset.
   - ``ODOO_QUEUE_JOB_JOBRUNNER_DB_PORT=5432``, default ``db_port``
@@ -47,11 +81,22 @@ How to use it?
 
   [queue_job]
   channels = root:4
+  db_weights = db1:3,db2:1
   scheme = https
   host = load-balancer
   port = 443
   http_auth_user = jobrunner
   http_auth_password = s3cr3t
+  dispatch_connect_timeout = 5
+  dispatch_timeout = 0
+  execution = forked
+  worker_max_jobs = 1000
+  worker_memory_limit = 1073741824
+  shards = 16
+  db_discovery_interval = 60
+  watchdog_interval = 10
+  metrics_port = 9108
+  metrics_host = 127.0.0.1
   jobrunner_db_host = master-db
   jobrunner_db_port = 5432
   jobrunner_db_user = userdb
@@ -112,19 +157,26 @@ Caveat
 ------
 
 * After creating a new database or installing queue_job on an
-  existing database, Odoo must be restarted for the runner to detect it.
+  existing database, the runner detects it within
+  ``db_discovery_interval`` seconds.
+
+* With ``shards``, the channel capacities apply to each runner: with two
+  runners, a channel with a capacity of 2 runs up to 4 jobs at once. The
+  jobs of a sequential channel all belong to the same shard and are still
+  run one at a time.
 
 * When Odoo shuts down normally, it waits for running jobs to finish.
   However, when the Odoo server crashes or is otherwise force-stopped,
   running jobs are interrupted while the runner has no chance to know
   they have been aborted. In such situations, jobs may remain in
   ``started`` or ``enqueued`` state after the Odoo server is halted.
-  Since the runner has no way to know if they are actually running or
-  not, and does not know for sure if it is safe to restart the jobs,
-  it does not attempt to restart them automatically. Such stale jobs
-  therefore fill the running queue and prevent other jobs to start.
-  You must therefore requeue them manually, either from the Jobs view,
-  or by running the following SQL statement *before starting Odoo*:
+  The watchdog of the runner only requeues the jobs started by a worker
+  of its own host, when the worker process is gone, and the jobs over the
+  ``enqueued_timeout`` or ``started_timeout`` set on their channel. Without
+  timeouts, the stale jobs of another host fill the running queue and
+  prevent other jobs to start. You must then requeue them manually, either
+  from the Jobs view, or by running the following SQL statement *before
+  starting Odoo*:
 
 .. code-block:: sql
 
@@ -142,23 +194,44 @@ Caveat
 import datetime
 import logging
 import os
+import random
 import selectors
-import threading
+import socket
 import time
+import zlib
 from contextlib import closing, contextmanager
 
 import psycopg2
-import requests
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 
 import odoo
 from odoo.tools import config
 
 from . import queue_job_config
-from .channels import ENQUEUED, NOT_DONE, PENDING, ChannelManager
+from .channels import ENQUEUED, FAILED, NOT_DONE, PENDING, STARTED, ChannelManager
+from .dispatcher import CONNECT_TIMEOUT, RESPONSE_TIMEOUT, HttpDispatcher
+from .metrics import RunnerMetrics
+from .worker_pool import ForkedWorkerPool
 
 SELECT_TIMEOUT = 60
 ERROR_RECOVERY_DELAY = 5
+# dispatch concurrency when the root channel has no capacity limit
+UNLIMITED_DISPATCH_CONCURRENCY = 100
+# keys of the advisory locks: (SHARD_LOCK_NAMESPACE, shard) is held by the
+# runner of a shard, (RUNNER_LOCK_NAMESPACE, 0) is shared by all the runners
+SHARD_LOCK_NAMESPACE = 7300
+RUNNER_LOCK_NAMESPACE = 7301
+SHARD_REBALANCE_INTERVAL = 10
+DB_DISCOVERY_INTERVAL = 60
+WATCHDOG_INTERVAL = 10
+# jobs loaded from the named cursor at a time
+JOB_LOAD_BATCH_SIZE = 1000
+# the columns are in the index queue_job_not_done_covering_index
+SELECT_JOBS_QUERY = (
+    "SELECT channel, uuid, id as seq, date_created, "
+    "priority, EXTRACT(EPOCH FROM eta), state "
+    "FROM queue_job WHERE %s"
+)
 
 _logger = logging.getLogger(__name__)
 
@@ -206,57 +279,171 @@ def _connection_info_for(db_name):
     return connection_info
 
 
-def _async_http_get(scheme, host, port, user, password, db_name, job_uuid):
-    # Method to set failed job (due to timeout, etc) as pending,
+def _job_shard(channel, uuid, shards):
+    """Return the shard of a job.
+
+    The jobs of a sequential channel are all in the same shard, for a
+    single runner to run them in order.
+
+    >>> cm = ChannelManager()
+    >>> cm.simple_configure('root:4,A:2,S:1:sequential')
+    >>> a = cm.get_channel_by_name('A')
+    >>> _job_shard(a, 'uuid-1', 8), _job_shard(a, 'uuid-2', 8)
+    (6, 4)
+    >>> s = cm.get_channel_by_name('S.sub', parent_fallback=True)
+    >>> _job_shard(s, 'uuid-1', 8) == _job_shard(s, 'uuid-2', 8)
+    True
+    """
+    key = uuid
+    while channel.parent is not None:
+        if channel.sequential:
+            key = channel.fullname
+            break
+        channel = channel.parent
+    return zlib.crc32(key.encode()) % shards
+
+
+def _set_job_pending(db_name, job_uuid):
+    # Method to set failed job (due to connection errors, etc) as pending,
     # to avoid keeping it as enqueued.
-    def set_job_pending():
-        connection_info = _connection_info_for(db_name)
-        conn = psycopg2.connect(**connection_info)
-        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-        with closing(conn.cursor()) as cr:
-            cr.execute(
-                "UPDATE queue_job SET state=%s, "
-                "date_enqueued=NULL, date_started=NULL "
-                "WHERE uuid=%s and state=%s "
-                "RETURNING uuid",
-                (PENDING, job_uuid, ENQUEUED),
+    connection_info = _connection_info_for(db_name)
+    conn = psycopg2.connect(**connection_info)
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    with closing(conn), closing(conn.cursor()) as cr:
+        cr.execute(
+            "UPDATE queue_job SET state=%s, "
+            "date_enqueued=NULL, date_started=NULL "
+            "WHERE uuid=%s and state=%s "
+            "RETURNING uuid",
+            (PENDING, job_uuid, ENQUEUED),
+        )
+        if cr.fetchone():
+            _logger.warning(
+                "state of job %s was reset from %s to %s",
+                job_uuid,
+                ENQUEUED,
+                PENDING,
             )
-            if cr.fetchone():
-                _logger.warning(
-                    "state of job %s was reset from %s to %s",
-                    job_uuid,
-                    ENQUEUED,
-                    PENDING,
-                )
 
-    # TODO: better way to HTTP GET asynchronously (grequest, ...)?
-    #       if this was python3 I would be doing this with
-    #       asyncio, aiohttp and aiopg
-    def urlopen():
-        url = "{}://{}:{}/queue_job/runjob?db={}&job_uuid={}".format(
-            scheme, host, port, db_name, job_uuid
-        )
-        try:
-            auth = None
-            if user:
-                auth = (user, password)
-            # we are not interested in the result, so we set a short timeout
-            # but not too short so we trap and log hard configuration errors
-            response = requests.get(url, timeout=1, auth=auth)
-
-            # raise_for_status will result in either nothing, a Client Error
-            # for HTTP Response codes between 400 and 500 or a Server Error
-            # for codes between 500 and 600
-            response.raise_for_status()
-        except requests.Timeout:
-            set_job_pending()
-        except Exception:
-            _logger.exception("exception in GET %s", url)
-            set_job_pending()
 
-    thread = threading.Thread(target=urlopen)
-    thread.daemon = True
-    thread.start()
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # a process of another user
+        return True
+    return True
+
+
+def _requeue_stuck_jobs(cr, hostname, dead_pids):
+    """Requeue the stuck jobs in one statement
+
+    The jobs enqueued or started for longer than the timeout of their
+    channel, or of its closest parent channel having one, and the jobs
+    started by the dead processes ``dead_pids`` of ``hostname`` are put back
+    to pending. A started job used a try: after its last one, it is failed.
+
+    Return the uuid, new state and reason of the requeued jobs.
+    """
+    cr.execute(
+        """
+        WITH candidate AS (
+            SELECT
+                job.id,
+                job.state,
+                job.retry,
+                job.max_retries,
+                CASE
+                    WHEN job.state = %(started)s
+                    AND job.worker_hostname = %(hostname)s
+                    AND job.worker_pid = ANY(%(dead_pids)s)
+                    THEN 'worker process died'
+                    WHEN job.state = %(enqueued)s
+                    AND job.date_enqueued <= now() at time zone 'utc'
+                        - enqueued.timeout * interval '1 second'
+                    THEN 'enqueued for more than '
+                        || enqueued.timeout || ' seconds'
+                    WHEN job.state = %(started)s
+                    AND job.date_started <= now() at time zone 'utc'
+                        - started.timeout * interval '1 second'
+                    THEN 'started for more than '
+                        || started.timeout || ' seconds'
+                END AS reason
+            FROM queue_job job
+            LEFT JOIN LATERAL (
+                SELECT channel.enqueued_timeout AS timeout
+                FROM queue_job_channel channel
+                WHERE channel.enqueued_timeout > 0
+                AND (
+                    job.channel = channel.complete_name
+                    OR starts_with(job.channel, channel.complete_name || '.')
+                )
+                ORDER BY length(channel.complete_name) DESC
+                LIMIT 1
+            ) enqueued ON true
+            LEFT JOIN LATERAL (
+                SELECT channel.started_timeout AS timeout
+                FROM queue_job_channel channel
+                WHERE channel.started_timeout > 0
+                AND (
+                    job.channel = channel.complete_name
+                    OR starts_with(job.channel, channel.complete_name || '.')
+                )
+                ORDER BY length(channel.complete_name) DESC
+                LIMIT 1
+            ) started ON true
+            WHERE job.state IN (%(enqueued)s, %(started)s)
+        ), stuck AS (
+            -- the workers may change the jobs meanwhile, never wait for them
+            SELECT
+                job.id,
+                candidate.reason,
+                CASE
+                    WHEN candidate.state = %(started)s
+                    AND candidate.max_retries > 0
+                    AND candidate.retry + 1 >= candidate.max_retries
+                    THEN %(failed)s
+                    ELSE %(pending)s
+                END AS state,
+                candidate.retry + (candidate.state = %(started)s)::int AS retry
+            FROM queue_job job
+            JOIN candidate ON candidate.id = job.id
+            WHERE candidate.reason IS NOT NULL
+            AND job.state = candidate.state
+            FOR UPDATE OF job SKIP LOCKED
+        )
+        UPDATE queue_job job
+        SET state = stuck.state,
+            retry = stuck.retry,
+            date_enqueued = NULL,
+            date_started = NULL,
+            worker_pid = NULL,
+            worker_hostname = NULL,
+            exc_name = CASE
+                WHEN stuck.state = %(failed)s THEN %(exc_name)s
+                ELSE job.exc_name
+            END,
+            exc_message = CASE
+                WHEN stuck.state = %(failed)s THEN stuck.reason
+                ELSE job.exc_message
+            END
+        FROM stuck
+        WHERE job.id = stuck.id
+        RETURNING job.uuid, job.state, stuck.reason
+        """,
+        {
+            "hostname": hostname,
+            "dead_pids": list(dead_pids),
+            "enqueued": ENQUEUED,
+            "started": STARTED,
+            "pending": PENDING,
+            "failed": FAILED,
+            "exc_name": "odoo.addons.queue_job.exception.FailedJobError",
+        },
+    )
+    return cr.fetchall()
 
 
 class Database(object):
@@ -265,6 +452,7 @@ class Database(object):
         connection_info = _connection_info_for(db_name)
         self.conn = psycopg2.connect(**connection_info)
         self.conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        self.has_watchdog = False
         self.has_queue_job = self._has_queue_job()
         if self.has_queue_job:
             self._initialize()
@@ -312,6 +500,34 @@ class Database(object):
     def _initialize(self):
         with closing(self.conn.cursor()) as cr:
             cr.execute("LISTEN queue_job")
+            # until the module is updated, the timeouts do not exist
+            cr.execute(
+                "SELECT count(*) FROM information_schema.columns "
+                "WHERE (table_name, column_name) IN (%s, %s)",
+                (
+                    ("queue_job", "worker_hostname"),
+                    ("queue_job_channel", "started_timeout"),
+                ),
+            )
+            self.has_watchdog = cr.fetchone()[0] == 2
+
+    def requeue_stuck_jobs(self, hostname):
+        with closing(self.conn.cursor()) as cr:
+            cr.execute(
+                "SELECT DISTINCT worker_pid FROM queue_job "
+                "WHERE state = %s AND worker_hostname = %s",
+                (STARTED, hostname),
+            )
+            pids = [row[0] for row in cr.fetchall()]
+            dead_pids = [pid for pid in pids if pid and not _pid_alive(pid)]
+            for uuid, state, reason in _requeue_stuck_jobs(cr, hostname, dead_pids):
+                _logger.warning(
+                    "job %s of db %s is stuck (%s), set to %s",
+                    uuid,
+                    self.db_name,
+                    reason,
+                    state,
+                )
 
     @contextmanager
     def select_jobs(self, where, args):
@@ -319,11 +535,7 @@ class Database(object):
         # the checker thinks we are injecting values but we are not, we are
         # adding the where conditions, values are added later properly with
         # parameters
-        query = (
-            "SELECT channel, uuid, id as seq, date_created, "
-            "priority, EXTRACT(EPOCH FROM eta), state "
-            "FROM queue_job WHERE %s" % (where,)
-        )
+        query = SELECT_JOBS_QUERY % (where,)
         with closing(self.conn.cursor("select_jobs", withhold=True)) as cr:
             cr.execute(query, args)
             yield cr
@@ -333,15 +545,57 @@ class Database(object):
         with closing(self.conn.cursor()) as cr:
             cr.execute(query)
 
+    def join_runners(self):
+        with closing(self.conn.cursor()) as cr:
+            cr.execute(
+                "SELECT pg_advisory_lock_shared(%s, 0)", (RUNNER_LOCK_NAMESPACE,)
+            )
+
+    def count_runners(self):
+        with closing(self.conn.cursor()) as cr:
+            cr.execute(
+                "SELECT count(*) FROM pg_locks "
+                "WHERE locktype = 'advisory' AND granted "
+                "AND database = (SELECT oid FROM pg_database "
+                "                WHERE datname = current_database()) "
+                "AND classid = %s AND objid = 0 AND objsubid = 2",
+                (RUNNER_LOCK_NAMESPACE,),
+            )
+            return cr.fetchone()[0]
+
+    def try_lock_shard(self, shard):
+        with closing(self.conn.cursor()) as cr:
+            cr.execute(
+                "SELECT pg_try_advisory_lock(%s, %s)", (SHARD_LOCK_NAMESPACE, shard)
+            )
+            return cr.fetchone()[0]
+
+    def unlock_shard(self, shard):
+        with closing(self.conn.cursor()) as cr:
+            cr.execute(
+                "SELECT pg_advisory_unlock(%s, %s)", (SHARD_LOCK_NAMESPACE, shard)
+            )
+
+    def unlock_all(self):
+        with closing(self.conn.cursor()) as cr:
+            cr.execute("SELECT pg_advisory_unlock_all()")
+
     def set_job_enqueued(self, uuid):
+        return uuid in self.set_jobs_enqueued([uuid])
+
+    def set_jobs_enqueued(self, uuids):
+        """Set the pending jobs to enqueued, return the uuids of these jobs"""
         with closing(self.conn.cursor()) as cr:
             cr.execute(
                 "UPDATE queue_job SET state=%s, "
                 "date_enqueued=date_trunc('seconds', "
                 "                         now() at time zone 'utc') "
-                "WHERE uuid=%s",
-                (ENQUEUED, uuid),
+                # a job batched with another one is not pending anymore
+                "WHERE uuid = ANY(%s) AND state = %s "
+                "RETURNING uuid",
+                (ENQUEUED, list(uuids), PENDING),
             )
+            return {row[0] for row in cr.fetchall()}
 
 
 class QueueJobRunner(object):
@@ -353,6 +607,17 @@ class QueueJobRunner(object):
         user=None,
         password=None,
         channel_config_string=None,
+        db_weights_config_string=None,
+        connect_timeout=CONNECT_TIMEOUT,
+        response_timeout=RESPONSE_TIMEOUT,
+        execution="http",
+        worker_max_jobs=None,
+        worker_memory_limit=None,
+        shards=0,
+        db_discovery_interval=DB_DISCOVERY_INTERVAL,
+        watchdog_interval=WATCHDOG_INTERVAL,
+        metrics_port=0,
+        metrics_host="127.0.0.1",
     ):
         self.scheme = scheme
         self.host = host
@@ -363,12 +628,47 @@ class QueueJobRunner(object):
         if channel_config_string is None:
             channel_config_string = _channels()
         self.channel_manager.simple_configure(channel_config_string)
+        if db_weights_config_string:
+            self.channel_manager.configure_db_weights(db_weights_config_string)
+        # every running job holds one request until Odoo answers it
+        capacity = self.channel_manager.get_channel_by_name("root").capacity
+        if execution == "forked":
+            self.dispatcher = ForkedWorkerPool(
+                size=capacity or UNLIMITED_DISPATCH_CONCURRENCY,
+                max_jobs=worker_max_jobs or config["limit_request"],
+                memory_limit=worker_memory_limit or config["limit_memory_soft"],
+                time_limit=config["limit_time_real"],
+                cpu_time_limit=config["limit_time_cpu"],
+                reset_job=_set_job_pending,
+            )
+        else:
+            self.dispatcher = HttpDispatcher(
+                scheme=scheme,
+                host=host,
+                port=port,
+                user=user,
+                password=password,
+                concurrency=capacity or UNLIMITED_DISPATCH_CONCURRENCY,
+                connect_timeout=connect_timeout,
+                response_timeout=response_timeout,
+                reset_job=_set_job_pending,
+            )
         self.db_by_name = {}
+        self.shards = shards
+        self.shards_by_db = {}
+        self._next_rebalance = 0
+        self.db_discovery_interval = db_discovery_interval
+        self._next_discovery = 0
+        self.watchdog_interval = watchdog_interval
+        self._next_watchdog = 0
+        self.metrics_port = metrics_port
+        self.metrics_host = metrics_host
+        self.metrics = RunnerMetrics() if metrics_port else None
         self._stop = False
         self._stop_pipe = os.pipe()
 
     @classmethod
-    def from_environ_or_config(cls):
+    def from_environ_or_config(cls, fork=True):
         scheme = os.environ.get("ODOO_QUEUE_JOB_SCHEME") or queue_job_config.get(
             "scheme"
         )
@@ -388,12 +688,68 @@ class QueueJobRunner(object):
         password = os.environ.get(
             "ODOO_QUEUE_JOB_HTTP_AUTH_PASSWORD"
         ) or queue_job_config.get("http_auth_password")
+        db_weights = os.environ.get(
+            "ODOO_QUEUE_JOB_DB_WEIGHTS"
+        ) or queue_job_config.get("db_weights")
+        connect_timeout = os.environ.get(
+            "ODOO_QUEUE_JOB_DISPATCH_CONNECT_TIMEOUT"
+        ) or queue_job_config.get("dispatch_connect_timeout")
+        response_timeout = os.environ.get(
+            "ODOO_QUEUE_JOB_DISPATCH_TIMEOUT"
+        ) or queue_job_config.get("dispatch_timeout")
+        execution = os.environ.get("ODOO_QUEUE_JOB_EXECUTION") or queue_job_config.get(
+            "execution"
+        )
+        if execution == "forked" and not fork:
+            _logger.warning(
+                "forked execution needs the runner to run in its own process "
+                "(--workers > 0), jobs are run through HTTP"
+            )
+            execution = "http"
+        worker_max_jobs = os.environ.get(
+            "ODOO_QUEUE_JOB_WORKER_MAX_JOBS"
+        ) or queue_job_config.get("worker_max_jobs")
+        worker_memory_limit = os.environ.get(
+            "ODOO_QUEUE_JOB_WORKER_MEMORY_LIMIT"
+        ) or queue_job_config.get("worker_memory_limit")
+        shards = os.environ.get("ODOO_QUEUE_JOB_SHARDS") or queue_job_config.get(
+            "shards"
+        )
+        db_discovery_interval = os.environ.get(
+            "ODOO_QUEUE_JOB_DB_DISCOVERY_INTERVAL"
+        ) or queue_job_config.get("db_discovery_interval")
+        watchdog_interval = os.environ.get(
+            "ODOO_QUEUE_JOB_WATCHDOG_INTERVAL"
+        ) or queue_job_config.get("watchdog_interval")
+        metrics_port = os.environ.get(
+            "ODOO_QUEUE_JOB_METRICS_PORT"
+        ) or queue_job_config.get("metrics_port")
+        metrics_host = os.environ.get(
+            "ODOO_QUEUE_JOB_METRICS_HOST"
+        ) or queue_job_config.get("metrics_host")
         runner = cls(
             scheme=scheme or "http",
             host=host or "localhost",
             port=port or 8069,
             user=user,
             password=password,
+            db_weights_config_string=db_weights,
+            connect_timeout=float(connect_timeout or CONNECT_TIMEOUT),
+            response_timeout=float(response_timeout or RESPONSE_TIMEOUT),
+            execution=execution or "http",
+            worker_max_jobs=int(worker_max_jobs or 0),
+            worker_memory_limit=int(worker_memory_limit or 0),
+            shards=int(shards or 0),
+            db_discovery_interval=float(
+                DB_DISCOVERY_INTERVAL
+                if db_discovery_interval is None
+                else db_discovery_interval
+            ),
+            watchdog_interval=float(
+                WATCHDOG_INTERVAL if watchdog_interval is None else watchdog_interval
+            ),
+            metrics_port=int(metrics_port or 0),
+            metrics_host=metrics_host or "127.0.0.1",
         )
         return runner
 
@@ -405,41 +761,169 @@ class QueueJobRunner(object):
         return db_names
 
     def close_databases(self, remove_jobs=True):
-        for db_name, db in self.db_by_name.items():
-            try:
-                if remove_jobs:
-                    self.channel_manager.remove_db(db_name)
-                db.close()
-            except Exception:
-                _logger.warning("error closing database %s", db_name, exc_info=True)
-        self.db_by_name = {}
+        for db_name in list(self.db_by_name):
+            self.detach_database(db_name, remove_jobs=remove_jobs)
+
+    def detach_database(self, db_name, remove_jobs=True):
+        db = self.db_by_name.pop(db_name)
+        self.shards_by_db.pop(db_name, None)
+        try:
+            if remove_jobs:
+                self.channel_manager.remove_db(db_name)
+            if self.shards:
+                # hand the shards over to the other runners right away
+                db.unlock_all()
+            db.close()
+        except Exception:
+            _logger.warning("error closing database %s", db_name, exc_info=True)
 
     def initialize_databases(self):
         for db_name in self.get_db_names():
-            db = Database(db_name)
-            if db.has_queue_job:
-                self.db_by_name[db_name] = db
-                with db.select_jobs("state in %s", (NOT_DONE,)) as cr:
-                    for job_data in cr:
-                        self.channel_manager.notify(db_name, *job_data)
-                _logger.info("queue job runner ready for db %s", db_name)
+            self.attach_database(db_name)
+        self._next_rebalance = time.monotonic() + SHARD_REBALANCE_INTERVAL
+        self._next_discovery = time.monotonic() + self.db_discovery_interval
+
+    def attach_database(self, db_name):
+        """Start running the jobs of a database, if queue_job is installed"""
+        db = Database(db_name)
+        if not db.has_queue_job:
+            db.close()
+            return False
+        self.db_by_name[db_name] = db
+        if self.shards:
+            db.join_runners()
+            self.shards_by_db[db_name] = set()
+            self._rebalance_shards(db, load_jobs=False)
+        self._load_jobs(
+            db,
+            "state in %s",
+            (NOT_DONE,),
+            lambda job_data: self._owns_job(db_name, job_data[0], job_data[1]),
+        )
+        _logger.info("queue job runner ready for db %s", db_name)
+        return True
+
+    def _load_jobs(self, db, where, args, predicate=None):
+        # stream the jobs from the named cursor, a batch at a time
+        with db.select_jobs(where, args) as cr:
+            while True:
+                rows = cr.fetchmany(JOB_LOAD_BATCH_SIZE)
+                if not rows:
+                    break
+                for job_data in rows:
+                    if predicate is None or predicate(job_data):
+                        self.channel_manager.notify(db.db_name, *job_data)
+
+    def discover_databases(self):
+        """Attach new databases and detach the dropped ones.
+
+        The databases already attached are left alone, with their jobs.
+        """
+        if not self.db_discovery_interval or time.monotonic() < self._next_discovery:
+            return
+        self._next_discovery = time.monotonic() + self.db_discovery_interval
+        db_names = set(self.get_db_names())
+        for db_name in list(self.db_by_name):
+            if db_name not in db_names:
+                _logger.info("database %s disappeared", db_name)
+                self.detach_database(db_name)
+        for db_name in sorted(db_names - set(self.db_by_name)):
+            try:
+                self.attach_database(db_name)
+            except Exception:
+                _logger.warning("error attaching database %s", db_name, exc_info=True)
+                if db_name in self.db_by_name:
+                    self.detach_database(db_name)
+
+    def watch_stuck_jobs(self):
+        """Requeue the stuck jobs of all the databases"""
+        if not self.watchdog_interval or time.monotonic() < self._next_watchdog:
+            return
+        self._next_watchdog = time.monotonic() + self.watchdog_interval
+        hostname = socket.gethostname()
+        for db in self.db_by_name.values():
+            if db.has_watchdog:
+                db.requeue_stuck_jobs(hostname)
+
+    def _owns_job(self, db_name, channel_name, uuid):
+        if not self.shards:
+            return True
+        channel = self.channel_manager.get_channel_by_name(
+            channel_name, parent_fallback=True
+        )
+        return _job_shard(channel, uuid, self.shards) in self.shards_by_db[db_name]
+
+    def rebalance_shards(self):
+        if not self.shards or time.monotonic() < self._next_rebalance:
+            return
+        for db in self.db_by_name.values():
+            self._rebalance_shards(db)
+        self._next_rebalance = time.monotonic() + SHARD_REBALANCE_INTERVAL
+
+    def _rebalance_shards(self, db, load_jobs=True):
+        """Lock or unlock shards so every runner owns about as many.
+
+        A runner that stopped released its locks, or lost them with its
+        connection: its shards are taken over by the others here.
+        """
+        owned = self.shards_by_db[db.db_name]
+        runners = max(db.count_runners(), 1)
+        target = -(-self.shards // runners)
+        released = set(sorted(owned)[target:])
+        for shard in released:
+            db.unlock_shard(shard)
+        owned -= released
+        acquired = set()
+        for shard in random.sample(range(self.shards), self.shards):
+            if len(owned) >= target:
+                break
+            if shard not in owned and db.try_lock_shard(shard):
+                owned.add(shard)
+                acquired.add(shard)
+        if not (released or acquired):
+            return
+        _logger.info(
+            "runner owns shards %s of db %s (%d runners)",
+            sorted(owned),
+            db.db_name,
+            runners,
+        )
+        for job in self.channel_manager.get_db_jobs(db.db_name):
+            if _job_shard(job.channel, job.uuid, self.shards) in released:
+                self.channel_manager.remove_job(job.uuid)
+        if acquired and load_jobs:
+
+            def in_acquired_shard(job_data):
+                channel = self.channel_manager.get_channel_by_name(
+                    job_data[0], parent_fallback=True
+                )
+                return _job_shard(channel, job_data[1], self.shards) in acquired
+
+            self._load_jobs(db, "state in %s", (NOT_DONE,), in_acquired_shard)
 
     def run_jobs(self):
         now = _odoo_now()
+        # one UPDATE per database for all the jobs that can run now
+        jobs_by_db = {}
         for job in self.channel_manager.get_jobs_to_run(now):
             if self._stop:
                 break
-            _logger.info("asking Odoo to run job %s on db %s", job.uuid, job.db_name)
-            self.db_by_name[job.db_name].set_job_enqueued(job.uuid)
-            _async_http_get(
-                self.scheme,
-                self.host,
-                self.port,
-                self.user,
-                self.password,
-                job.db_name,
-                job.uuid,
+            jobs_by_db.setdefault(job.db_name, []).append(job)
+        for db_name, jobs in jobs_by_db.items():
+            enqueued = self.db_by_name[db_name].set_jobs_enqueued(
+                [job.uuid for job in jobs]
             )
+            for job in jobs:
+                if job.uuid not in enqueued:
+                    # already started in the batch of another job
+                    _logger.debug("job %s is not pending anymore", job.uuid)
+                    continue
+                _logger.info("asking Odoo to run job %s on db %s", job.uuid, db_name)
+                self.dispatcher.dispatch(db_name, job.uuid)
+                if self.metrics:
+                    self.metrics.job_dispatched(job.channel.fullname, job.uuid)
+        if self.metrics:
+            self.metrics.update_channels(self.channel_manager, now)
 
     def process_notifications(self):
         for db in self.db_by_name.values():
@@ -449,17 +933,25 @@ class QueueJobRunner(object):
                 # causing some intermediaries (such as haproxy) to close the
                 # connection, making the jobrunner to restart on a socket error
                 db.keep_alive()
+            # read the jobs of all the pending notifications at once,
+            # a job updated several times is read once
             while db.conn.notifies:
                 if self._stop:
                     break
-                notification = db.conn.notifies.pop()
-                uuid = notification.payload
-                with db.select_jobs("uuid = %s", (uuid,)) as cr:
-                    job_datas = cr.fetchone()
-                    if job_datas:
+                uuids = {notification.payload for notification in db.conn.notifies}
+                db.conn.notifies.clear()
+                with db.select_jobs("uuid = ANY(%s)", (list(uuids),)) as cr:
+                    for job_datas in cr:
+                        if not self._owns_job(db.db_name, job_datas[0], job_datas[1]):
+                            continue
+                        uuids.discard(job_datas[1])
                         self.channel_manager.notify(db.db_name, *job_datas)
-                    else:
-                        self.channel_manager.remove_job(uuid)
+                        if self.metrics:
+                            self.metrics.job_notified(job_datas[1], job_datas[6])
+                for uuid in uuids:
+                    self.channel_manager.remove_job(uuid)
+                    if self.metrics:
+                        self.metrics.job_removed(uuid)
 
     def wait_notification(self):
         for db in self.db_by_name.values():
@@ -479,6 +971,12 @@ class QueueJobRunner(object):
             timeout = SELECT_TIMEOUT
         else:
             timeout = wakeup_time - _odoo_now()
+        if self.shards:
+            timeout = min(timeout, self._next_rebalance - time.monotonic())
+        if self.db_discovery_interval:
+            timeout = min(timeout, self._next_discovery - time.monotonic())
+        if self.watchdog_interval:
+            timeout = min(timeout, self._next_watchdog - time.monotonic())
         # wait for a notification or a timeout;
         # if timeout is negative (ie wakeup time in the past),
         # do not wait; this should rarely happen
@@ -506,16 +1004,20 @@ class QueueJobRunner(object):
 
     def run(self):
         _logger.info("starting")
+        self.dispatcher.start()
+        if self.metrics:
+            self.metrics.start(self.metrics_host, self.metrics_port)
         while not self._stop:
             # outer loop does exception recovery
             try:
                 _logger.info("initializing database connections")
-                # TODO: how to detect new databases or databases
-                #       on which queue_job is installed after server start?
                 self.initialize_databases()
                 _logger.info("database connections ready")
                 # inner loop does the normal processing
                 while not self._stop:
+                    self.discover_databases()
+                    self.rebalance_shards()
+                    self.watch_stuck_jobs()
                     self.process_notifications()
                     self.run_jobs()
                     self.wait_notification()
@@ -531,4 +1033,7 @@ class QueueJobRunner(object):
                 self.close_databases()
                 time.sleep(ERROR_RECOVERY_DELAY)
         self.close_databases(remove_jobs=False)
+        self.dispatcher.stop()
+        if self.metrics:
+            self.metrics.stop()
         _logger.info("stopped")
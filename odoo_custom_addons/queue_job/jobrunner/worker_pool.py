@@ -0,0 +1,279 @@
+# Copyright 2026 Camptocamp SA
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+"""
+Execution of jobs in worker processes forked by the runner.
+
+With ``ODOO_QUEUE_JOB_EXECUTION=forked``, the runner does not ask Odoo to run
+jobs through ``/queue_job/runjob``: the :class:`ForkedWorkerPool` forks up to
+``size`` worker processes (the capacity of the root channel) and sends them
+the jobs to run over a pipe. A worker keeps its registries and database
+connections from one job to the next and runs the job like the controller
+does, without the HTTP request, the session and the request environment.
+
+A worker is replaced once it ran ``max_jobs`` jobs or its memory exceeds
+``memory_limit`` bytes, and killed when a job runs longer than
+``time_limit`` seconds or uses more than ``cpu_time_limit`` seconds of CPU,
+like the HTTP workers of Odoo.
+
+The runner must run in its own process: forking the threaded Odoo server is
+not supported.
+"""
+
+import collections
+import logging
+import os
+import resource
+import selectors
+import signal
+import threading
+import time
+from multiprocessing.connection import Pipe
+
+import odoo
+from odoo import SUPERUSER_ID, api
+
+_logger = logging.getLogger(__name__)
+
+SELECT_TIMEOUT = 1
+STOP_TIMEOUT = 10
+
+
+def _run_job(db_name, job_uuid):
+    # pylint: disable=odoo-addons-relative-import
+    from odoo.addons.queue_job.controllers.main import RunJobController
+
+    threading.current_thread().dbname = db_name
+    registry = odoo.registry(db_name).check_signaling()
+    with registry.manage_changes(), registry.cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        RunJobController()._runjob(env, job_uuid)
+
+
+def _set_cpu_time_limit(limit):
+    # like the HTTP workers, allow ``limit`` more seconds of CPU per job
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(
+        resource.RLIMIT_CPU, (int(usage.ru_utime + usage.ru_stime + limit), hard)
+    )
+
+
+def _memory_usage():
+    import psutil
+
+    return psutil.Process(os.getpid()).memory_info().rss
+
+
+class ForkedWorker(object):
+    def __init__(self, pool):
+        self.conn, child_conn = Pipe()
+        self.job = None
+        self.job_started = None
+        self.pid = os.fork()
+        if not self.pid:
+            self.conn.close()
+            self._serve(pool, child_conn)
+        child_conn.close()
+        _logger.info("forked queue job worker %s", self.pid)
+
+    def _serve(self, pool, conn):
+        # the pipes of the other workers must only be open in the runner
+        # for them to notice when it stops
+        for worker in pool._workers:
+            worker.conn.close()
+        os.close(pool._wakeup[0])
+        os.close(pool._wakeup[1])
+        # database connections inherited from the runner are not ours,
+        # forget them without closing them
+        odoo.sql_db._Pool = None
+        for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP, signal.SIGXCPU):
+            signal.signal(sig, signal.SIG_DFL)
+        exit_code = 0
+        jobs = 0
+        try:
+            while True:
+                try:
+                    db_name, job_uuid = conn.recv()
+                except EOFError:
+                    # the runner stopped
+                    break
+                if pool.cpu_time_limit:
+                    _set_cpu_time_limit(pool.cpu_time_limit)
+                try:
+                    pool.run_job(db_name, job_uuid)
+                except Exception:
+                    _logger.exception(
+                        "job %s failed in worker %s", job_uuid, os.getpid()
+                    )
+                jobs += 1
+                recycle = jobs >= pool.max_jobs or bool(
+                    pool.memory_limit and _memory_usage() > pool.memory_limit
+                )
+                conn.send((job_uuid, recycle))
+                if recycle:
+                    break
+        except Exception:
+            _logger.exception("queue job worker %s crashed", os.getpid())
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def send(self, db_name, job_uuid):
+        self.conn.send((db_name, job_uuid))
+        self.job = (db_name, job_uuid)
+        self.job_started = time.monotonic()
+
+    def kill(self):
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+class ForkedWorkerPool(object):
+    def __init__(
+        self,
+        size=1,
+        max_jobs=8192,
+        memory_limit=0,
+        time_limit=0,
+        cpu_time_limit=0,
+        reset_job=None,
+        run_job=_run_job,
+    ):
+        self.size = max(int(size), 1)
+        self.max_jobs = max_jobs
+        self.memory_limit = memory_limit
+        self.time_limit = time_limit
+        self.cpu_time_limit = cpu_time_limit
+        self.reset_job = reset_job
+        self.run_job = run_job
+        self._workers = []
+        self._exited = set()
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._wakeup = None
+        self._thread = None
+        self._stopping = False
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._wakeup = os.pipe()
+        self._thread = threading.Thread(
+            target=self._run, name="queue_job.worker_pool", daemon=True
+        )
+        self._thread.start()
+        _logger.info("running jobs in up to %d forked workers", self.size)
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping = True
+        os.write(self._wakeup[1], b".")
+        self._thread.join(STOP_TIMEOUT)
+        self._thread = None
+        # workers exit when their pipe is closed, after their current job
+        for worker in self._workers:
+            worker.conn.close()
+            self._exited.add(worker.pid)
+        self._workers = []
+        deadline = time.monotonic() + STOP_TIMEOUT
+        while self._exited and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for fd in self._wakeup:
+            os.close(fd)
+
+    def dispatch(self, db_name, job_uuid):
+        """Have a worker run a job, without waiting for it."""
+        with self._lock:
+            self._queue.append((db_name, job_uuid))
+        os.write(self._wakeup[1], b".")
+
+    def _run(self):
+        while not self._stopping:
+            self._assign_jobs()
+            with selectors.DefaultSelector() as sel:
+                sel.register(self._wakeup[0], selectors.EVENT_READ)
+                for worker in self._workers:
+                    sel.register(worker.conn, selectors.EVENT_READ, worker)
+                for key, _mask in sel.select(SELECT_TIMEOUT):
+                    if key.data is None:
+                        os.read(self._wakeup[0], 4096)
+                    else:
+                        self._receive(key.data)
+            self._check_time_limits()
+            self._reap()
+
+    def _assign_jobs(self):
+        while self._queue:
+            worker = next((w for w in self._workers if w.job is None), None)
+            if worker is None:
+                if len(self._workers) >= self.size:
+                    # every worker is busy, the channel capacities should
+                    # prevent that, but the runner may learn that a job is
+                    # done before its worker reports it
+                    return
+                worker = ForkedWorker(self)
+                self._workers.append(worker)
+            with self._lock:
+                db_name, job_uuid = self._queue.popleft()
+            _logger.debug("worker %s runs job %s", worker.pid, job_uuid)
+            try:
+                worker.send(db_name, job_uuid)
+            except OSError:
+                worker.job = (db_name, job_uuid)
+                self._worker_died(worker)
+
+    def _receive(self, worker):
+        try:
+            _job_uuid, recycle = worker.conn.recv()
+        except (EOFError, OSError):
+            self._worker_died(worker)
+            return
+        worker.job = None
+        if recycle:
+            _logger.info("recycling queue job worker %s", worker.pid)
+            self._remove(worker)
+
+    def _worker_died(self, worker):
+        self._remove(worker)
+        if worker.job:
+            db_name, job_uuid = worker.job
+            _logger.warning("worker %s died running job %s", worker.pid, job_uuid)
+            if self.reset_job is not None:
+                try:
+                    self.reset_job(db_name, job_uuid)
+                except Exception:
+                    _logger.exception("could not reset job %s to pending", job_uuid)
+
+    def _remove(self, worker):
+        self._workers.remove(worker)
+        worker.conn.close()
+        self._exited.add(worker.pid)
+
+    def _check_time_limits(self):
+        if not self.time_limit:
+            return
+        now = time.monotonic()
+        for worker in list(self._workers):
+            if worker.job and now - worker.job_started > self.time_limit:
+                _logger.error(
+                    "job %s exceeded the time limit of %ss, killing worker %s",
+                    worker.job[1],
+                    self.time_limit,
+                    worker.pid,
+                )
+                worker.kill()
+                self._worker_died(worker)
+
+    def _reap(self):
+        for pid in list(self._exited):
+            try:
+                reaped, _status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                reaped = pid
+            if reaped:
+                self._exited.discard(pid)
@@ -3,3 +3,4 @@ from . import ir_model_fields
 from . import queue_job
 from . import queue_job_channel
 from . import queue_job_function
+from . import queue_job_graph
@@ -26,6 +26,7 @@ class Base(models.AbstractModel):
         description=None,
         channel=None,
         identity_key=None,
+        batch_key=None,
     ):
         """Return a ``DelayableRecordset``
 
@@ -59,6 +60,7 @@ class Base(models.AbstractModel):
             description=description,
             channel=channel,
             identity_key=identity_key,
+            batch_key=batch_key,
         )
 
     def delayable(
@@ -69,6 +71,7 @@ class Base(models.AbstractModel):
         description=None,
         channel=None,
         identity_key=None,
+        batch_key=None,
     ):
         """Return a ``Delayable``
 
@@ -129,6 +132,12 @@ class Base(models.AbstractModel):
                              string, either a function that takes the job as
                              argument (see :py:func:`..job.identity_exact`).
                              the new job will not be added.
+        :param batch_key: key of the jobs which can be executed in one call:
+                          when the job runs, the pending jobs with the same
+                          model, method and batch key are executed with it,
+                          on the union of their recordsets. The size of the
+                          batches and the time the jobs wait to be batched
+                          are configured on the job function.
         :return: instance of a Delayable
         :rtype: :class:`odoo.addons.queue_job.job.Delayable`
         """
@@ -140,6 +149,7 @@ class Base(models.AbstractModel):
             description=description,
             channel=channel,
             identity_key=identity_key,
+            batch_key=batch_key,
         )
 
     def _patch_job_auto_delay(self, method_name, context_key=None):
@@ -3,6 +3,7 @@
 
 import logging
 import random
+import re
 from datetime import datetime, timedelta
 
 from odoo import _, api, exceptions, fields, models
@@ -11,12 +12,12 @@ from odoo.tools import config, html_escape
 
 from odoo.addons.base_sparse_field.models.fields import Serialized
 
-from ..delay import Graph
 from ..exception import JobError
 from ..fields import JobSerialized
 from ..job import (
     CANCELLED,
     DONE,
+    ENQUEUED,
     FAILED,
     PENDING,
     STARTED,
@@ -39,6 +40,10 @@ class QueueJob(models.Model):
     _order = "date_created DESC, date_done DESC"
 
     _removal_interval = 30  # days
+    # jobs deleted per transaction by the high volume autovacuum
+    _autovacuum_batch_size = 10000
+    # monthly partitions created in advance when queue_job is partitioned
+    _partition_months_ahead = 2
     _default_related_action = "related_action_open_record"
 
     # This must be passed in a context key "_job_edit_sentinel" to write on
@@ -58,6 +63,7 @@ class QueueJob(models.Model):
         "records",
         "args",
         "kwargs",
+        "batch_key",
     )
 
     uuid = fields.Char(string="UUID", readonly=True, index=True, required=True)
@@ -101,13 +107,13 @@ class QueueJob(models.Model):
     date_created = fields.Datetime(string="Created Date", readonly=True)
     date_started = fields.Datetime(string="Start Date", readonly=True)
     date_enqueued = fields.Datetime(string="Enqueue Time", readonly=True)
-    date_done = fields.Datetime(readonly=True)
+    date_done = fields.Datetime(readonly=True, index="btree_not_null")
     exec_time = fields.Float(
         string="Execution Time (avg)",
         group_operator="avg",
         help="Time required to execute this job in seconds. Average when grouped.",
     )
-    date_cancelled = fields.Datetime(readonly=True)
+    date_cancelled = fields.Datetime(readonly=True, index="btree_not_null")
 
     eta = fields.Datetime(string="Execute only after")
     retry = fields.Integer(string="Current try")
@@ -128,19 +134,60 @@ class QueueJob(models.Model):
     channel = fields.Char(index=True)
 
     identity_key = fields.Char(readonly=True)
+    batch_key = fields.Char(readonly=True)
     worker_pid = fields.Integer(readonly=True)
+    worker_hostname = fields.Char(readonly=True)
 
     def init(self):
-        self._cr.execute(
-            "SELECT indexname FROM pg_indexes WHERE indexname = %s ",
-            ("queue_job_identity_key_state_partial_index",),
+        self._create_job_indexes()
+
+    def _job_indexes(self):
+        """Return the indexes of queue_job created on top of the fields ones
+
+        They match the hot queries: the jobs not done loaded by the jobrunner
+        at startup are read from the index only, the autovacuum finds the
+        expired jobs of a channel by date. An index is created when no index
+        of the same name exists: change its name when changing it.
+        """
+        not_done = ", ".join(
+            "'%s'" % state
+            for state in (WAIT_DEPENDENCIES, PENDING, ENQUEUED, STARTED, FAILED)
         )
-        if not self._cr.fetchone():
-            self._cr.execute(
-                "CREATE INDEX queue_job_identity_key_state_partial_index "
+        return {
+            "queue_job_identity_key_state_partial_index": (
                 "ON queue_job (identity_key) WHERE state in ('pending', "
-                "'enqueued', 'wait_dependencies') AND identity_key IS NOT NULL;"
-            )
+                "'enqueued', 'wait_dependencies') AND identity_key IS NOT NULL"
+            ),
+            "queue_job_batch_key_pending_partial_index": (
+                "ON queue_job (batch_key) WHERE state = 'pending' "
+                "AND batch_key IS NOT NULL"
+            ),
+            # covers the columns selected by the jobrunner
+            "queue_job_not_done_covering_index": (
+                "ON queue_job (state) "
+                "INCLUDE (channel, uuid, id, date_created, priority, eta) "
+                "WHERE state IN (%s)" % not_done
+            ),
+            "queue_job_channel_date_done_index": (
+                "ON queue_job (channel, date_done) WHERE date_done IS NOT NULL"
+            ),
+            "queue_job_channel_date_cancelled_index": (
+                "ON queue_job (channel, date_cancelled) "
+                "WHERE date_cancelled IS NOT NULL"
+            ),
+        }
+
+    def _create_job_indexes(self):
+        self._cr.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = %s", ("queue_job",)
+        )
+        existing = {row[0] for row in self._cr.fetchall()}
+        for name, definition in self._job_indexes().items():
+            if name in existing:
+                continue
+            _logger.info("creating index %s of queue_job", name)
+            # pylint: disable=sql-injection
+            self._cr.execute("CREATE INDEX %s %s" % (name, definition))
 
     @api.depends("records")
     def _compute_record_ids(self):
@@ -149,59 +196,31 @@ class QueueJob(models.Model):
 
     @api.depends("dependencies")
     def _compute_dependency_graph(self):
-        jobs_groups = self.env["queue.job"].read_group(
-            [
-                (
-                    "graph_uuid",
-                    "in",
-                    [uuid for uuid in self.mapped("graph_uuid") if uuid],
-                )
-            ],
-            ["graph_uuid", "ids:array_agg(id)"],
-            ["graph_uuid"],
-        )
-        ids_per_graph_uuid = {
-            group["graph_uuid"]: group["ids"] for group in jobs_groups
-        }
+        graphs = self.env["queue.job.graph"]._get_graphs(self.mapped("graph_uuid"))
+        dependency_graphs = {}
         for record in self:
-            if not record.graph_uuid:
-                record.dependency_graph = {}
-                continue
-
-            graph_jobs = self.browse(ids_per_graph_uuid.get(record.graph_uuid) or [])
-            if not graph_jobs:
+            graph = graphs.get(record.graph_uuid)
+            if not graph:
                 record.dependency_graph = {}
                 continue
-
-            graph_ids = {graph_job.uuid: graph_job.id for graph_job in graph_jobs}
-            graph_jobs_by_ids = {graph_job.id: graph_job for graph_job in graph_jobs}
-
-            graph = Graph()
-            for graph_job in graph_jobs:
-                graph.add_vertex(graph_job.id)
-                for parent_uuid in graph_job.dependencies["depends_on"]:
-                    parent_id = graph_ids.get(parent_uuid)
-                    if not parent_id:
-                        continue
-                    graph.add_edge(parent_id, graph_job.id)
-                for child_uuid in graph_job.dependencies["reverse_depends_on"]:
-                    child_id = graph_ids.get(child_uuid)
-                    if not child_id:
-                        continue
-                    graph.add_edge(graph_job.id, child_id)
-
-            record.dependency_graph = {
-                # list of ids
-                "nodes": [
-                    graph_jobs_by_ids[graph_id]._dependency_graph_vis_node()
-                    for graph_id in graph.vertices()
-                ],
-                # list of tuples (from, to)
-                "edges": graph.edges(),
-            }
+            if graph not in dependency_graphs:
+                dependency_graphs[graph] = graph.sudo()._dependency_graph()
+            record.dependency_graph = dependency_graphs[graph]
 
     def _dependency_graph_vis_node(self):
         """Return the node as expected by the JobDirectedGraph widget"""
+        return self._dependency_graph_vis_node_values(
+            self.id, self._dependency_graph_vis_title(), self.state
+        )
+
+    def _dependency_graph_vis_title(self):
+        return "<strong>%s</strong><br/>%s" % (
+            html_escape(self.display_name),
+            html_escape(self.func_string),
+        )
+
+    @api.model
+    def _dependency_graph_vis_node_values(self, job_id, title, state):
         default = ("#D2E5FF", "#2B7CE9")
         colors = {
             DONE: ("#C2FABC", "#4AD63A"),
@@ -209,34 +228,18 @@ class QueueJob(models.Model):
             STARTED: ("#FFFF00", "#FFA500"),
         }
         return {
-            "id": self.id,
-            "title": "<strong>%s</strong><br/>%s"
-            % (
-                html_escape(self.display_name),
-                html_escape(self.func_string),
-            ),
-            "color": colors.get(self.state, default)[0],
-            "border": colors.get(self.state, default)[1],
+            "id": job_id,
+            "title": title,
+            "color": colors.get(state, default)[0],
+            "border": colors.get(state, default)[1],
             "shadow": True,
         }
 
     def _compute_graph_jobs_count(self):
-        jobs_groups = self.env["queue.job"].read_group(
-            [
-                (
-                    "graph_uuid",
-                    "in",
-                    [uuid for uuid in self.mapped("graph_uuid") if uuid],
-                )
-            ],
-            ["graph_uuid"],
-            ["graph_uuid"],
-        )
-        count_per_graph_uuid = {
-            group["graph_uuid"]: group["graph_uuid_count"] for group in jobs_groups
-        }
+        graphs = self.env["queue.job.graph"]._get_graphs(self.mapped("graph_uuid"))
         for record in self:
-            record.graph_jobs_count = count_per_graph_uuid.get(record.graph_uuid) or 0
+            graph = graphs.get(record.graph_uuid)
+            record.graph_jobs_count = graph.jobs_count if graph else 0
 
     @api.model_create_multi
     def create(self, vals_list):
@@ -391,12 +394,21 @@ class QueueJob(models.Model):
         """
         return [("state", "=", "failed")]
 
-    def autovacuum(self):
+    def autovacuum(self, high_volume=False):
         """Delete all jobs done based on the removal interval defined on the
            channel
 
-        Called from a cron.
+        Called from a cron. With ``high_volume``, the jobs are deleted in SQL
+        batches instead of through the ORM. When the ``queue_job`` table is
+        partitioned by month, the partitions of the coming months are created
+        and the partitions holding only expired jobs are dropped.
         """
+        if self._is_partitioned():
+            self._create_partitions()
+            self._drop_expired_partitions()
+        if high_volume:
+            self._autovacuum_high_volume()
+            return True
         for channel in self.env["queue.job.channel"].search([]):
             deadline = datetime.now() - timedelta(days=int(channel.removal_interval))
             while True:
@@ -417,6 +429,196 @@ class QueueJob(models.Model):
                     break
         return True
 
+    def _retention_deadlines(self):
+        """Return the current time and the most recent removal deadline
+
+        Jobs done or cancelled after the deadline of the channel with the
+        shortest removal interval are kept, whatever their channel.
+        """
+        self.env.cr.execute("SELECT min(removal_interval) FROM queue_job_channel")
+        min_interval = self.env.cr.fetchone()[0]
+        if min_interval is None:
+            return None, None
+        now = fields.Datetime.now()
+        return now, now - timedelta(days=min_interval)
+
+    def _autovacuum_high_volume(self):
+        """Delete the expired jobs in batches, with plain SQL
+
+        The removal interval of every channel is applied in one query, the
+        constant bound on the done and cancelled dates lets PostgreSQL use
+        their indexes. The ORM ``unlink`` is bypassed: the messages,
+        followers and activities of the deleted jobs are deleted in SQL too.
+        """
+        now, oldest_deadline = self._retention_deadlines()
+        if now is None:
+            return
+        self.env.flush_all()
+        while True:
+            self.env.cr.execute(
+                """
+                DELETE FROM queue_job
+                WHERE id IN (
+                    SELECT job.id
+                    FROM queue_job job
+                    JOIN queue_job_channel channel
+                    ON channel.complete_name = job.channel
+                    WHERE (
+                        job.date_done <= %(oldest)s
+                        OR job.date_cancelled <= %(oldest)s
+                    ) AND (
+                        job.date_done
+                        <= %(now)s - channel.removal_interval * interval '1 day'
+                        OR job.date_cancelled
+                        <= %(now)s - channel.removal_interval * interval '1 day'
+                    )
+                    LIMIT %(limit)s
+                )
+                RETURNING id
+                """,
+                {
+                    "now": now,
+                    "oldest": oldest_deadline,
+                    "limit": self._autovacuum_batch_size,
+                },
+            )
+            job_ids = [row[0] for row in self.env.cr.fetchall()]
+            if not job_ids:
+                break
+            self._delete_job_mail_data(job_ids)
+            _logger.info("autovacuum deleted %d jobs", len(job_ids))
+            if not config["test_enable"]:
+                self.env.cr.commit()  # pylint: disable=E8102
+        self.env.invalidate_all()
+
+    def _delete_job_mail_data(self, job_ids):
+        """Delete what ``mail.thread`` would delete with the jobs"""
+        for table, model_column in (
+            ("mail_message", "model"),
+            ("mail_followers", "res_model"),
+            ("mail_activity", "res_model"),
+        ):
+            # pylint: disable=sql-injection
+            self.env.cr.execute(
+                "DELETE FROM %s WHERE %s = 'queue.job' AND res_id = ANY(%%s)"
+                % (table, model_column),
+                (job_ids,),
+            )
+        self.env["ir.attachment"].search(
+            [("res_model", "=", self._name), ("res_id", "in", job_ids)]
+        ).unlink()
+
+    def _is_partitioned(self):
+        self.env.cr.execute(
+            "SELECT 1 FROM pg_class "
+            "WHERE relname = 'queue_job' AND relkind = 'p' "
+            "AND pg_table_is_visible(oid)"
+        )
+        return bool(self.env.cr.fetchone())
+
+    @staticmethod
+    def _add_months(date, months):
+        """Return the first day of the month ``months`` after ``date``"""
+        month = date.month - 1 + months
+        return datetime(date.year + month // 12, month % 12 + 1, 1)
+
+    def _partitions(self):
+        """Return the monthly partitions of queue_job by first day"""
+        self.env.cr.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = 'queue_job' "
+            "AND pg_table_is_visible(parent.oid)"
+        )
+        partitions = {}
+        for (name,) in self.env.cr.fetchall():
+            match = re.fullmatch(r"queue_job_p(\d{4})(\d{2})", name)
+            if match:
+                partitions[datetime(int(match[1]), int(match[2]), 1)] = name
+        return partitions
+
+    def _create_partitions(self):
+        existing = self._partitions()
+        now = fields.Datetime.now()
+        for months in range(self._partition_months_ahead + 1):
+            start = self._add_months(now, months)
+            if start in existing:
+                continue
+            # pylint: disable=sql-injection
+            self.env.cr.execute(
+                "CREATE TABLE IF NOT EXISTS queue_job_p%s PARTITION OF queue_job "
+                "FOR VALUES FROM (%%s) TO (%%s)" % start.strftime("%Y%m"),
+                (start, self._add_months(start, 1)),
+            )
+            _logger.info("created partition of queue_job for %s", start.date())
+
+    def _drop_expired_partitions(self):
+        """Drop the monthly partitions holding only expired jobs
+
+        A partition is dropped only when every job it holds would be deleted
+        by the autovacuum, so pending or failed jobs are never lost.
+        """
+        now, oldest_deadline = self._retention_deadlines()
+        if now is None:
+            return
+        for start, name in sorted(self._partitions().items()):
+            if self._add_months(start, 1) > oldest_deadline:
+                break
+            # pylint: disable=sql-injection
+            self.env.cr.execute(
+                """
+                SELECT 1
+                FROM %s job
+                LEFT JOIN queue_job_channel channel
+                ON channel.complete_name = job.channel
+                WHERE channel.id IS NULL OR (
+                    job.date_done
+                    <= %%(now)s - channel.removal_interval * interval '1 day'
+                    OR job.date_cancelled
+                    <= %%(now)s - channel.removal_interval * interval '1 day'
+                ) IS NOT TRUE
+                LIMIT 1
+                """
+                % name,
+                {"now": now},
+            )
+            if self.env.cr.fetchone():
+                continue
+            # the jobs with messages or attachments are few, look them up
+            # from the side of the mail tables
+            self.env.cr.execute(
+                """
+                (
+                    SELECT res_id FROM mail_message WHERE model = 'queue.job'
+                    UNION
+                    SELECT res_id FROM mail_followers WHERE res_model = 'queue.job'
+                    UNION
+                    SELECT res_id FROM mail_activity WHERE res_model = 'queue.job'
+                    UNION
+                    SELECT res_id FROM ir_attachment WHERE res_model = 'queue.job'
+                )
+                INTERSECT SELECT id FROM %s
+                """
+                % name
+            )
+            job_ids = [row[0] for row in self.env.cr.fetchall()]
+            if job_ids:
+                self._delete_job_mail_data(job_ids)
+            self.env.cr.execute(
+                "SELECT DISTINCT graph_uuid FROM %s WHERE graph_uuid IS NOT NULL"
+                % name
+            )
+            graph_uuids = [row[0] for row in self.env.cr.fetchall()]
+            self.env.cr.execute("DROP TABLE %s" % name)
+            if graph_uuids:
+                # dropping a table does not fire the triggers counting the jobs
+                self.env["queue.job.graph"]._recount_jobs(graph_uuids)
+            _logger.info("dropped partition %s of queue_job", name)
+            if not config["test_enable"]:
+                self.env.cr.commit()  # pylint: disable=E8102
+        self.env.invalidate_all()
+
     def requeue_stuck_jobs(self, enqueued_delta=1, started_delta=0):
         """Fix jobs that are in a bad states
 
@@ -24,6 +24,19 @@ class QueueJobChannel(models.Model):
     removal_interval = fields.Integer(
         default=lambda self: self.env["queue.job"]._removal_interval, required=True
     )
+    enqueued_timeout = fields.Integer(
+        string="Enqueued Timeout",
+        help="Seconds after which the jobrunner puts back to pending the jobs "
+        "of the channel still waiting for a worker. 0 to use the timeout of "
+        "the parent channel, no timeout when no channel has one.",
+    )
+    started_timeout = fields.Integer(
+        string="Started Timeout",
+        help="Seconds after which the jobrunner puts back to pending (or to "
+        "failed, after their last try) the jobs of the channel still running. "
+        "0 to use the timeout of the parent channel, no timeout when no "
+        "channel has one.",
+    )
 
     _sql_constraints = [
         ("name_uniq", "unique(complete_name)", "Channel complete name must be unique")
@@ -28,7 +28,10 @@ class QueueJobFunction(models.Model):
         "related_action_enable "
         "related_action_func_name "
         "related_action_kwargs "
-        "job_function_id ",
+        "job_function_id "
+        "batch_size "
+        "batch_window "
+        "batch_method ",
     )
 
     def _default_channel(self):
@@ -79,6 +82,24 @@ class QueueJobFunction(models.Model):
         "enable, func_name, kwargs.\n"
         "See the module description for details.",
     )
+    batch_size = fields.Integer(
+        default=100,
+        help="Maximum number of jobs with the same batch key executed in one "
+        "call. Jobs are delayed with a batch key by "
+        "``with_delay(batch_key=...)``. 1 disables the batching.",
+    )
+    batch_window = fields.Integer(
+        string="Batch Window (s)",
+        help="Seconds a job delayed with a batch key waits for other jobs to "
+        "be executed with.",
+    )
+    batch_method = fields.Char(
+        help="Method of the model called once for a batch of jobs, on the union "
+        "of their recordsets, with the list of their (recordset, args, kwargs). "
+        "It can return a list with one result per job. When empty, the jobs "
+        "with the same arguments are batched and the method of the job is "
+        "called on the union of their recordsets.",
+    )
 
     @api.depends("model_id.model", "method")
     def _compute_name(self):
@@ -149,6 +170,9 @@ class QueueJobFunction(models.Model):
             related_action_func_name=None,
             related_action_kwargs={},
             job_function_id=None,
+            batch_size=100,
+            batch_window=0,
+            batch_method=None,
         )
 
     def _parse_retry_pattern(self):
@@ -182,6 +206,9 @@ class QueueJobFunction(models.Model):
             related_action_func_name=config.related_action.get("func_name"),
             related_action_kwargs=config.related_action.get("kwargs", {}),
             job_function_id=config.id,
+            batch_size=config.batch_size,
+            batch_window=config.batch_window,
+            batch_method=config.batch_method or None,
         )
 
     def _retry_pattern_format_error_message(self):
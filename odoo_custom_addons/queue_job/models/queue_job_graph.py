@@ -0,0 +1,324 @@
+# Copyright 2026 Camptocamp SA
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+import logging
+from collections import defaultdict
+
+from odoo import _, api, fields, models
+
+from odoo.addons.base_sparse_field.models.fields import Serialized
+
+from ..delay import Graph
+from ..job import STATES
+
+_logger = logging.getLogger(__name__)
+
+# one counter column per state of the jobs, maintained by the trigger
+STATE_COUNT_COLUMNS = ["%s_count" % state for state, _label in STATES]
+
+
+class QueueJobGraph(models.Model):
+    """Metadata of a graph of jobs, one record per ``graph_uuid``
+
+    The counts of jobs are maintained by triggers on ``queue_job``, so they
+    follow the changes of state made by the ORM as well as the ones made in
+    SQL by the jobrunner and :meth:`~odoo.addons.queue_job.job.Job.enqueue_waiting`.
+    The structure of the graph (edges and levels of the jobs) never changes
+    once delayed: it is computed once, when the graph is stored.
+    """
+
+    _name = "queue.job.graph"
+    _description = "Queue Job Graph"
+    _log_access = False
+    _order = "id desc"
+    _rec_name = "graph_uuid"
+
+    graph_uuid = fields.Char(
+        string="Graph UUID", readonly=True, required=True, index=True
+    )
+    jobs_count = fields.Integer(string="Jobs", readonly=True)
+    edges_count = fields.Integer(string="Dependencies", readonly=True)
+    depth = fields.Integer(
+        readonly=True, help="Number of jobs on the longest chain of the graph."
+    )
+    wait_dependencies_count = fields.Integer(string="Wait Dependencies", readonly=True)
+    pending_count = fields.Integer(string="Pending", readonly=True)
+    enqueued_count = fields.Integer(string="Enqueued", readonly=True)
+    started_count = fields.Integer(string="Started", readonly=True)
+    done_count = fields.Integer(string="Done", readonly=True)
+    cancelled_count = fields.Integer(string="Cancelled", readonly=True)
+    failed_count = fields.Integer(string="Failed", readonly=True)
+    # {"edges": [[parent job id, child job id], ...],
+    #  "levels": {job id: distance from the root jobs},
+    #  "titles": {job id: title of the node of the job}}
+    structure = Serialized(readonly=True)
+
+    _sql_constraints = [
+        ("graph_uuid_uniq", "unique(graph_uuid)", "The graph UUID must be unique")
+    ]
+
+    def init(self):
+        # one statement changes the counts of a graph once, whatever the
+        # number of its jobs it touches: the deltas of the transition tables
+        # are summed by graph and applied in the order of the graphs
+        # pylint: disable=sql-injection
+        self._cr.execute(
+            """
+            CREATE OR REPLACE FUNCTION queue_job_graph_count()
+            RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    %s
+                ELSIF TG_OP = 'UPDATE' THEN
+                    %s
+                ELSE
+                    %s
+                    DELETE FROM queue_job_graph
+                    WHERE graph_uuid IN (SELECT graph_uuid FROM old_rows)
+                    AND jobs_count <= 0;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """
+            % (
+                self._count_deltas_query(
+                    "SELECT graph_uuid, state, 1 AS delta FROM new_rows"
+                ),
+                self._count_deltas_query(
+                    "SELECT graph_uuid, state, -1 AS delta FROM old_rows "
+                    "UNION ALL "
+                    "SELECT graph_uuid, state, 1 AS delta FROM new_rows"
+                ),
+                self._count_deltas_query(
+                    "SELECT graph_uuid, state, -1 AS delta FROM old_rows"
+                ),
+            )
+        )
+        self._cr.execute(
+            """
+            SELECT tgname, (tgtype & 1) = 1
+            FROM pg_trigger
+            WHERE tgrelid = 'queue_job'::regclass
+            AND tgname LIKE 'queue\\_job\\_graph\\_count\\_%'
+            """
+        )
+        triggers = dict(self._cr.fetchall())
+        if any(triggers.values()):
+            # the row triggers of the first version locked the record of a
+            # graph once per job
+            for name in triggers:
+                self._cr.execute("DROP TRIGGER %s ON queue_job" % name)
+        elif triggers:
+            return
+        self._cr.execute(
+            """
+            CREATE TRIGGER queue_job_graph_count_insert
+            AFTER INSERT ON queue_job
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE PROCEDURE queue_job_graph_count();
+            CREATE TRIGGER queue_job_graph_count_update
+            AFTER UPDATE ON queue_job
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE PROCEDURE queue_job_graph_count();
+            CREATE TRIGGER queue_job_graph_count_delete
+            AFTER DELETE ON queue_job
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE PROCEDURE queue_job_graph_count();
+            """
+        )
+        if triggers:
+            return
+        # graphs delayed before the triggers existed
+        self._cr.execute(
+            """
+            INSERT INTO queue_job_graph (graph_uuid, jobs_count, %s)
+            SELECT graph_uuid, count(*), %s
+            FROM queue_job
+            WHERE graph_uuid IS NOT NULL
+            GROUP BY graph_uuid
+            ON CONFLICT (graph_uuid) DO NOTHING
+            """
+            % (
+                ", ".join(STATE_COUNT_COLUMNS),
+                ", ".join(
+                    "count(*) FILTER (WHERE state = '%s')" % state
+                    for state, _label in STATES
+                ),
+            )
+        )
+        _logger.info("counted the jobs of %d graphs", self._cr.rowcount)
+
+    @api.model
+    def _count_deltas_query(self, deltas):
+        """Return the statement adding the deltas of jobs to their graphs
+
+        ``deltas`` selects ``graph_uuid``, ``state`` and ``delta`` rows, the
+        ones cancelling each other (an update keeping the state) are ignored.
+        """
+        return """
+            INSERT INTO queue_job_graph (graph_uuid, jobs_count, %s)
+            SELECT graph_uuid, sum(delta), %s
+            FROM (
+                SELECT graph_uuid, state, sum(delta) AS delta
+                FROM (%s) deltas
+                WHERE graph_uuid IS NOT NULL
+                GROUP BY graph_uuid, state
+                HAVING sum(delta) <> 0
+            ) net
+            GROUP BY graph_uuid
+            ORDER BY graph_uuid
+            ON CONFLICT (graph_uuid) DO UPDATE
+            SET jobs_count = coalesce(queue_job_graph.jobs_count, 0)
+                + EXCLUDED.jobs_count, %s;
+        """ % (
+            ", ".join(STATE_COUNT_COLUMNS),
+            ", ".join(
+                "coalesce(sum(delta) FILTER (WHERE state = '%s'), 0)" % state
+                for state, _label in STATES
+            ),
+            deltas,
+            ", ".join(
+                "{0} = coalesce(queue_job_graph.{0}, 0) + EXCLUDED.{0}".format(column)
+                for column in STATE_COUNT_COLUMNS
+            ),
+        )
+
+    @api.model
+    def _recount_jobs(self, graph_uuids):
+        """Count the jobs of graphs again, after jobs were removed in bulk"""
+        # pylint: disable=sql-injection
+        self._cr.execute(
+            """
+            UPDATE queue_job_graph graph
+            SET jobs_count = counts.jobs_count, %s
+            FROM (
+                SELECT graph_uuid, count(*) AS jobs_count, %s
+                FROM queue_job
+                WHERE graph_uuid IN %%s
+                GROUP BY graph_uuid
+            ) counts
+            WHERE graph.graph_uuid = counts.graph_uuid
+            """
+            % (
+                ", ".join(
+                    "{0} = counts.{0}".format(column) for column in STATE_COUNT_COLUMNS
+                ),
+                ", ".join(
+                    "count(*) FILTER (WHERE state = '%s') AS %s_count" % (state, state)
+                    for state, _label in STATES
+                ),
+            ),
+            (tuple(graph_uuids),),
+        )
+        self._cr.execute(
+            """
+            DELETE FROM queue_job_graph graph
+            WHERE graph_uuid IN %s
+            AND NOT EXISTS (
+                SELECT 1 FROM queue_job job WHERE job.graph_uuid = graph.graph_uuid
+            )
+            """,
+            (tuple(graph_uuids),),
+        )
+        self.invalidate_model()
+
+    @api.model
+    def _get_graphs(self, graph_uuids):
+        """Return the up to date graphs of the given uuids, by uuid"""
+        graph_uuids = [graph_uuid for graph_uuid in graph_uuids if graph_uuid]
+        if not graph_uuids:
+            return {}
+        # the counts are changed by the triggers when the jobs are flushed
+        self.env["queue.job"].flush_model(["state", "graph_uuid"])
+        self.invalidate_model(["jobs_count"] + STATE_COUNT_COLUMNS)
+        graphs = self.search([("graph_uuid", "in", graph_uuids)])
+        return {graph.graph_uuid: graph for graph in graphs}
+
+    def _update_structure(self):
+        """Compute the edges and the levels of the jobs of the graphs"""
+        jobs = self.env["queue.job"].search(
+            [("graph_uuid", "in", self.mapped("graph_uuid"))]
+        )
+        jobs_per_graph = defaultdict(list)
+        for job in jobs:
+            jobs_per_graph[job.graph_uuid].append(job)
+        for record in self:
+            graph_jobs = jobs_per_graph[record.graph_uuid]
+            ids = {graph_job.uuid: graph_job.id for graph_job in graph_jobs}
+            graph = Graph()
+            for graph_job in graph_jobs:
+                graph.add_vertex(graph_job.id)
+                dependencies = graph_job.dependencies or {}
+                for parent_uuid in dependencies.get("depends_on", []):
+                    parent_id = ids.get(parent_uuid)
+                    if parent_id:
+                        graph.add_edge(parent_id, graph_job.id)
+            edges = graph.edges()
+            parents = defaultdict(list)
+            for parent_id, child_id in edges:
+                parents[child_id].append(parent_id)
+            levels = {}
+            for job_id in graph.topological_sort():
+                levels[job_id] = max(
+                    (levels[parent_id] + 1 for parent_id in parents[job_id]),
+                    default=0,
+                )
+            record.write(
+                {
+                    "structure": {
+                        "edges": sorted(edges),
+                        "levels": {str(job_id): levels[job_id] for job_id in levels},
+                        "titles": {
+                            str(graph_job.id): graph_job._dependency_graph_vis_title()
+                            for graph_job in graph_jobs
+                        },
+                    },
+                    "edges_count": len(edges),
+                    "depth": max(levels.values()) + 1 if levels else 0,
+                }
+            )
+
+    def _dependency_graph(self):
+        """Return the graph as expected by the JobDirectedGraph widget"""
+        self.ensure_one()
+        if not self.structure or "titles" not in self.structure:
+            # delayed before its structure was stored
+            self._update_structure()
+        levels = self.structure["levels"]
+        titles = self.structure["titles"]
+        # only the states change once the graph is delayed
+        job_model = self.env["queue.job"]
+        job_model.flush_model(["state", "graph_uuid"])
+        self._cr.execute(
+            "SELECT id, state FROM queue_job WHERE graph_uuid = %s ORDER BY id",
+            (self.graph_uuid,),
+        )
+        nodes = []
+        for job_id, state in self._cr.fetchall():
+            node = job_model._dependency_graph_vis_node_values(
+                job_id, titles.get(str(job_id), ""), state
+            )
+            node["level"] = levels.get(str(job_id), 0)
+            nodes.append(node)
+        return {
+            # list of nodes
+            "nodes": nodes,
+            # list of tuples (from, to)
+            "edges": [tuple(edge) for edge in self.structure["edges"]],
+        }
+
+    def open_jobs(self):
+        """Return action that opens all jobs of the graph"""
+        self.ensure_one()
+        action = self.env["ir.actions.act_window"]._for_xml_id(
+            "queue_job.action_queue_job"
+        )
+        action.update(
+            {
+                "name": _("Jobs for graph %s") % (self.graph_uuid),
+                "context": {},
+                "domain": [("graph_uuid", "=", self.graph_uuid)],
+            }
+        )
+        return action
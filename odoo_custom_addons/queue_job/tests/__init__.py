@@ -1,8 +1,19 @@
 from . import test_runner_channels
 from . import test_runner_runner
+from . import test_runner_dispatcher
+from . import test_runner_worker_pool
+from . import test_runner_metrics
+from . import test_runner_fair_share
+from . import test_runner_channels_memory
+from . import test_runner_watchdog
 from . import test_delayable
+from . import test_delayable_store
 from . import test_json_field
+from . import test_job_batch
 from . import test_model_job_channel
 from . import test_model_job_function
+from . import test_model_job_graph
+from . import test_model_queue_job_autovacuum
+from . import test_model_queue_job_indexes
 from . import test_queue_job_protected_write
 from . import test_wizards
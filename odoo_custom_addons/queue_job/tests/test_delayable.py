@@ -269,3 +269,11 @@ class TestDelayable(unittest.TestCase):
         ]
 
         self.assertIn(list(graph.topological_sort()), valid_solutions)
+
+    def test_delay_graph_cycle(self):
+        node_a = Delayable(self.recordset)
+        node_b = Delayable(self.recordset)
+        node_a.on_done(node_b)
+        node_b.on_done(node_a)
+        with self.assertRaises(ValueError):
+            node_a.delay()
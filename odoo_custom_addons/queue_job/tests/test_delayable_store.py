@@ -0,0 +1,36 @@
+# Copyright 2026 Camptocamp SA
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+from odoo.tests import common
+
+# pylint: disable=odoo-addons-relative-import
+# we are testing, we want to test as we were an external consumer of the API
+from odoo.addons.queue_job.delay import chain, group
+from odoo.addons.queue_job.job import PENDING, WAIT_DEPENDENCIES
+
+
+class TestDelayableStore(common.TransactionCase):
+    def test_delay_graph_in_one_create(self):
+        partner = self.env["res.partner"].create({"name": "test"})
+        heads = [partner.delayable().write({"ref": str(i)}) for i in range(3)]
+        tail = partner.delayable().write({"ref": "done"})
+        chain(group(*heads), tail).delay()
+        jobs = [delayable._generated_job for delayable in heads + [tail]]
+        db_jobs = self.env["queue.job"].search(
+            [("uuid", "in", [job_.uuid for job_ in jobs])]
+        )
+        self.assertEqual(len(db_jobs), 4)
+        self.assertEqual(len(set(db_jobs.mapped("graph_uuid"))), 1)
+        by_uuid = {db_job.uuid: db_job for db_job in db_jobs}
+        tail_record = by_uuid[tail._generated_job.uuid]
+        self.assertEqual(tail_record.state, WAIT_DEPENDENCIES)
+        self.assertEqual(
+            sorted(tail_record.dependencies["depends_on"]),
+            sorted(job_.uuid for job_ in jobs[:3]),
+        )
+        for head in heads:
+            self.assertEqual(by_uuid[head._generated_job.uuid].state, PENDING)
+        # the jobs are created in the order they run
+        self.assertLess(
+            max(by_uuid[job_.uuid].id for job_ in jobs[:3]), tail_record.id
+        )
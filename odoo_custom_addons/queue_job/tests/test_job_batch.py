@@ -0,0 +1,103 @@
+# Copyright 2026 Camptocamp SA
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+from odoo.exceptions import MissingError
+from odoo.tests import common
+
+# pylint: disable=odoo-addons-relative-import
+# we are testing, we want to test as we were an external consumer of the API
+from odoo.addons.queue_job.job import DONE, STARTED, Job
+
+
+class TestJobBatch(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        self.partners = self.env["res.partner"].create(
+            [{"name": "test %d" % i} for i in range(3)]
+        )
+
+    def test_batch_same_args(self):
+        jobs = [
+            partner.with_delay(batch_key="test").write({"ref": "batched"})
+            for partner in self.partners
+        ]
+        other = self.partners[0].with_delay(batch_key="test").write({"ref": "other"})
+        leader = Job.load(self.env, jobs[0].uuid)
+        batch = leader.claim_batch()
+        self.assertEqual(
+            sorted(job_.uuid for job_ in batch), sorted(job_.uuid for job_ in jobs[1:])
+        )
+        self.assertTrue(all(job_.state == STARTED for job_ in batch))
+        leader.perform()
+        self.assertEqual(self.partners.mapped("ref"), ["batched"] * 3)
+        self.assertTrue(all(job_.result for job_ in batch))
+        self.assertEqual(other.db_record().state, "pending")
+
+    def test_batch_same_args_serialized_differently(self):
+        jobs = [
+            partner.with_delay(batch_key="test").write({"ref": "batched"})
+            for partner in self.partners[:2]
+        ]
+        self.env.flush_all()
+        # as written by the json codec and by the orjson codec
+        for job_, args in zip(jobs, ('[{"ref": "batched"}]', '[{"ref":"batched"}]')):
+            self.env.cr.execute(
+                "UPDATE queue_job SET args = %s WHERE uuid = %s", (args, job_.uuid)
+            )
+        leader = Job.load(self.env, jobs[0].uuid)
+        self.assertEqual([job_.uuid for job_ in leader.claim_batch()], [jobs[1].uuid])
+
+    def test_batch_size(self):
+        self.env["queue.job.function"].create(
+            {
+                "model_id": self.env.ref("base.model_res_partner").id,
+                "method": "write",
+                "batch_size": 2,
+            }
+        )
+        jobs = [
+            partner.with_delay(batch_key="test").write({"ref": "batched"})
+            for partner in self.partners
+        ]
+        leader = Job.load(self.env, jobs[0].uuid)
+        self.assertEqual([job_.uuid for job_ in leader.claim_batch()], [jobs[1].uuid])
+        leader.perform()
+        for job_ in [leader] + leader.batch:
+            job_.set_done()
+            job_.store()
+        self.assertEqual(jobs[1].db_record().state, DONE)
+        self.assertEqual(jobs[2].db_record().state, "pending")
+
+    def test_batch_failure_one_by_one(self):
+        jobs = [
+            partner.with_delay(batch_key="test").write({"ref": "batched"})
+            for partner in self.partners
+        ]
+        self.partners[2].unlink()
+        leader = Job.load(self.env, jobs[0].uuid)
+        batched = {job_.uuid: job_ for job_ in leader.claim_batch()}
+        leader.perform()
+        # the failure of the batched call is attributed to the failing job
+        self.assertEqual(self.partners[:2].mapped("ref"), ["batched"] * 2)
+        self.assertEqual(list(leader.batch_failures), [jobs[2].uuid])
+        exception, traceback_txt = leader.batch_failures[jobs[2].uuid]
+        self.assertIsInstance(exception, MissingError)
+        self.assertIn("MissingError", traceback_txt)
+        self.assertTrue(batched[jobs[1].uuid].result)
+        self.assertFalse(batched[jobs[2].uuid].result)
+        self.assertEqual(batched[jobs[1].uuid].retry, 1)
+        self.assertEqual(batched[jobs[2].uuid].retry, 1)
+
+    def test_batch_failure_leader(self):
+        jobs = [
+            partner.with_delay(batch_key="test").write({"ref": "batched"})
+            for partner in self.partners
+        ]
+        self.partners[0].unlink()
+        leader = Job.load(self.env, jobs[0].uuid)
+        leader.claim_batch()
+        # the batched jobs are not executed and run again later
+        with self.assertRaises(MissingError):
+            leader.perform()
+        self.assertFalse(leader.batch_failures)
+        self.assertTrue(all(job_.retry == 0 for job_ in leader.batch))
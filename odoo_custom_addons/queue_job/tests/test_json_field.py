@@ -1,7 +1,10 @@
 # copyright 2016 Camptocamp
 # license lgpl-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
 
+import dataclasses
+import enum
 import json
+import uuid
 from datetime import date, datetime
 
 from lxml import etree
@@ -10,7 +13,13 @@ from odoo.tests import common
 
 # pylint: disable=odoo-addons-relative-import
 # we are testing, we want to test as we were an external consumer of the API
-from odoo.addons.queue_job.fields import JobDecoder, JobEncoder
+from odoo.addons.queue_job.fields import (
+    JobCodec,
+    JobDecoder,
+    JobEncoder,
+    OrjsonJobCodec,
+    orjson,
+)
 
 
 class TestJson(common.TransactionCase):
@@ -152,3 +161,80 @@ class TestJson(common.TransactionCase):
         value = json.loads(value_json, cls=JobDecoder, env=self.env)
         value[2] = etree.tostring(value[2])
         self.assertEqual(value, expected)
+
+    def test_decoder_datetime_not_isoformat(self):
+        # written by other encoders
+        value_json = (
+            '[{"_type": "datetime_isoformat", "value": "19 April 2017 08:48"}]'
+        )
+        value = json.loads(value_json, cls=JobDecoder, env=self.env)
+        self.assertEqual(value, [datetime(2017, 4, 19, 8, 48)])
+
+    def _test_codec(self, codec):
+        partner = self.env.ref("base.main_partner")
+        value = {
+            "partner": partner,
+            "dates": [datetime(2017, 4, 19, 8, 48, 50, 1), date(2017, 4, 19)],
+            "big": 2**70,
+        }
+        value_json = codec.dumps(value)
+        # every codec reads what the others write
+        for other in (JobCodec(), codec):
+            self.assertEqual(other.loads(value_json, self.env), value)
+        self.assertEqual(
+            codec.loads(JobCodec().dumps(value), self.env),
+            value,
+        )
+
+    def test_codec_json(self):
+        self._test_codec(JobCodec())
+
+    def test_codec_orjson(self):
+        if orjson is None:
+            self.skipTest("orjson is not installed")
+        self._test_codec(OrjsonJobCodec())
+
+    def test_codecs_accept_same_values(self):
+        if orjson is None:
+            self.skipTest("orjson is not installed")
+
+        class Color(enum.Enum):
+            RED = 1
+
+        class Size(enum.IntEnum):
+            BIG = 2
+
+        @dataclasses.dataclass
+        class Point:
+            x: int
+
+        class Name(str):
+            pass
+
+        values = [
+            uuid.UUID(int=1),
+            Color.RED,
+            Size.BIG,
+            Point(1),
+            float("nan"),
+            {1: "key"},
+            Name("name"),
+            [{"nested": uuid.UUID(int=2)}],
+        ]
+        for value in values:
+            decoded = []
+            for codec in (JobCodec(), OrjsonJobCodec()):
+                try:
+                    decoded.append(repr(codec.loads(codec.dumps([value]), self.env)))
+                except TypeError:
+                    decoded.append(TypeError)
+            self.assertEqual(decoded[0], decoded[1], value)
+
+    def test_job_args_lazy(self):
+        job_ = self.env["res.partner"].with_delay().write({"ref": "lazy"})
+        db_job = job_.db_record()
+        loaded = job_.__class__.load(self.env, db_job.uuid)
+        self.assertIsNotNone(loaded._args_json)
+        self.assertEqual(loaded.args, ({"ref": "lazy"},))
+        self.assertEqual(loaded.kwargs, {})
+        self.assertIsNone(loaded._args_json)
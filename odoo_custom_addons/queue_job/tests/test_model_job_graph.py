@@ -0,0 +1,82 @@
+# Copyright 2026 Camptocamp SA
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+from odoo.tests import common
+
+# pylint: disable=odoo-addons-relative-import
+# we are testing, we want to test as we were an external consumer of the API
+from odoo.addons.queue_job.delay import chain, group
+from odoo.addons.queue_job.job import DONE, Job
+
+
+class TestJobGraph(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        partner = self.env["res.partner"].create({"name": "test"})
+        self.heads = [partner.delayable().write({"ref": str(i)}) for i in range(3)]
+        self.tail = partner.delayable().write({"ref": "done"})
+        chain(group(*self.heads), self.tail).delay()
+        self.graph_uuid = self.tail._generated_job.graph_uuid
+        self.jobs = self.env["queue.job"].search(
+            [("graph_uuid", "=", self.graph_uuid)]
+        )
+
+    def _graph(self):
+        return self.env["queue.job.graph"]._get_graphs([self.graph_uuid])[
+            self.graph_uuid
+        ]
+
+    def test_graph_delayed(self):
+        graph = self._graph()
+        self.assertEqual(graph.jobs_count, 4)
+        self.assertEqual(graph.pending_count, 3)
+        self.assertEqual(graph.wait_dependencies_count, 1)
+        self.assertEqual(graph.edges_count, 3)
+        self.assertEqual(graph.depth, 2)
+        tail_record = self.jobs.filtered(
+            lambda job: job.uuid == self.tail._generated_job.uuid
+        )
+        self.assertEqual(graph.structure["levels"][str(tail_record.id)], 1)
+        self.assertEqual(tail_record.graph_jobs_count, 4)
+        self.assertEqual(
+            graph.structure["titles"][str(tail_record.id)],
+            tail_record._dependency_graph_vis_title(),
+        )
+        dependency_graph = tail_record.dependency_graph
+        self.assertEqual(len(dependency_graph["nodes"]), 4)
+        tail_node = [
+            node for node in dependency_graph["nodes"] if node["id"] == tail_record.id
+        ][0]
+        self.assertEqual(
+            dict(tail_node, level=None),
+            dict(tail_record._dependency_graph_vis_node(), level=None),
+        )
+        self.assertEqual(tail_node["level"], 1)
+        self.assertEqual(
+            sorted(child for __, child in dependency_graph["edges"]),
+            [tail_record.id] * 3,
+        )
+
+    def test_counts_follow_sql_updates(self):
+        # the jobrunner and the workers change the states in SQL
+        head_uuids = tuple(head._generated_job.uuid for head in self.heads)
+        self.env.cr.execute(
+            "UPDATE queue_job SET priority = 5 WHERE graph_uuid = %s",
+            (self.graph_uuid,),
+        )
+        self.assertEqual(self._graph().pending_count, 3)
+        self.env.cr.execute(
+            "UPDATE queue_job SET state = %s WHERE uuid IN %s", (DONE, head_uuids)
+        )
+        Job.load(self.env, head_uuids[0]).enqueue_waiting()
+        graph = self._graph()
+        self.assertEqual(graph.jobs_count, 4)
+        self.assertEqual(graph.done_count, 3)
+        self.assertEqual(graph.pending_count, 1)
+        self.assertEqual(graph.wait_dependencies_count, 0)
+
+    def test_graph_removed_with_its_jobs(self):
+        self.jobs[:2].unlink()
+        self.assertEqual(self._graph().jobs_count, 2)
+        self.jobs[2:].unlink()
+        self.assertFalse(self.env["queue.job.graph"]._get_graphs([self.graph_uuid]))
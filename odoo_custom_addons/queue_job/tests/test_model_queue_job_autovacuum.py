@@ -0,0 +1,61 @@
+# Copyright 2026 Camptocamp SA
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+from datetime import datetime, timedelta
+
+from odoo import fields
+from odoo.tests import common
+
+
+class TestQueueJobAutovacuum(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        self.root_channel = self.env.ref("queue_job.channel_root")
+        self.root_channel.removal_interval = 30
+        self.short_channel = self.env["queue.job.channel"].create(
+            {"name": "short", "parent_id": self.root_channel.id, "removal_interval": 5}
+        )
+
+    def _job(self, channel, state, days_ago):
+        job_ = self.env["res.partner"].with_delay().create({"name": "test"})
+        db_job = job_.db_record()
+        date = fields.Datetime.now() - timedelta(days=days_ago)
+        self.env.flush_all()
+        self.env.cr.execute(
+            "UPDATE queue_job SET channel = %s, state = %s, "
+            "date_done = %s, date_cancelled = %s WHERE id = %s",
+            (
+                channel.complete_name,
+                state,
+                date if state == "done" else None,
+                date if state == "cancelled" else None,
+                db_job.id,
+            ),
+        )
+        return db_job
+
+    def test_autovacuum_high_volume(self):
+        expired = self._job(self.short_channel, "done", 10)
+        expired |= self._job(self.short_channel, "cancelled", 10)
+        expired |= self._job(self.root_channel, "done", 40)
+        kept = self._job(self.root_channel, "done", 10)
+        kept |= self._job(self.short_channel, "done", 1)
+        kept |= self._job(self.short_channel, "pending", 10)
+        expired[0].message_post(body="failed once")
+        self.env["queue.job"].autovacuum(high_volume=True)
+        self.assertFalse(expired.exists())
+        self.assertEqual(kept.exists(), kept)
+        self.assertFalse(
+            self.env["mail.message"].search(
+                [("model", "=", "queue.job"), ("res_id", "in", expired.ids)]
+            )
+        )
+
+    def test_add_months(self):
+        QueueJob = type(self.env["queue.job"])
+        self.assertEqual(
+            QueueJob._add_months(datetime(2026, 11, 17, 12), 2), datetime(2027, 1, 1)
+        )
+        self.assertEqual(
+            QueueJob._add_months(datetime(2026, 1, 31), 0), datetime(2026, 1, 1)
+        )
@@ -0,0 +1,66 @@
+# Copyright 2026 Camptocamp SA
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+from datetime import datetime
+
+from odoo.tests import common
+
+# pylint: disable=odoo-addons-relative-import
+# we are testing, we want to test as we were an external consumer of the API
+from odoo.addons.queue_job.jobrunner.channels import NOT_DONE
+from odoo.addons.queue_job.jobrunner.runner import SELECT_JOBS_QUERY
+
+
+class TestQueueJobIndexes(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        # the test table is small enough to be read entirely, plan the
+        # queries as on a large table
+        self._set_local("enable_seqscan", "off")
+
+    def _set_local(self, setting, value):
+        self.env.cr.execute("SET LOCAL %s = %s" % (setting, value))
+        self.addCleanup(self.env.cr.execute, "RESET %s" % setting)
+
+    def _plan_nodes(self, query, params):
+        self.env.cr.execute("EXPLAIN (FORMAT JSON) " + query, params)
+        nodes = [self.env.cr.fetchone()[0][0]["Plan"]]
+        for node in nodes:
+            nodes.extend(node.get("Plans", []))
+        return nodes
+
+    def test_indexes_created(self):
+        self.env.cr.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'queue_job'"
+        )
+        names = {row[0] for row in self.env.cr.fetchall()}
+        self.assertLessEqual(set(self.env["queue.job"]._job_indexes()), names)
+
+    def test_runner_startup_index_only(self):
+        self._set_local("enable_bitmapscan", "off")
+        nodes = self._plan_nodes(SELECT_JOBS_QUERY % ("state in %s",), (NOT_DONE,))
+        self.assertEqual(nodes[0]["Node Type"], "Index Only Scan")
+        self.assertEqual(nodes[0]["Index Name"], "queue_job_not_done_covering_index")
+
+    def test_runner_notification(self):
+        nodes = self._plan_nodes(
+            SELECT_JOBS_QUERY % ("uuid = ANY(%s)",), (["uuid-1", "uuid-2"],)
+        )
+        self.assertNotIn("Seq Scan", [node["Node Type"] for node in nodes])
+
+    def test_autovacuum(self):
+        deadline = datetime(2026, 1, 1)
+        query = self.env["queue.job"]._search(
+            [
+                "|",
+                ("date_done", "<=", deadline),
+                ("date_cancelled", "<=", deadline),
+                ("channel", "=", "root"),
+            ],
+            limit=1000,
+        )
+        nodes = self._plan_nodes(*query.select())
+        self.assertNotIn("Seq Scan", [node["Node Type"] for node in nodes])
+        index_names = {node.get("Index Name") for node in nodes}
+        self.assertIn("queue_job_channel_date_done_index", index_names)
+        self.assertIn("queue_job_channel_date_cancelled_index", index_names)
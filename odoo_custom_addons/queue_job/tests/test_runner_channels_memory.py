@@ -0,0 +1,68 @@
+# Copyright 2026 Camptocamp SA
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+import gc
+import logging
+import tracemalloc
+import unittest
+import uuid
+from datetime import datetime, timedelta
+
+# pylint: disable=odoo-addons-relative-import
+# we are testing, we want to test as we were an external consumer of the API
+from odoo.addons.queue_job.jobrunner.channels import DONE, PENDING, ChannelManager
+
+_logger = logging.getLogger(__name__)
+
+JOBS = 20000
+
+
+class TestChannelsMemory(unittest.TestCase):
+    """Memory used by the channel manager for each job of the backlog"""
+
+    def setUp(self):
+        super().setUp()
+        date_created = datetime(2026, 1, 1)
+        # the rows read from the database, allocated before the measures
+        self.rows = [
+            (
+                "root.tenant%d" % (i % 2),
+                str(uuid.uuid4()),
+                i,
+                date_created + timedelta(seconds=i),
+                10,
+                None,
+            )
+            for i in range(JOBS)
+        ]
+        self.channel_manager = ChannelManager()
+        self.channel_manager.simple_configure("root:4,root.tenant1:2")
+
+    def _traced_memory(self):
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0]
+
+    def test_bytes_per_queued_job(self):
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        before = self._traced_memory()
+        for row in self.rows:
+            self.channel_manager.notify("db", *row, PENDING)
+        per_job = (self._traced_memory() - before) / JOBS
+        _logger.info("channel manager: %d bytes per queued job", per_job)
+        # about 340 bytes without __slots__
+        self.assertLess(per_job, 310)
+
+    def test_done_jobs_released(self):
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        before = self._traced_memory()
+        for row in self.rows:
+            self.channel_manager.notify("db", *row, PENDING)
+        queued = self._traced_memory()
+        for row in self.rows[: JOBS * 9 // 10]:
+            self.channel_manager.notify("db", *row, DONE)
+        per_job = (self._traced_memory() - before) / (JOBS // 10)
+        _logger.info("channel manager: %d bytes per job left in the queue", per_job)
+        # the heaps were compacted, the done jobs are not kept alive
+        self.assertLess(self._traced_memory() - before, (queued - before) / 2)
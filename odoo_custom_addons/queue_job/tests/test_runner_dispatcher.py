@@ -0,0 +1,116 @@
+# Copyright 2026 Camptocamp SA
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+import socket
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# pylint: disable=odoo-addons-relative-import
+# we are testing, we want to test as we were an external consumer of the API
+from odoo.addons.queue_job.jobrunner import dispatcher
+from odoo.addons.queue_job.jobrunner.dispatcher import HttpDispatcher
+
+from .common import load_doctests
+
+load_tests = load_doctests(dispatcher)
+
+
+class FakeOdoo(ThreadingHTTPServer):
+    """Answers /queue_job/runjob after ``delay`` seconds with ``status``."""
+
+    daemon_threads = True
+
+    def __init__(self, status=200, delay=0):
+        self.status = status
+        self.delay = delay
+        self.jobs = []
+        self.connections = 0
+        super().__init__(("127.0.0.1", 0), FakeOdooHandler)
+
+    def get_request(self):
+        self.connections += 1
+        return super().get_request()
+
+
+class FakeOdooHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        self.server.jobs.append(query["job_uuid"][0])
+        time.sleep(self.server.delay)
+        self.send_response(self.server.status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+class TestHttpDispatcher(unittest.TestCase):
+    def _start_odoo(self, **kwargs):
+        odoo = FakeOdoo(**kwargs)
+        thread = threading.Thread(target=odoo.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(odoo.server_close)
+        self.addCleanup(odoo.shutdown)
+        return odoo
+
+    def _start_dispatcher(self, port, **kwargs):
+        self.reset = []
+        kwargs.setdefault("concurrency", 2)
+        dispatcher = HttpDispatcher(
+            host="127.0.0.1",
+            port=port,
+            reset_job=lambda db_name, uuid: self.reset.append(uuid),
+            **kwargs
+        )
+        dispatcher.start()
+        self.addCleanup(dispatcher.stop)
+        return dispatcher
+
+    def _wait(self, predicate, timeout=10):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            self.assertLess(time.monotonic(), deadline, "timed out")
+            time.sleep(0.01)
+
+    def test_keep_alive(self):
+        odoo = self._start_odoo(delay=0.05)
+        dispatcher = self._start_dispatcher(odoo.server_port)
+        uuids = ["job-%d" % i for i in range(10)]
+        for uuid in uuids:
+            dispatcher.dispatch("db", uuid)
+        self._wait(lambda: len(odoo.jobs) == len(uuids) and not dispatcher._tasks)
+        self.assertEqual(sorted(odoo.jobs), sorted(uuids))
+        # the concurrency bounds the number of connections, reused after
+        # every answer
+        self.assertEqual(odoo.connections, 2)
+        self.assertEqual(self.reset, [])
+
+    def test_connection_refused(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        dispatcher = self._start_dispatcher(port)
+        dispatcher.dispatch("db", "job-refused")
+        self._wait(lambda: self.reset)
+        self.assertEqual(self.reset, ["job-refused"])
+
+    def test_http_error(self):
+        odoo = self._start_odoo(status=500)
+        dispatcher = self._start_dispatcher(odoo.server_port)
+        dispatcher.dispatch("db", "job-error")
+        self._wait(lambda: self.reset)
+        self.assertEqual(self.reset, ["job-error"])
+
+    def test_response_timeout(self):
+        odoo = self._start_odoo(delay=1)
+        dispatcher = self._start_dispatcher(odoo.server_port, response_timeout=0.1)
+        dispatcher.dispatch("db", "job-slow")
+        self._wait(lambda: odoo.jobs and not dispatcher._tasks)
+        # the job was delivered to Odoo: it must not go back to pending
+        self.assertEqual(self.reset, [])
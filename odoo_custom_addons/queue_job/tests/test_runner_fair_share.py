@@ -0,0 +1,147 @@
+# Copyright 2026 Camptocamp SA
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+import collections
+import heapq
+import unittest
+
+# pylint: disable=odoo-addons-relative-import
+# we are testing, we want to test as we were an external consumer of the API
+from odoo.addons.queue_job.jobrunner.channels import DONE, PENDING, ChannelManager
+
+# jobs created during a traversal of a nostr repository on db1, while
+# mails are sent on db1 and another tenant, db2, publishes a few events
+# seconds, database, channel, priority, duration, jobs
+FLOOD_TRACE = """
+0, db1, root.nostr, 10, 2, 400
+2, db1, root.mail, 10, 1, 1
+5, db2, root.nostr, 10, 3, 1
+7, db1, root.mail, 10, 1, 1
+16, db1, root.mail, 10, 1, 1
+20, db1, root.mail, 10, 2, 1
+24, db1, root.mail, 10, 1, 1
+24, db2, root.nostr, 10, 1, 2
+32, db1, root.mail, 10, 1, 1
+37, db2, root.nostr, 10, 2, 2
+40, db1, root.mail, 10, 1, 1
+44, db1, root.mail, 10, 1, 1
+51, db1, root.mail, 10, 1, 1
+55, db1, root.mail, 10, 1, 1
+55, db2, root.nostr, 10, 2, 1
+59, db1, root.mail, 10, 2, 1
+66, db1, root.mail, 10, 1, 1
+72, db2, root.nostr, 10, 3, 1
+74, db1, root.mail, 10, 1, 1
+79, db1, root.mail, 10, 2, 1
+87, db2, root.nostr, 10, 2, 1
+88, db1, root.mail, 10, 2, 1
+92, db1, root.mail, 10, 2, 1
+99, db2, root.nostr, 10, 3, 1
+100, db1, root.mail, 10, 1, 1
+104, db1, root.mail, 10, 1, 1
+108, db1, root.mail, 10, 2, 1
+110, db2, root.nostr, 10, 3, 1
+113, db1, root.mail, 10, 1, 1
+120, db1, root.mail, 10, 1, 1
+128, db1, root.mail, 10, 1, 1
+128, db2, root.nostr, 10, 2, 1
+136, db1, root.mail, 10, 1, 1
+144, db1, root.mail, 10, 2, 1
+145, db2, root.nostr, 10, 2, 2
+149, db1, root.mail, 10, 1, 1
+156, db2, root.nostr, 10, 1, 2
+157, db1, root.mail, 10, 2, 1
+166, db1, root.mail, 10, 1, 1
+172, db1, root.mail, 10, 1, 1
+172, db2, root.nostr, 10, 1, 1
+"""
+
+
+def _parse_trace(trace):
+    arrivals = []
+    for line in trace.strip().splitlines():
+        time, db_name, channel, priority, duration, count = line.split(", ")
+        arrivals.append(
+            (int(time), db_name, channel, int(priority), int(duration), int(count))
+        )
+    return arrivals
+
+
+class TestFairShare(unittest.TestCase):
+    def _replay(self, channels, arrivals, db_weights=None):
+        """Run the jobs of the arrivals like the runner would
+
+        Return the times the jobs waited before running, by database and
+        channel.
+        """
+        channel_manager = ChannelManager()
+        channel_manager.simple_configure(channels)
+        if db_weights:
+            channel_manager.configure_db_weights(db_weights)
+        incoming = collections.deque()
+        for time, db_name, channel, priority, duration, count in sorted(arrivals):
+            for _i in range(count):
+                seq = len(incoming)
+                incoming.append((time, db_name, channel, seq, priority, duration))
+        jobs = {"job%d" % job[3]: job for job in incoming}
+        running = []
+        waits = collections.defaultdict(list)
+        now = 0
+        while True:
+            while incoming and incoming[0][0] <= now:
+                time, db_name, channel, seq, priority, _duration = incoming.popleft()
+                channel_manager.notify(
+                    db_name, channel, "job%d" % seq, seq, time, priority, None, PENDING
+                )
+            while running and running[0][0] <= now:
+                _end, uuid = heapq.heappop(running)
+                time, db_name, channel, seq, priority, _duration = jobs[uuid]
+                channel_manager.notify(
+                    db_name, channel, uuid, seq, time, priority, None, DONE
+                )
+            for job in channel_manager.get_jobs_to_run(now):
+                time, db_name, channel, _seq, _priority, duration = jobs[job.uuid]
+                waits[db_name, channel].append(now - time)
+                heapq.heappush(running, (now + duration, job.uuid))
+            next_times = [incoming[0][0]] if incoming else []
+            if running:
+                next_times.append(running[0][0])
+            if not next_times:
+                break
+            now = min(next_times)
+        self.assertEqual(sum(len(w) for w in waits.values()), len(jobs))
+        return waits
+
+    def test_flood_starves_other_channels(self):
+        waits = self._replay("root:4,root.nostr:4", _parse_trace(FLOOD_TRACE))
+        # nothing else runs until the end of the flood
+        self.assertGreater(max(waits["db1", "root.mail"]), 150)
+        self.assertGreater(max(waits["db2", "root.nostr"]), 150)
+
+    def test_fair_share_bounds_tail_wait(self):
+        waits = self._replay(
+            "root:4:fair,root.nostr:4:fair", _parse_trace(FLOOD_TRACE)
+        )
+        self.assertLessEqual(max(waits["db1", "root.mail"]), 2)
+        self.assertLessEqual(max(waits["db2", "root.nostr"]), 4)
+        # the flood still uses the capacity left by the other jobs
+        self.assertLessEqual(max(waits["db1", "root.nostr"]), 220)
+
+    def test_db_weights(self):
+        arrivals = [
+            (0, "db1", "root", 10, 1, 100),
+            (0, "db2", "root", 10, 1, 100),
+        ]
+        waits = self._replay("root:4:fair", arrivals, db_weights="db2:3")
+        # db2 gets 3 slots out of 4 while it has jobs
+        self.assertEqual(max(waits["db2", "root"]), 33)
+        self.assertEqual(len([w for w in waits["db1", "root"] if w < 33]), 33)
+
+    def test_aging(self):
+        # more jobs than the capacity, with a few less important ones
+        arrivals = [(time, "db1", "root", 5, 1, 3) for time in range(120)]
+        arrivals.append((1, "db1", "root.low", 20, 1, 2))
+        waits = self._replay("root:2", arrivals)
+        self.assertGreater(min(waits["db1", "root.low"]), 150)
+        waits = self._replay("root:2:aging=2", arrivals)
+        self.assertLess(max(waits["db1", "root.low"]), 60)
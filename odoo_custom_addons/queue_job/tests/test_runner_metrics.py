@@ -0,0 +1,84 @@
+# Copyright 2026 Camptocamp SA
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+import unittest
+import urllib.error
+import urllib.request
+
+# pylint: disable=odoo-addons-relative-import
+# we are testing, we want to test as we were an external consumer of the API
+from odoo.addons.queue_job.jobrunner import metrics
+from odoo.addons.queue_job.jobrunner.channels import (
+    DONE,
+    FAILED,
+    PENDING,
+    STARTED,
+    ChannelManager,
+)
+from odoo.addons.queue_job.jobrunner.metrics import RunnerMetrics
+
+from .common import load_doctests
+
+load_tests = load_doctests(metrics)
+
+
+class TestRunnerMetrics(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.channel_manager = ChannelManager()
+        self.channel_manager.simple_configure("root:4,root.sub:2")
+        self.metrics = RunnerMetrics()
+
+    def _run(self, uuids, channel="root.sub"):
+        for seq, uuid in enumerate(uuids):
+            self.channel_manager.notify("db", channel, uuid, seq, 0, 10, None, PENDING)
+        for job in self.channel_manager.get_jobs_to_run(now=100):
+            self.metrics.job_dispatched(job.channel.fullname, job.uuid)
+        self.metrics.update_channels(self.channel_manager, now=100)
+
+    def test_channels(self):
+        self._run(["a", "b", "c"])
+        text = self.metrics.render()
+        self.assertIn('queue_job_channel_running{channel="root.sub"} 2', text)
+        self.assertIn('queue_job_channel_pending{channel="root.sub"} 1', text)
+        self.assertIn('queue_job_channel_capacity{channel="root"} 4', text)
+        self.assertIn('queue_job_channel_paused{channel="root"} 0', text)
+        self.assertIn('queue_job_dispatched_total{channel="root.sub"} 2', text)
+
+    def test_job_lifecycle(self):
+        self._run(["a", "b"])
+        self.metrics.job_notified("a", STARTED)
+        self.metrics.job_notified("a", DONE)
+        self.metrics.job_notified("b", FAILED)
+        # not dispatched by the runner
+        self.metrics.job_notified("c", DONE)
+        text = self.metrics.render()
+        self.assertIn('queue_job_done_total{channel="root.sub"} 1', text)
+        self.assertIn('queue_job_failed_total{channel="root.sub"} 1', text)
+        self.assertIn(
+            'queue_job_start_latency_seconds_bucket{channel="root.sub",le="+Inf"} 1',
+            text,
+        )
+        self.assertIn('queue_job_exec_time_seconds_count{channel="root.sub"} 1', text)
+        self.assertIn(
+            'queue_job_exec_time_seconds{channel="root.sub",quantile="0.99"}', text
+        )
+        self.assertFalse(self.metrics._dispatched_at or self.metrics._started_at)
+
+    def test_requeued_job_forgotten(self):
+        self._run(["a"])
+        self.metrics.job_notified("a", PENDING)
+        self.metrics.job_notified("a", DONE)
+        self.assertNotIn("queue_job_done_total{", self.metrics.render())
+
+    def test_scrape(self):
+        self._run(["a"])
+        self.metrics.start("127.0.0.1", 0)
+        self.addCleanup(self.metrics.stop)
+        url = "http://127.0.0.1:%d" % self.metrics._server.server_port
+        with urllib.request.urlopen(url + "/metrics") as response:
+            self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+            body = response.read().decode()
+        self.assertIn('queue_job_dispatched_total{channel="root.sub"} 1', body)
+        with self.assertRaises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + "/")
@@ -1,6 +1,9 @@
 # Copyright 2015-2016 Camptocamp SA
 # License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
 
+import unittest
+from unittest import mock
+
 # pylint: disable=odoo-addons-relative-import
 # we are testing, we want to test as we were an external consumer of the API
 from odoo.addons.queue_job.jobrunner import runner
@@ -8,3 +11,24 @@ from odoo.addons.queue_job.jobrunner import runner
 from .common import load_doctests
 
 load_tests = load_doctests(runner)
+
+
+class TestRunJobs(unittest.TestCase):
+    def test_dispatch_enqueued_jobs_only(self):
+        jobs = [mock.Mock(db_name="db", uuid=uuid) for uuid in ("a", "b", "c")]
+        queue_runner = runner.QueueJobRunner.__new__(runner.QueueJobRunner)
+        queue_runner._stop = False
+        queue_runner.metrics = None
+        queue_runner.channel_manager = mock.Mock()
+        queue_runner.channel_manager.get_jobs_to_run.return_value = jobs
+        queue_runner.dispatcher = mock.Mock()
+        database = mock.Mock()
+        # "b" was started in the batch of another job meanwhile
+        database.set_jobs_enqueued.return_value = {"a", "c"}
+        queue_runner.db_by_name = {"db": database}
+        queue_runner.run_jobs()
+        database.set_jobs_enqueued.assert_called_once_with(["a", "b", "c"])
+        self.assertEqual(
+            queue_runner.dispatcher.dispatch.call_args_list,
+            [mock.call("db", "a"), mock.call("db", "c")],
+        )
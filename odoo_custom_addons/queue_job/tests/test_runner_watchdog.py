@@ -0,0 +1,95 @@
+# Copyright 2026 Camptocamp SA
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+import os
+import subprocess
+
+from odoo.tests import common
+
+# pylint: disable=odoo-addons-relative-import
+# we are testing, we want to test as we were an external consumer of the API
+from odoo.addons.queue_job.job import ENQUEUED, FAILED, PENDING, STARTED
+from odoo.addons.queue_job.jobrunner.runner import _requeue_stuck_jobs
+
+
+class TestRunnerWatchdog(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        root = self.env.ref("queue_job.channel_root")
+        self.env["queue.job.channel"].create(
+            {
+                "name": "watchdog",
+                "parent_id": root.id,
+                "enqueued_timeout": 30,
+                "started_timeout": 60,
+            }
+        )
+        self.partner = self.env["res.partner"].create({"name": "test"})
+
+    def _job(self, state, seconds_ago, channel="root", **values):
+        job_ = self.partner.with_delay(channel=channel).write({"ref": "watchdog"})
+        values = dict(values, state=state)
+        date_field = "date_enqueued" if state == ENQUEUED else "date_started"
+        self.env.cr.execute(
+            "UPDATE queue_job SET %s = now() at time zone 'utc' - %%s "
+            "* interval '1 second', %s WHERE uuid = %%s"
+            % (date_field, ", ".join("%s = %%s" % field for field in values)),
+            (seconds_ago, *values.values(), job_.uuid),
+        )
+        return job_.uuid
+
+    def _states(self, uuids):
+        self.env.cr.execute(
+            "SELECT uuid, state, retry FROM queue_job WHERE uuid IN %s",
+            (tuple(uuids),),
+        )
+        return {uuid: (state, retry) for uuid, state, retry in self.env.cr.fetchall()}
+
+    def test_channel_timeouts(self):
+        # the subchannel without a record uses the timeouts of its parent
+        channel = "root.watchdog.sub"
+        enqueued_stuck = self._job(ENQUEUED, 40, channel=channel)
+        enqueued = self._job(ENQUEUED, 10, channel=channel)
+        started_stuck = self._job(STARTED, 70, channel=channel)
+        started = self._job(STARTED, 40, channel=channel)
+        # no timeout on root
+        started_root = self._job(STARTED, 3600)
+        requeued = _requeue_stuck_jobs(self.env.cr, "host", [])
+        self.assertEqual(
+            {uuid for uuid, _state, _reason in requeued},
+            {enqueued_stuck, started_stuck},
+        )
+        states = self._states(
+            [enqueued_stuck, enqueued, started_stuck, started, started_root]
+        )
+        self.assertEqual(states[enqueued_stuck], (PENDING, 0))
+        self.assertEqual(states[enqueued], (ENQUEUED, 0))
+        # the interrupted run used a try
+        self.assertEqual(states[started_stuck], (PENDING, 1))
+        self.assertEqual(states[started], (STARTED, 0))
+        self.assertEqual(states[started_root], (STARTED, 0))
+
+    def test_dead_worker(self):
+        process = subprocess.Popen(["true"])
+        process.wait()
+        dead = self._job(STARTED, 1, worker_hostname="host", worker_pid=process.pid)
+        last_try = self._job(
+            STARTED,
+            1,
+            worker_hostname="host",
+            worker_pid=process.pid,
+            retry=2,
+            max_retries=3,
+        )
+        alive = self._job(STARTED, 1, worker_hostname="host", worker_pid=os.getpid())
+        other_host = self._job(
+            STARTED, 1, worker_hostname="other", worker_pid=process.pid
+        )
+        _requeue_stuck_jobs(self.env.cr, "host", [process.pid])
+        states = self._states([dead, last_try, alive, other_host])
+        self.assertEqual(states[dead], (PENDING, 1))
+        self.assertEqual(states[last_try], (FAILED, 3))
+        self.assertEqual(states[alive], (STARTED, 0))
+        self.assertEqual(states[other_host], (STARTED, 0))
+        job = self.env["queue.job"].search([("uuid", "=", last_try)])
+        self.assertEqual(job.exc_message, "worker process died")
@@ -0,0 +1,78 @@
+# Copyright 2026 Camptocamp SA
+# License LGPL-3.0 or later (http://www.gnu.org/licenses/lgpl.html)
+
+import os
+import tempfile
+import time
+import unittest
+
+# pylint: disable=odoo-addons-relative-import
+# we are testing, we want to test as we were an external consumer of the API
+from odoo.addons.queue_job.jobrunner.worker_pool import ForkedWorkerPool
+
+
+class TestForkedWorkerPool(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        handle, self.log_path = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.unlink, self.log_path)
+        self.reset = []
+
+    def _run_job(self, db_name, job_uuid):
+        # runs in the forked worker
+        if job_uuid == "crash":
+            os._exit(1)
+        if job_uuid == "slow":
+            time.sleep(30)
+        with open(self.log_path, "a") as log:
+            log.write("%s %s\n" % (os.getpid(), job_uuid))
+
+    def _start_pool(self, **kwargs):
+        pool = ForkedWorkerPool(
+            reset_job=lambda db_name, uuid: self.reset.append(uuid),
+            run_job=self._run_job,
+            **kwargs
+        )
+        pool.start()
+        self.addCleanup(pool.stop)
+        return pool
+
+    def _done_jobs(self):
+        with open(self.log_path) as log:
+            return [line.split() for line in log]
+
+    def _wait(self, predicate, timeout=10):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            self.assertLess(time.monotonic(), deadline, "timed out")
+            time.sleep(0.01)
+
+    def test_run_and_recycle(self):
+        pool = self._start_pool(size=2, max_jobs=2)
+        uuids = ["job-%d" % i for i in range(6)]
+        for uuid in uuids:
+            pool.dispatch("db", uuid)
+        self._wait(lambda: len(self._done_jobs()) == len(uuids))
+        done = self._done_jobs()
+        self.assertEqual(sorted(uuid for _pid, uuid in done), uuids)
+        # no worker ran more than max_jobs jobs
+        pids = [pid for pid, _uuid in done]
+        self.assertTrue(all(pids.count(pid) <= 2 for pid in pids))
+        self.assertLessEqual(len(pool._workers), 2)
+        self.assertEqual(self.reset, [])
+
+    def test_worker_crash(self):
+        pool = self._start_pool(size=1)
+        pool.dispatch("db", "crash")
+        pool.dispatch("db", "job-after-crash")
+        self._wait(lambda: self._done_jobs())
+        self.assertEqual(self.reset, ["crash"])
+        self.assertEqual(self._done_jobs()[0][1], "job-after-crash")
+
+    def test_time_limit(self):
+        pool = self._start_pool(size=1, time_limit=0.5)
+        pool.dispatch("db", "slow")
+        pool.dispatch("db", "job-after-slow")
+        self._wait(lambda: self._done_jobs())
+        self.assertEqual(self.reset, ["slow"])